@@ -0,0 +1,268 @@
+# analytics.py — сводки продаж: инкрементальное обновление и отчёты
+# -------------------------------------------------
+# Отчёты (/stats, CSV) читают только сводные таблицы из
+# migrations/010_sales_summary.sql:
+#   sales_daily     — день: заказы, штуки, выручка;
+#   sales_products  — день × товар: заказы, штуки, выручка;
+#   sales_customers — покупатель: число заказов, выручка, первый/последний заказ.
+# Фоновая задача раз в SALES_REFRESH_INTERVAL добавляет к ним заказы
+# с order_id больше водяного знака (sales_watermark) — пачками по
+# SALES_REFRESH_BATCH, каждая в своей транзакции, по индексу первичного
+# ключа orders. Пачка заканчивается перед первым (по order_id) заказом
+# моложе SALES_REFRESH_LAG секунд — он и все следующие ждут следующего
+# раза, даже если более поздние номера уже «состарились»: водяной знак
+# не перепрыгивает заказ, который ещё не посчитан. Лаг заодно покрывает
+# незавершённые транзакции: заказ создаётся одним коротким запросом
+# (create_order), и к концу лага его номер уже виден или откатился.
+# Границы периодов отчётов считаются в БД (CURRENT_DATE), как и дни сводок
+# (created_at::date), — часовой пояс процесса бота на них не влияет.
+# Строка водяного знака блокируется на время пачки, так что воркеры
+# supervisor.py обновляют сводки по очереди, не дублируя.
+# Заказы бенчмарков (user_id < 0) в сводки не попадают.
+# -------------------------------------------------
+
+import asyncio
+import csv
+import io
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+import database
+from config import SALES_REFRESH_INTERVAL, SALES_REFRESH_LAG, SALES_REFRESH_BATCH
+
+TOP_PRODUCTS = 10
+
+# Заказы пачки: ($1, $2] по order_id
+_RANGE = "o.order_id > $1 AND o.order_id <= $2 AND o.user_id > 0"
+
+# Конец пачки: последний номер перед первым «молодым» заказом среди следующих $3
+_NEXT_BATCH_SQL = """
+    WITH upcoming AS (
+        SELECT order_id, created_at >= NOW() - make_interval(secs => $2) AS young
+        FROM orders
+        WHERE order_id > $1
+        ORDER BY order_id
+        LIMIT $3
+    )
+    SELECT max(u.order_id) FROM upcoming u
+    WHERE NOT EXISTS (SELECT 1 FROM upcoming y WHERE y.young AND y.order_id <= u.order_id)
+"""
+
+_DAILY_SQL = f"""
+    INSERT INTO sales_daily (day, orders, items, revenue)
+    SELECT o.created_at::date, COUNT(*), COALESCE(SUM(i.qty), 0), SUM(o.total_price)
+    FROM orders o
+    LEFT JOIN LATERAL (
+        SELECT SUM(quantity) AS qty FROM order_items WHERE order_id = o.order_id
+    ) i ON TRUE
+    WHERE {_RANGE}
+    GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET
+        orders = sales_daily.orders + EXCLUDED.orders,
+        items = sales_daily.items + EXCLUDED.items,
+        revenue = sales_daily.revenue + EXCLUDED.revenue
+"""
+
+_PRODUCTS_SQL = f"""
+    INSERT INTO sales_products (day, product_code, orders, quantity, revenue)
+    SELECT o.created_at::date, i.product_code, COUNT(DISTINCT o.order_id),
+           SUM(i.quantity), SUM(i.quantity * i.price_per_unit)
+    FROM orders o
+    JOIN order_items i ON i.order_id = o.order_id
+    WHERE {_RANGE}
+    GROUP BY 1, 2
+    ON CONFLICT (day, product_code) DO UPDATE SET
+        orders = sales_products.orders + EXCLUDED.orders,
+        quantity = sales_products.quantity + EXCLUDED.quantity,
+        revenue = sales_products.revenue + EXCLUDED.revenue
+"""
+
+_CUSTOMERS_SQL = f"""
+    INSERT INTO sales_customers (user_id, orders, revenue, first_order_at, last_order_at)
+    SELECT o.user_id, COUNT(*), SUM(o.total_price), MIN(o.created_at), MAX(o.created_at)
+    FROM orders o
+    WHERE {_RANGE}
+    GROUP BY 1
+    ON CONFLICT (user_id) DO UPDATE SET
+        orders = sales_customers.orders + EXCLUDED.orders,
+        revenue = sales_customers.revenue + EXCLUDED.revenue,
+        first_order_at = LEAST(sales_customers.first_order_at, EXCLUDED.first_order_at),
+        last_order_at = GREATEST(sales_customers.last_order_at, EXCLUDED.last_order_at)
+"""
+
+_refresher: Optional[asyncio.Task] = None
+_stats = {"refreshes": 0, "orders": 0, "last_order_id": 0}
+
+
+async def _refresh_batch() -> int:
+    """Добавляет в сводки одну пачку новых заказов. Возвращает их число."""
+    async with database.acquire() as conn:
+        async with conn.transaction():
+            last = await conn.fetchval("SELECT last_order_id FROM sales_watermark FOR UPDATE")
+            if last is None:
+                raise RuntimeError("Нет строки sales_watermark: примените migrations/010_sales_summary.sql")
+            upto = await conn.fetchval(_NEXT_BATCH_SQL, last, SALES_REFRESH_LAG, SALES_REFRESH_BATCH)
+            if upto is None:
+                return 0
+            await conn.execute(_DAILY_SQL, last, upto)
+            await conn.execute(_PRODUCTS_SQL, last, upto)
+            await conn.execute(_CUSTOMERS_SQL, last, upto)
+            await conn.execute(
+                "UPDATE sales_watermark SET last_order_id = $1, refreshed_at = NOW()", upto
+            )
+            added = await conn.fetchval("SELECT COUNT(*) FROM orders WHERE order_id > $1 AND order_id <= $2",
+                                        last, upto)
+    _stats["last_order_id"] = upto
+    return added
+
+
+async def refresh() -> int:
+    """Доводит сводки до текущих заказов (без последних SALES_REFRESH_LAG с). Возвращает число заказов."""
+    total = 0
+    while True:
+        added = await _refresh_batch()
+        total += added
+        if added < SALES_REFRESH_BATCH:
+            break
+        await asyncio.sleep(0)  # не держим event loop между пачками
+    _stats["refreshes"] += 1
+    _stats["orders"] += total
+    return total
+
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(SALES_REFRESH_INTERVAL)
+        try:
+            added = await refresh()
+            if added:
+                logging.info("[ANALYTICS] в сводки добавлено заказов: %d", added)
+        except Exception:
+            logging.exception("[ANALYTICS] ошибка обновления сводок")
+
+
+async def start() -> None:
+    """Запускает периодическое обновление сводок (после database.create_pool)."""
+    global _refresher
+    if SALES_REFRESH_INTERVAL > 0 and _refresher is None:
+        _refresher = asyncio.get_running_loop().create_task(_refresh_loop())
+
+
+async def stop() -> None:
+    """Останавливает обновление; начатая пачка откатится и посчитается в следующий раз."""
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except asyncio.CancelledError:
+            pass
+        _refresher = None
+
+
+def stats() -> Dict[str, int]:
+    """Обновлений, добавленных заказов и текущий водяной знак."""
+    return dict(_stats)
+
+
+# ------------------------------
+# Отчёты: только сводные таблицы
+# ------------------------------
+async def revenue_by_day(since: date) -> List[dict]:
+    async with database.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT day, orders, items, revenue FROM sales_daily WHERE day >= $1 ORDER BY day", since
+        )
+    return [dict(row) for row in rows]
+
+
+async def top_products(since: date, limit: Optional[int] = TOP_PRODUCTS) -> List[dict]:
+    """Товары по выручке за период; limit=None — все проданные."""
+    async with database.acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT s.product_code AS code, COALESCE(p.name, s.product_code) AS name,
+                   s.orders, s.quantity, s.revenue
+            FROM (
+                SELECT product_code, SUM(orders) AS orders, SUM(quantity) AS quantity, SUM(revenue) AS revenue
+                FROM sales_products
+                WHERE day >= $1
+                GROUP BY product_code
+                ORDER BY revenue DESC
+                LIMIT $2
+            ) s
+            LEFT JOIN products p ON p.code = s.product_code
+            ORDER BY s.revenue DESC
+        """, since, limit)
+    return [dict(row) for row in rows]
+
+
+async def customers(since: date) -> dict:
+    """Покупатели с заказом за период: всего, новых и повторных (больше одного заказа за всё время)."""
+    async with database.acquire() as conn:
+        row = await conn.fetchrow("""
+            SELECT COUNT(*) AS active,
+                   COUNT(*) FILTER (WHERE first_order_at >= $1) AS new,
+                   COUNT(*) FILTER (WHERE orders > 1) AS repeat
+            FROM sales_customers
+            WHERE last_order_at >= $1
+        """, since)
+    return dict(row)
+
+
+async def _since(days: int) -> date:
+    # Сегодня — по часам БД, в которых записаны дни сводок
+    async with database.acquire() as conn:
+        return await conn.fetchval("SELECT CURRENT_DATE - $1::int", days - 1)
+
+
+async def summary(days: int) -> dict:
+    """Все показатели за последние days дней (включая сегодня)."""
+    since = await _since(days)
+    daily = await revenue_by_day(since)
+    orders = sum(row["orders"] for row in daily)
+    revenue = sum(row["revenue"] for row in daily)
+    items = sum(row["items"] for row in daily)
+    return {
+        "days": days,
+        "since": since,
+        "daily": daily,
+        "orders": orders,
+        "revenue": revenue,
+        "avg_check": revenue / orders if orders else 0,
+        "avg_items": items / orders if orders else 0,
+        "top": await top_products(since),
+        "customers": await customers(since),
+    }
+
+
+def render(report: dict) -> str:
+    """Текст отчёта для /stats."""
+    buyers = report["customers"]
+    repeat_rate = buyers["repeat"] / buyers["active"] * 100 if buyers["active"] else 0
+    lines = [
+        f"📊 Продажи за {report['days']} дн. (с {report['since']:%d.%m.%Y}):",
+        f"Заказов: {report['orders']}, выручка: {report['revenue']:.0f} руб.",
+        f"Средний чек: {report['avg_check']:.0f} руб., товаров в заказе: {report['avg_items']:.1f}",
+        f"Покупателей: {buyers['active']}, новых: {buyers['new']}, "
+        f"повторных: {buyers['repeat']} ({repeat_rate:.0f}%)",
+    ]
+    if report["daily"]:
+        lines.append("\n📅 По дням:")
+        for row in report["daily"][-14:]:
+            lines.append(f"{row['day']:%d.%m} — {row['orders']} зак., {row['revenue']:.0f} руб.")
+    if report["top"]:
+        lines.append("\n🏆 Топ товаров:")
+        for idx, row in enumerate(report["top"], start=1):
+            lines.append(f"{idx}. {row['name']} — {row['quantity']} шт., {row['revenue']:.0f} руб.")
+    return "\n".join(lines)
+
+
+def to_csv(rows: List[dict]) -> bytes:
+    """Строки отчёта в CSV (UTF-8 с BOM — открывается в Excel)."""
+    out = io.StringIO()
+    if rows:
+        writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return out.getvalue().encode("utf-8-sig")
@@ -0,0 +1,279 @@
+# bench/bench_bot.py — нагрузочный прогон бота на синтетических апдейтах
+# -------------------------------------------------
+# Апдейты подаются прямо в Dispatcher (feed_update) с теми же роутерами,
+# что подключает main.py. Telegram не нужен: фальшивая сессия бота только
+# считает исходящие вызовы API (и может имитировать их задержку).
+# Нужна локальная/тестовая PostgreSQL из .env с товарами в products —
+# бот работает с ней как обычно. Корзины пишутся в JSON во временный
+# каталог, объём записи попадает в отчёт.
+#
+# Каждый пользователь проходит сценарий: /start → /products → следующая
+# страница → карточка товара → «в корзину» → количество (FSM) → корзина →
+# оформление заказа → /orders. Пользователи идут параллельно
+# (--concurrency), апдейты одного пользователя — по очереди, как в жизни.
+# Заказы и пользователи бенчмарка (отрицательные user_id) удаляются
+# до и после прогона.
+#   python -m bench.bench_bot --users 500 --concurrency 50 --api-latency 20
+# -------------------------------------------------
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Message, Update
+
+import main
+import catalog
+import cart_store
+import database
+from cart_backends import JsonFileBackend
+from keyboards.callbacks import CatalogPage, ProductAdd, ProductDetails
+
+BENCH_USER_BASE = -100_000  # user_id бенчмарка: -100000, -100001, ...
+BOT_ID = 42
+
+# Вызовы API, которые возвращают сообщение; остальным хватает True
+MESSAGE_METHODS = {"SendMessage", "SendPhoto", "EditMessageText", "EditMessageMedia", "EditMessageReplyMarkup"}
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def _now() -> int:
+    return int(time.time())
+
+
+def _message(chat_id: int, user: dict, text: str = None) -> dict:
+    message = {
+        "message_id": next(_message_ids),
+        "date": _now(),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": user,
+    }
+    if text is not None:
+        message["text"] = text
+    return message
+
+
+class FakeSession(BaseSession):
+    """Сессия бота без сети: считает вызовы API и отвечает правдоподобными объектами."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+
+    async def make_request(self, bot: Bot, method, timeout=None):
+        name = type(method).__name__
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if name in MESSAGE_METHODS:
+            chat_id = getattr(method, "chat_id", None) or 0
+            bot_user = {"id": BOT_ID, "is_bot": True, "first_name": "bench"}
+            return Message.model_validate(_message(chat_id, bot_user, "ok"), context={"bot": bot})
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        raise NotImplementedError
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class CountingJsonBackend(JsonFileBackend):
+    """JSON-хранилище корзин, которое считает записанные байты."""
+
+    def __init__(self, directory: str):
+        super().__init__(os.path.join(directory, "cart_store.json"), os.path.join(directory, "cart_store.journal"))
+        self.batches = 0
+        self.records = 0
+        self.journal_bytes = 0
+        self.snapshot_bytes = 0
+
+    def _encode_record(self, user_id, items, updated) -> bytes:
+        record = JsonFileBackend._encode_record(user_id, items, updated)
+        self.records += 1
+        self.journal_bytes += len(record)
+        return record
+
+    def _write_sync(self, batch) -> None:
+        self.batches += 1
+        super()._write_sync(batch)
+
+    def _write_snapshot(self) -> None:
+        super()._write_snapshot()
+        self.snapshot_bytes += os.path.getsize(self.snapshot_path)
+
+
+class TimingMiddleware(BaseMiddleware):
+    """Точное время каждого вызова хендлера (без корзин гистограммы metrics)."""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.errors = Counter()
+
+    async def __call__(self, handler, event, data):
+        callback = data["handler"].callback
+        resolve = getattr(callback, "resolve_handler", None)
+        name = ((resolve(event) if resolve is not None else None) or callback).__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors[name] += 1
+            raise
+        finally:
+            self.timings[name].append(time.perf_counter() - started)
+
+
+class Session:
+    """Один синтетический пользователь и его апдейты."""
+
+    def __init__(self, bot: Bot, index: int):
+        self.bot = bot
+        self.user_id = BENCH_USER_BASE - index
+        self.user = {"id": self.user_id, "is_bot": False, "first_name": f"bench{index}", "username": f"bench{index}"}
+
+    def text(self, text: str) -> Update:
+        return Update.model_validate(
+            {"update_id": next(_update_ids), "message": _message(self.user_id, self.user, text)},
+            context={"bot": self.bot},
+        )
+
+    def callback(self, data: str) -> Update:
+        bot_user = {"id": BOT_ID, "is_bot": True, "first_name": "bench"}
+        return Update.model_validate(
+            {
+                "update_id": next(_update_ids),
+                "callback_query": {
+                    "id": str(next(_update_ids)),
+                    "from": self.user,
+                    "chat_instance": "bench",
+                    "message": _message(self.user_id, bot_user, "menu"),
+                    "data": data,
+                },
+            },
+            context={"bot": self.bot},
+        )
+
+    def scenario(self, codes: List[str]) -> List[Update]:
+        code = random.choice(codes)
+        return [
+            self.text("/start"),
+            self.text("/products"),
+            self.callback(CatalogPage(page=1).pack()),
+            self.callback(ProductDetails(code=code).pack()),
+            self.callback(ProductAdd(code=code).pack()),
+            self.text(str(random.randint(1, 3))),
+            self.callback("view_cart"),
+            self.callback("send_order"),
+            self.text("/orders"),
+        ]
+
+
+async def cleanup(users: int) -> None:
+    ids = [BENCH_USER_BASE - i for i in range(users)]
+    async with database.acquire() as conn:
+        async with conn.transaction():
+            # Возвращаем списанные заказами бенчмарка остатки
+            await conn.execute("""
+                UPDATE products p SET stock = p.stock + s.qty
+                FROM (
+                    SELECT oi.product_code, SUM(oi.quantity) AS qty
+                    FROM order_items oi JOIN orders o ON o.order_id = oi.order_id
+                    WHERE o.user_id = ANY($1::bigint[])
+                    GROUP BY oi.product_code
+                ) s
+                WHERE p.code = s.product_code AND p.stock IS NOT NULL
+            """, ids)
+            await conn.execute(
+                "DELETE FROM order_items WHERE order_id IN (SELECT order_id FROM orders WHERE user_id = ANY($1::bigint[]))",
+                ids,
+            )
+            await conn.execute("DELETE FROM orders WHERE user_id = ANY($1::bigint[])", ids)
+            await conn.execute("DELETE FROM users WHERE user_id = ANY($1::bigint[])", ids)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def report(timing: TimingMiddleware, session: FakeSession, backend: CountingJsonBackend,
+           updates: int, elapsed: float) -> None:
+    print(f"\nАпдейтов: {updates} за {elapsed:.2f} с — {updates / elapsed:.0f} апдейтов/с\n")
+    print(f"{'хендлер':>22} | {'вызовов':>7} | {'p50, мс':>8} | {'p95, мс':>8} | {'p99, мс':>8} | ошибок")
+    for name, values in sorted(timing.timings.items(), key=lambda item: -statistics.median(item[1])):
+        values.sort()
+        print(f"{name:>22} | {len(values):>7} | {statistics.median(values) * 1000:>8.2f} | "
+              f"{_percentile(values, 0.95) * 1000:>8.2f} | {_percentile(values, 0.99) * 1000:>8.2f} | "
+              f"{timing.errors[name]}")
+    print("\nВызовы Bot API: " + ", ".join(f"{name} {count}" for name, count in session.calls.most_common()))
+    print(f"Запись корзин (JSON): пачек {backend.batches}, записей {backend.records}, "
+          f"журнал {backend.journal_bytes / 1024:.1f} КиБ, снимки {backend.snapshot_bytes / 1024:.1f} КиБ")
+    print(f"Пул БД: {database.pool_stats()}")
+
+
+async def run(users: int, concurrency: int, api_latency: float) -> None:
+    session = FakeSession(latency=api_latency)
+    bot = Bot(token=f"{BOT_ID}:BENCH", session=session)
+    dp = Dispatcher()
+    main.include_routers(dp)
+    timing = TimingMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(timing)
+
+    with tempfile.TemporaryDirectory() as directory:
+        backend = CountingJsonBackend(directory)
+        await cart_store.load_cart(backend)  # main.on_startup оставит уже открытое хранилище
+        await main.on_startup()
+        try:
+            await cleanup(users)
+            # Товары без остатка сценарий не купит (get_quantity откажет)
+            codes = [product["code"] for product in catalog.snapshot()
+                     if product["stock"] is None or product["stock"] >= 3 * users]
+            if not codes:
+                print("В таблице products нет товаров с достаточным остатком — сценарию нечего покупать")
+                return
+
+            limit = asyncio.Semaphore(concurrency)
+            processed = 0
+
+            async def user_session(index: int) -> None:
+                nonlocal processed
+                async with limit:
+                    for update in Session(bot, index).scenario(codes):
+                        await dp.feed_update(bot, update)
+                        processed += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(user_session(i) for i in range(users)))
+            await cart_store.flush()
+            elapsed = time.perf_counter() - started
+
+            report(timing, session, backend, processed, elapsed)
+        finally:
+            await cleanup(users)
+            await main.on_shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота без Telegram")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20, help="пользователей одновременно")
+    parser.add_argument("--api-latency", type=float, default=0, help="имитация задержки Bot API, мс")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args.users, args.concurrency, args.api_latency / 1000))
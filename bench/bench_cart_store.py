@@ -0,0 +1,128 @@
+# bench/bench_cart_store.py — микробенчмарк операций с корзиной в памяти
+# -------------------------------------------------
+# Сравнивает cart_store (код товара → CartItem, полосатые замки) с прежней
+# реализацией (списки ↔ кортежи, один общий RLock, print на каждый вызов).
+# Обе версии только помечают изменения для отложенной записи; хранилище
+# пустое и ничего не пишет, а горячий слой вмещает всех пользователей —
+# меряются операции в памяти.
+#   python -m bench.bench_cart_store --users 100000 --items 3
+# -------------------------------------------------
+
+import argparse
+import asyncio
+import contextlib
+import os
+import threading
+import time
+
+import cart_store
+from cart_backends import CartBackend
+
+
+class LegacyCart:
+    """Прежняя реализация cart_store без сохранения на диск."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cart = {}
+        self._dirty = {}
+
+    def _mark_dirty(self, user_id):
+        self._dirty[user_id] = [list(x) for x in self._cart.get(user_id, [])]
+
+    def get_user_cart(self, user_id):
+        with self._lock:
+            data = [tuple(x) for x in self._cart.get(str(user_id), [])]
+            print(f"[CART] get_user_cart user={user_id} items={len(data)}")
+            return data
+
+    def clear_user_cart(self, user_id):
+        with self._lock:
+            self._cart[str(user_id)] = []
+            self._mark_dirty(str(user_id))
+
+    def add_item(self, user_id, product_code, product_name, qty, price):
+        with self._lock:
+            print(f"[CART] add_item user={user_id} code={product_code} qty={qty} before={len(self._cart.get(str(user_id), []))}")
+            items = [tuple(x) for x in self._cart.get(str(user_id), [])]
+            for i, (code, name, q, p) in enumerate(items):
+                if code == product_code:
+                    items[i] = (code, name, q + qty, p)
+                    self._cart[str(user_id)] = [list(x) for x in items]
+                    self._mark_dirty(str(user_id))
+                    print(f"[CART] add_item updated, after={len(items)}")
+                    return
+            items.append((product_code, product_name, qty, price))
+            self._cart[str(user_id)] = [list(x) for x in items]
+            self._mark_dirty(str(user_id))
+        print(f"[CART] add_item appended, after={len(items)}")
+
+
+class NullBackend(CartBackend):
+    """Пустое хранилище: корзин нет, запись ничего не делает."""
+
+    name = "null"
+
+    async def load(self, user_id):
+        return None
+
+    async def write(self, batch):
+        pass
+
+    async def expire(self, cutoff):
+        return 0
+
+
+async def _call(result):
+    # Прежний API синхронный, текущий — корутины
+    if asyncio.iscoroutine(result):
+        return await result
+    return result
+
+
+async def run(impl, users: int, items: int):
+    """Секунды на фазы add (users × items × 2 — второй раз наращивает кол-во), get, clear."""
+    codes = [f"SKU{i}" for i in range(items)]
+    timings = {}
+
+    started = time.perf_counter()
+    for _ in range(2):
+        for user_id in range(users):
+            for code in codes:
+                await _call(impl.add_item(user_id, code, "Видеокарта", 1, 1000))
+    timings["add"] = (time.perf_counter() - started, users * items * 2)
+
+    started = time.perf_counter()
+    for user_id in range(users):
+        await _call(impl.get_user_cart(user_id))
+    timings["get"] = (time.perf_counter() - started, users)
+
+    started = time.perf_counter()
+    for user_id in range(users):
+        await _call(impl.clear_user_cart(user_id))
+    timings["clear"] = (time.perf_counter() - started, users)
+    return timings
+
+
+async def main(users: int, items: int):
+    cart_store.CART_CACHE_SIZE = max(cart_store.CART_CACHE_SIZE, users)
+    await cart_store.load_cart(NullBackend())
+    cart_store.start_writer()  # как в боте: без фоновой записи каждое изменение пишется сразу
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        legacy = await run(LegacyCart(), users, items)
+        current = await run(cart_store, users, items)
+    await cart_store.close_cart()
+
+    print(f"{users} пользователей × {items} позиций")
+    print(f"{'операция':>8} | {'прежняя, оп/с':>14} | {'текущая, оп/с':>14} | ускорение")
+    for op in ("add", "get", "clear"):
+        (old_s, n), (new_s, _) = legacy[op], current[op]
+        print(f"{op:>8} | {n / old_s:>14,.0f} | {n / new_s:>14,.0f} | x{old_s / new_s:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Микробенчмарк cart_store")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.items))
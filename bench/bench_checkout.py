@@ -0,0 +1,95 @@
+# bench/bench_checkout.py — задержка оформления заказа в зависимости от числа позиций
+# -------------------------------------------------
+# Сравнивает прежнюю схему send_order (отдельный запрос на пользователя, заказ
+# и каждую позицию) с create_order (один CTE-запрос в транзакции).
+# Каждый прогон откатывается, но счётчики sequence при этом сдвигаются —
+# запускать на локальной или тестовой базе:
+#   python -m bench.bench_checkout --sizes 1 5 10 25 50 --repeat 50
+# -------------------------------------------------
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import asyncpg
+from aiogram import types
+
+from config import DATABASE_URL
+from handlers.products import create_order
+import users
+
+BENCH_USER = types.User(id=-1, is_bot=False, first_name="bench", username="bench")
+
+
+async def legacy_checkout(conn, user, items):
+    """Прежняя реализация: 2 + N запросов без транзакции."""
+    await conn.execute("""
+        INSERT INTO users (user_id, username, first_name, last_name)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (user_id) DO NOTHING
+    """, user.id, user.username, user.first_name, user.last_name)
+    total_sum = sum(qty * price for _, _, qty, price in items)
+    order_row = await conn.fetchrow(
+        "INSERT INTO orders (user_id, total_price) VALUES ($1, $2) RETURNING order_id",
+        user.id, total_sum
+    )
+    for product_code, _, qty, price in items:
+        await conn.execute(
+            "INSERT INTO order_items (order_id, product_code, quantity, price_per_unit) VALUES ($1, $2, $3, $4)",
+            order_row["order_id"], product_code, qty, price
+        )
+
+
+async def measure(conn, checkout, items, repeat: int):
+    """Медиана и p95 одного оформления, мс. Каждый прогон откатывается."""
+    timings = []
+    for _ in range(repeat):
+        tr = conn.transaction()
+        await tr.start()
+        # Пользователь внутри откатываемой транзакции — сбрасываем кэш users, чтобы он
+        # был заведён заново; в замер попадает обычный случай «пользователь уже известен»
+        users.forget(BENCH_USER.id)
+        await users.ensure_user(BENCH_USER, conn)
+        started = time.perf_counter()
+        await checkout(conn, BENCH_USER, items)
+        timings.append((time.perf_counter() - started) * 1000)
+        await tr.rollback()
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+async def main(sizes, repeat: int):
+    conn = await asyncpg.connect(DATABASE_URL)
+    try:
+        products = await conn.fetch(
+            "SELECT code, name, price FROM products WHERE stock IS NULL OR stock > 0 ORDER BY code LIMIT $1",
+            max(sizes),
+        )
+        if not products:
+            print("В таблице products нет товаров — нечего заказывать")
+            return
+
+        print(f"{'позиций':>8} | {'legacy p50':>10} {'p95':>8} | {'CTE p50':>10} {'p95':>8} | ускорение")
+        for size in sizes:
+            if size > len(products):
+                print(f"{size:>8} | пропущено: в каталоге только {len(products)} товаров")
+                continue
+            items = [(p["code"], p["name"], 1, p["price"]) for p in products[:size]]
+            # прогрев: подготовленные выражения и кэш планов
+            await measure(conn, legacy_checkout, items, 3)
+            await measure(conn, create_order, items, 3)
+
+            old_p50, old_p95 = await measure(conn, legacy_checkout, items, repeat)
+            new_p50, new_p95 = await measure(conn, create_order, items, repeat)
+            print(f"{size:>8} | {old_p50:>8.2f}ms {old_p95:>6.2f}ms | {new_p50:>8.2f}ms {new_p95:>6.2f}ms | x{old_p50 / new_p50:.1f}")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк оформления заказа")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.repeat))
@@ -0,0 +1,75 @@
+# bench/bench_search.py — скорость поискового индекса на синтетическом каталоге
+# -------------------------------------------------
+# Строит search_index.SearchIndex по N сгенерированным товарам и меряет
+# время поиска для префиксных, нечётких и кириллических запросов.
+#   python -m bench.bench_search --products 50000 --repeat 200
+# -------------------------------------------------
+
+import argparse
+import random
+import statistics
+import time
+
+from search_index import SearchIndex
+
+BRANDS = ["ASUS", "MSI", "Gigabyte", "Palit", "Zotac", "Kingston", "Corsair", "Samsung", "Western Digital",
+          "Seagate", "AMD", "Intel", "Noctua", "be quiet!", "DeepCool", "Crucial", "ADATA", "Sapphire"]
+KINDS = ["Видеокарта", "Процессор", "Материнская плата", "Оперативная память", "SSD накопитель",
+         "Жёсткий диск", "Блок питания", "Кулер", "Корпус"]
+MODELS = ["GeForce RTX 4060", "GeForce RTX 4070 Ti", "Radeon RX 7800 XT", "Ryzen 5 7600", "Ryzen 7 7800X3D",
+          "Core i5-13400F", "Core i7-14700K", "B650 Tomahawk", "Z790 Aorus Elite", "Fury Beast DDR5",
+          "Vengeance LPX DDR4", "990 PRO", "Barracuda", "NH-D15", "Pure Power 12", "AK620"]
+
+QUERIES = {
+    "код": "SKU012345",
+    "префикс": "rtx 40",
+    "два слова": "asus geforce",
+    "опечатка": "gigabite radeon",
+    "кириллица": "видеокарта асус",
+    "транслит": "райзен 7600",
+    "одна буква": "k",
+}
+
+
+def make_catalog(size: int, seed: int = 42):
+    rnd = random.Random(seed)
+    return [
+        {
+            "code": f"SKU{i:06d}",
+            "name": f"{rnd.choice(KINDS)} {rnd.choice(BRANDS)} {rnd.choice(MODELS)} {rnd.randint(1, 999)}",
+        }
+        for i in range(size)
+    ]
+
+
+def main(size: int, repeat: int):
+    products = make_catalog(size)
+
+    index = SearchIndex()
+    started = time.perf_counter()
+    index.build(products)
+    print(f"Индекс по {size} товарам построен за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    started = time.perf_counter()
+    for product in products[:1000]:
+        index.add(product["code"], product["name"] + " OC")
+    print(f"Точечное обновление: {(time.perf_counter() - started) * 1000:.3f} мкс на товар\n")
+
+    print(f"{'запрос':>12} | {'p50, мкс':>9} | {'p99, мкс':>9} | найдено")
+    for label, query in QUERIES.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            found = index.search(query)
+            timings.append((time.perf_counter() - started) * 1_000_000)
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f"{label:>12} | {statistics.median(timings):>9.0f} | {p99:>9.0f} | {len(found)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк поискового индекса")
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.products, args.repeat)
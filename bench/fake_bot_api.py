@@ -0,0 +1,100 @@
+# bench/fake_bot_api.py — локальный сервер вместо api.telegram.org
+# -------------------------------------------------
+# Понимает вызовы, которые делает загрузка фото (image_ingest.py):
+# sendPhoto отвечает сообщением с фото, file_id которого выводится из
+# sha256 содержимого (одна картинка — один file_id); deleteMessage,
+# sendMessage, getMe — правдоподобными ответами, прочие методы — True.
+# Задержка ответа (--latency) и доля ответов 429 (--retry-after-rate)
+# нужны, чтобы увидеть работу параллельности и outbound.
+#   python -m bench.fake_bot_api --port 8081 --latency 200
+#   python -m tools.ingest_images photos/ --chat 1 --api-url http://127.0.0.1:8081
+# -------------------------------------------------
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+_message_ids = itertools.count(1)
+calls = Counter()
+uploaded_bytes = 0
+
+
+def _message(chat_id: int, **extra) -> dict:
+    return dict(
+        message_id=next(_message_ids),
+        date=int(time.time()),
+        chat={"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+        **extra,
+    )
+
+
+async def _api(request: web.Request) -> web.Response:
+    global uploaded_bytes
+    method = request.match_info["method"]
+    calls[method] += 1
+    form = {}
+    photo = b""
+    if request.content_type.startswith("multipart/"):
+        async for part in await request.multipart():
+            if part.filename is not None:
+                photo = await part.read()
+            else:
+                form[part.name] = await part.text()
+    else:
+        form = dict(await request.post())
+
+    config = request.app["config"]
+    if config.latency:
+        await asyncio.sleep(config.latency)
+    if method != "getMe" and random.random() < config.retry_after_rate:
+        return web.json_response({
+            "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+            "parameters": {"retry_after": 1},
+        })
+
+    chat_id = int(form.get("chat_id", 0) or 0)
+    if method == "getMe":
+        result = {"id": 42, "is_bot": True, "first_name": "fake", "username": "fake_bot"}
+    elif method == "sendPhoto":
+        uploaded_bytes += len(photo)
+        digest = hashlib.sha256(photo).hexdigest()
+        sizes = [
+            {"file_id": f"fake-{digest[:40]}-{size}", "file_unique_id": f"{digest[:16]}{size}",
+             "width": size, "height": size}
+            for size in (90, 320, 800)
+        ]
+        result = _message(chat_id, photo=sizes)
+    elif method == "sendMessage":
+        result = _message(chat_id, text=form.get("text", ""))
+    else:
+        result = True
+    return web.json_response({"ok": True, "result": result})
+
+
+async def _stats(request: web.Request) -> web.Response:
+    return web.json_response({"calls": calls, "uploaded_bytes": uploaded_bytes})
+
+
+def create_app(args) -> web.Application:
+    app = web.Application(client_max_size=50 * 1024 * 1024)
+    app["config"] = args
+    app.router.add_post("/bot{token}/{method}", _api)
+    app.router.add_get("/stats", _stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API для локальных прогонов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0, help="задержка ответа, мс")
+    parser.add_argument("--retry-after-rate", type=float, default=0, help="доля ответов 429 (0..1)")
+    args = parser.parse_args()
+    args.latency /= 1000
+    web.run_app(create_app(args), host=args.host, port=args.port)
@@ -0,0 +1,164 @@
+# callback_dispatch.py — таблица callback-кнопок: callback_data → хендлер за O(1)
+# -------------------------------------------------
+# Вместо фильтров F.data == ... / F.data.startswith(...) в каждом роутере
+# (их aiogram перебирает по очереди, роутер за роутером) все нажатия
+# принимает один хендлер и находит нужный по словарю:
+#   кнопки без параметров — по точной строке ("view_cart", "cats", ...);
+#   кнопки с параметрами  — по префиксу класса CallbackData
+#                           (keyboards/callbacks.py), хендлер получает
+#                           разобранный объект в аргументе callback_data.
+# Регистрация — декоратор @callback_dispatch.on(ключ) в модулях handlers.
+# Повторная регистрация ключа — ошибка сразу при импорте, а check()
+# при старте не даёт запуститься, если callback_query-хендлер всё же
+# повешен на роутер в обход таблицы или строковая кнопка совпадает
+# с данными типизированной.
+# Неизвестные и старые (из прежних версий бота) кнопки получают ответ
+# «кнопка устарела».
+# -------------------------------------------------
+
+import inspect
+import logging
+import re
+from typing import Callable, Dict, Optional, Type, Union
+
+from aiogram import Router, types
+from aiogram.filters.callback_data import CallbackData
+
+OUTDATED_TEXT = "Кнопка устарела — откройте меню заново"
+
+# Префикс типизированной кнопки — первое «слово» callback_data
+_PREFIX = re.compile(r"[A-Za-z0-9]+")
+
+Key = Union[str, Type[CallbackData]]
+
+
+class _Target:
+    """Зарегистрированный хендлер и аргументы, которые он принимает."""
+
+    __slots__ = ("func", "schema", "params", "takes_all")
+
+    def __init__(self, func: Callable, schema: Optional[Type[CallbackData]]):
+        self.func = func
+        self.schema = schema
+        parameters = list(inspect.signature(func).parameters.values())[1:]  # первый — сам callback
+        self.takes_all = any(p.kind is p.VAR_KEYWORD for p in parameters)
+        self.params = frozenset(p.name for p in parameters if p.kind is not p.VAR_KEYWORD)
+
+    def kwargs(self, data: dict) -> dict:
+        if self.takes_all:
+            return data
+        return {name: data[name] for name in self.params if name in data}
+
+
+_literals: Dict[str, _Target] = {}
+_prefixes: Dict[str, _Target] = {}
+
+
+def _name(func: Callable) -> str:
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def register(key: Key, func: Callable) -> None:
+    """Связывает кнопку (строку или класс CallbackData) с хендлером."""
+    if isinstance(key, str):
+        table, name, schema = _literals, key, None
+    elif isinstance(key, type) and issubclass(key, CallbackData):
+        table, name, schema = _prefixes, key.__prefix__, key
+        if not _PREFIX.fullmatch(name) or _PREFIX.match(key.__separator__):
+            raise ValueError(f"{key.__name__}: префикс должен состоять из латиницы и цифр, "
+                             f"разделитель — не из них")
+    else:
+        raise TypeError(f"ключ callback-кнопки — строка или класс CallbackData, а не {key!r}")
+
+    existing = table.get(name)
+    if existing is not None and existing.func is not func:
+        raise RuntimeError(f"callback {name!r} уже обрабатывает {_name(existing.func)}, "
+                           f"повторная регистрация: {_name(func)}")
+    table[name] = _Target(func, schema)
+
+
+def on(key: Key) -> Callable[[Callable], Callable]:
+    """Декоратор: @callback_dispatch.on("view_cart") или @callback_dispatch.on(ProductDetails)."""
+    def decorator(func: Callable) -> Callable:
+        register(key, func)
+        return func
+    return decorator
+
+
+def _lookup(data: str) -> Optional[_Target]:
+    target = _literals.get(data)
+    if target is not None:
+        return target
+    match = _PREFIX.match(data)
+    if match is None:
+        return None
+    target = _prefixes.get(match.group())
+    if target is None or not data.startswith(target.schema.__separator__, match.end()):
+        return None
+    return target
+
+
+def handler_for(callback: types.CallbackQuery) -> Optional[Callable]:
+    """Хендлер, который получит нажатие (для метрик и бенчмарка), или None."""
+    target = _lookup(callback.data or "")
+    return target.func if target is not None else None
+
+
+# ------------------------------
+# Единственный callback_query-хендлер бота
+# ------------------------------
+router = Router(name="callback_dispatch")
+
+
+@router.callback_query()
+async def dispatch_callback(callback: types.CallbackQuery, **data):
+    target = _lookup(callback.data or "")
+    if target is not None and target.schema is not None:
+        try:
+            data["callback_data"] = target.schema.unpack(callback.data)
+        except (TypeError, ValueError):
+            target = None  # префикс наш, а поля — от старой версии кнопки
+
+    if target is None:
+        logging.debug("[CALLBACK] неизвестная кнопка %r", callback.data)
+        await callback.answer(OUTDATED_TEXT)
+        return
+    return await target.func(callback, **target.kwargs(data))
+
+
+# Метрики и бенчмарк записывают время на настоящий хендлер, а не на dispatch_callback
+dispatch_callback.resolve_handler = handler_for
+
+
+def check(root: Router) -> None:
+    """
+    Проверка при старте: таблица подключена ровно один раз, других
+    callback_query-хендлеров нет, строковые кнопки не перекрывают типизированные.
+    """
+    problems = []
+    included = 0
+    for child in root.chain_tail:
+        for handler in child.callback_query.handlers:
+            if handler.callback is dispatch_callback:
+                included += 1
+            else:
+                problems.append(f"{_name(handler.callback)} (роутер {child.name}) "
+                                f"принимает нажатия в обход callback_dispatch")
+    if included != 1:
+        problems.append(f"роутер callback_dispatch подключён {included} раз(а) вместо одного")
+
+    for literal, target in _literals.items():
+        match = _PREFIX.match(literal)
+        prefixed = _prefixes.get(match.group()) if match else None
+        if prefixed is None:
+            continue
+        try:
+            prefixed.schema.unpack(literal)
+        except (TypeError, ValueError):
+            continue
+        problems.append(f"кнопка {literal!r} ({_name(target.func)}) перекрывает "
+                        f"{prefixed.schema.__name__} ({_name(prefixed.func)})")
+
+    if problems:
+        raise RuntimeError("Ошибки регистрации callback-кнопок:\n  " + "\n  ".join(problems))
+    logging.info("[CALLBACK] кнопок: %d строковых, %d типизированных", len(_literals), len(_prefixes))
@@ -0,0 +1,483 @@
+# cart_backends.py — хранилища корзин для cart_store
+# -------------------------------------------------
+# cart_store держит корзины в памяти и отдаёт изменения пачками
+# (user_id → новое состояние корзины) в одно из хранилищ:
+#   json     — снимок cart_store.json + журнал cart_store.journal (один процесс);
+#   sqlite   — таблица carts в файле SQLite в режиме WAL;
+#   postgres — таблица carts в основной БД (migrations/003_carts.sql),
+#              общая для воркеров supervisor.py.
+# Каждая корзина в пачке — одна построчная операция (upsert, а пустая
+# корзина — delete), без перезаписи всего хранилища. Для каждой корзины
+# хранится время последнего изменения: по нему expire() удаляет брошенные.
+# Выбор — CART_BACKEND в config.py.
+#
+# Ограничение: у каждого пользователя один процесс-писатель. cart_store
+# держит горячий слой в памяти и не сверяет его с хранилищем, а запись
+# перезаписывает корзину целиком — два процесса, обслуживающие одного
+# пользователя, молча затирают изменения друг друга. Поэтому процесс,
+# принимающий апдейты (бот или supervisor.py при BOT_WORKERS > 1),
+# захватывает хранилище (claim): advisory-блокировка в PostgreSQL,
+# файл-замок рядом с файлом SQLite/JSON. Второй такой процесс не
+# запустится. Воркеры супервизора делят хранилище, не захватывая его:
+# апдейты пользователя приходят только в один из них.
+# -------------------------------------------------
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple
+
+import database
+from config import CART_BACKEND, CART_SQLITE_PATH, CART_JOURNAL_COMPACT_BYTES
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Корзина в хранилище: список [код, название, кол-во, цена]
+Carts = Dict[str, list]
+
+
+class CartBackend:
+    """Хранилище корзин. Методы асинхронные; блокирующий I/O — в executor'е."""
+
+    name = "base"
+
+    async def open(self) -> None:
+        """Подготавливает хранилище (файлы, таблицы, соединения)."""
+
+    async def load(self, user_id: str) -> Optional[Tuple[list, float]]:
+        """Корзина пользователя и время её изменения (unix time) или None."""
+        raise NotImplementedError
+
+    async def load_all(self) -> Carts:
+        """Все непустые корзины: user_id → позиции."""
+        raise NotImplementedError
+
+    async def write(self, batch: Carts) -> None:
+        """Сохраняет пачку изменений: upsert для непустых корзин, delete для пустых."""
+        raise NotImplementedError
+
+    async def expire(self, cutoff: float) -> int:
+        """Удаляет корзины, не менявшиеся с момента cutoff (unix time). Возвращает их число."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Освобождает ресурсы хранилища."""
+
+    async def claim(self) -> None:
+        """Делает процесс единственным писателем хранилища; занято — RuntimeError."""
+
+    async def release(self) -> None:
+        """Отпускает захват из claim()."""
+
+
+async def _in_thread(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+class _FileClaim:
+    """Эксклюзивный замок на файл <path>.lock, пока процесс жив (снимается и при его падении)."""
+
+    def __init__(self, path: str):
+        self.path = path + ".lock"
+        self._file = None
+
+    def acquire(self) -> None:
+        file = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            raise RuntimeError(f"Корзины {self.path[:-5]} уже обслуживает другой процесс бота; "
+                               "несколько процессов — только через BOT_WORKERS (supervisor.py)") from None
+        self._file = file
+
+    def release(self) -> None:
+        if self._file is not None:
+            self._file.close()  # закрытие файла снимает замок
+            self._file = None
+
+
+# ------------------------------
+# JSON: снимок + журнал изменений
+# ------------------------------
+class JsonFileBackend(CartBackend):
+    """
+    Снимок всех корзин и журнал дозаписи "<crc32 hex> <json>\\n".
+    При росте журнала свыше CART_JOURNAL_COMPACT_BYTES он сворачивается
+    в новый снимок. Хранит полный образ данных в памяти (горячий слой
+    cart_store его не ограничивает) — для разработки и одного процесса.
+    """
+
+    name = "json"
+
+    def __init__(self, snapshot_path: str = os.path.join(BASE_DIR, "cart_store.json"),
+                 journal_path: str = os.path.join(BASE_DIR, "cart_store.journal")):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        # Журнал, который сейчас сворачивается в снимок (существует только во время компакции)
+        self.compacting_path = journal_path + ".compacting"
+        self._data: Carts = {}
+        self._updated: Dict[str, float] = {}
+        self._journal = None
+        self._lock = threading.Lock()
+        self._claim = _FileClaim(snapshot_path)
+
+    # --- формат записи журнала ---
+    @staticmethod
+    def _encode_record(user_id: str, items, updated: float) -> bytes:
+        payload = json.dumps({"u": user_id, "i": items, "t": updated}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+    @staticmethod
+    def _decode_record(line: bytes):
+        """Разбирает строку журнала; None — если запись оборвана или повреждена."""
+        if not line.endswith(b"\n"):
+            return None
+        crc, _, payload = line.rstrip(b"\n").partition(b" ")
+        try:
+            if int(crc, 16) != zlib.crc32(payload):
+                return None
+            record = json.loads(payload)
+            return str(record["u"]), record["i"], record.get("t", time.time())
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def _replay(self, path: str, data: Carts, updated: Dict[str, float]) -> int:
+        """
+        Применяет журнал к data. Возвращает смещение после последней целой записи:
+        всё, что дальше, — оборванный хвост (процесс упал посреди записи).
+        """
+        good = 0
+        if not os.path.exists(path):
+            return good
+        with open(path, "rb") as f:
+            for line in f:
+                record = self._decode_record(line)
+                if record is None:
+                    logging.warning("[CART] оборванная запись в %s на смещении %d, хвост отброшен", path, good)
+                    break
+                user_id, items, ts = record
+                if items:
+                    data[user_id] = list(items)
+                    updated[user_id] = ts
+                else:
+                    data.pop(user_id, None)
+                    updated.pop(user_id, None)
+                good += len(line)
+        return good
+
+    def _read_snapshot(self) -> Tuple[Carts, Dict[str, float]]:
+        """Снимок: {user_id: {"i": позиции, "t": время изменения}}; старый формат {user_id: позиции} тоже читается."""
+        data, updated = {}, {}
+        if not os.path.exists(self.snapshot_path):
+            return data, updated
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            # safety: убедимся, что структура валидна
+            if isinstance(raw, dict):
+                now = time.time()
+                for user_id, value in raw.items():
+                    items, ts = (value["i"], value["t"]) if isinstance(value, dict) else (value, now)
+                    if items:
+                        data[str(user_id)] = list(items)
+                        updated[str(user_id)] = ts
+        except Exception:
+            logging.exception("[CART] не удалось прочитать снимок %s", self.snapshot_path)
+        return data, updated
+
+    def _write_snapshot(self) -> None:
+        snapshot = {user_id: {"i": items, "t": self._updated[user_id]} for user_id, items in self._data.items()}
+        tmp_file = self.snapshot_path + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_path)  # атомарная запись
+
+    def _close_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal.close()
+            self._journal = None
+
+    def _open_sync(self) -> None:
+        with self._lock:
+            self._close_journal()
+            data, updated = self._read_snapshot()
+            # Незавершённая компакция: её журнал ещё не попал в снимок
+            self._replay(self.compacting_path, data, updated)
+            good = self._replay(self.journal_path, data, updated)
+
+            # Обрезаем оборванный хвост, чтобы новые записи шли после целых
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) != good:
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good)
+                    os.fsync(f.fileno())
+
+            self._data, self._updated = data, updated
+
+            # Доводим прерванную компакцию до конца: снимок уже с её данными
+            if os.path.exists(self.compacting_path):
+                self._write_snapshot()
+                os.remove(self.compacting_path)
+
+            self._journal = open(self.journal_path, "ab")
+
+    def _write_sync(self, batch: Carts) -> None:
+        now = time.time()
+        with self._lock:
+            if self._journal is None:
+                raise RuntimeError("Журнал корзин закрыт")
+            # Вся пачка — одна запись и один fsync
+            self._journal.write(b"".join(self._encode_record(u, items, now) for u, items in batch.items()))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            for user_id, items in batch.items():
+                if items:
+                    self._data[user_id] = items
+                    self._updated[user_id] = now
+                else:
+                    self._data.pop(user_id, None)
+                    self._updated.pop(user_id, None)
+            if self._journal.tell() >= CART_JOURNAL_COMPACT_BYTES:
+                self._compact()
+
+    def _expire_sync(self, cutoff: float) -> int:
+        with self._lock:
+            expired = [user_id for user_id, ts in self._updated.items() if ts < cutoff]
+        if expired:
+            self._write_sync({user_id: [] for user_id in expired})
+        return len(expired)
+
+    def _compact(self) -> None:
+        """Сворачивает журнал в новый снимок (вызывать под self._lock)."""
+        self._close_journal()
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, self.compacting_path)
+        self._journal = open(self.journal_path, "ab")
+        self._write_snapshot()
+        # Снимок уже содержит всё из старого журнала
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+
+    def _close_sync(self) -> None:
+        with self._lock:
+            self._close_journal()
+
+    async def open(self) -> None:
+        await _in_thread(self._open_sync)
+
+    async def load(self, user_id: str) -> Optional[Tuple[list, float]]:
+        items = self._data.get(user_id)
+        return None if items is None else (items, self._updated[user_id])
+
+    async def load_all(self) -> Carts:
+        return dict(self._data)
+
+    async def write(self, batch: Carts) -> None:
+        await _in_thread(self._write_sync, batch)
+
+    async def expire(self, cutoff: float) -> int:
+        return await _in_thread(self._expire_sync, cutoff)
+
+    async def compact(self) -> None:
+        """Принудительно сворачивает журнал в снимок."""
+        def run():
+            with self._lock:
+                self._compact()
+        await _in_thread(run)
+
+    async def close(self) -> None:
+        await _in_thread(self._close_sync)
+
+    async def claim(self) -> None:
+        self._claim.acquire()
+
+    async def release(self) -> None:
+        self._claim.release()
+
+
+# ------------------------------
+# SQLite (WAL): таблица carts в локальном файле
+# ------------------------------
+class SQLiteBackend(CartBackend):
+    """Таблица carts(user_id, items, updated_at) в SQLite; построчные upsert/delete."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = CART_SQLITE_PATH):
+        # Относительный путь — от каталога бота, а не от CWD
+        self.path = os.path.join(BASE_DIR, path)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._claim = _FileClaim(self.path)
+
+    def _open_sync(self) -> None:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")  # несколько процессов пишут в один файл
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS carts (
+                user_id    TEXT PRIMARY KEY,
+                items      TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS carts_updated_at_idx ON carts (updated_at)")
+        self._conn = conn
+
+    def _load_one_sync(self, user_id: str) -> Optional[Tuple[list, float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT items, updated_at FROM carts WHERE user_id = ?", (user_id,)).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1])
+
+    def _load_sync(self) -> Carts:
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, items FROM carts").fetchall()
+        return {user_id: json.loads(items) for user_id, items in rows}
+
+    def _write_sync(self, batch: Carts) -> None:
+        now = time.time()
+        upserts = [(u, json.dumps(items, ensure_ascii=False), now) for u, items in batch.items() if items]
+        deletes = [(u,) for u, items in batch.items() if not items]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("""
+                    INSERT INTO carts (user_id, items, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET items = excluded.items, updated_at = excluded.updated_at
+                """, upserts)
+                self._conn.executemany("DELETE FROM carts WHERE user_id = ?", deletes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _expire_sync(self, cutoff: float) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM carts WHERE updated_at < ?", (cutoff,)).rowcount
+
+    def _close_sync(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def open(self) -> None:
+        await _in_thread(self._open_sync)
+
+    async def load(self, user_id: str) -> Optional[Tuple[list, float]]:
+        return await _in_thread(self._load_one_sync, user_id)
+
+    async def load_all(self) -> Carts:
+        return await _in_thread(self._load_sync)
+
+    async def write(self, batch: Carts) -> None:
+        await _in_thread(self._write_sync, batch)
+
+    async def expire(self, cutoff: float) -> int:
+        return await _in_thread(self._expire_sync, cutoff)
+
+    async def close(self) -> None:
+        await _in_thread(self._close_sync)
+
+    async def claim(self) -> None:
+        self._claim.acquire()
+
+    async def release(self) -> None:
+        self._claim.release()
+
+
+# ------------------------------
+# PostgreSQL: таблица carts в основной БД
+# ------------------------------
+class PostgresBackend(CartBackend):
+    """Таблица carts (migrations/003_carts.sql); пачка — один upsert и один delete через пул."""
+
+    name = "postgres"
+    # Ключ advisory-блокировки писателя корзин ("cart")
+    CLAIM_KEY = 0x63617274
+
+    def __init__(self):
+        self._claim_conn = None
+
+    async def claim(self) -> None:
+        # Блокировка уровня сессии живёт, пока открыто соединение, — держим его вне пула
+        conn = await database.get_db_connection()
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.CLAIM_KEY):
+            await conn.close()
+            raise RuntimeError("Корзины в PostgreSQL уже обслуживает другой процесс бота; "
+                               "несколько процессов — только через BOT_WORKERS (supervisor.py)")
+        self._claim_conn = conn
+
+    async def release(self) -> None:
+        if self._claim_conn is not None:
+            conn, self._claim_conn = self._claim_conn, None
+            await conn.close()  # вместе с сессией снимается и блокировка
+
+    async def load(self, user_id: str) -> Optional[Tuple[list, float]]:
+        async with database.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT items, extract(epoch FROM updated_at)::float8 AS updated FROM carts WHERE user_id = $1",
+                int(user_id)
+            )
+        return None if row is None else (json.loads(row["items"]), row["updated"])
+
+    async def load_all(self) -> Carts:
+        async with database.acquire() as conn:
+            rows = await conn.fetch("SELECT user_id, items FROM carts")
+        return {str(row["user_id"]): json.loads(row["items"]) for row in rows}
+
+    async def write(self, batch: Carts) -> None:
+        upsert_ids, upsert_items, delete_ids = [], [], []
+        for user_id, items in batch.items():
+            if items:
+                upsert_ids.append(int(user_id))
+                upsert_items.append(json.dumps(items, ensure_ascii=False))
+            else:
+                delete_ids.append(int(user_id))
+
+        async with database.acquire() as conn:
+            async with conn.transaction():
+                if upsert_ids:
+                    await conn.execute("""
+                        INSERT INTO carts (user_id, items, updated_at)
+                        SELECT u, i::jsonb, now() FROM unnest($1::bigint[], $2::text[]) AS t(u, i)
+                        ON CONFLICT (user_id) DO UPDATE
+                            SET items = EXCLUDED.items, updated_at = EXCLUDED.updated_at
+                    """, upsert_ids, upsert_items)
+                if delete_ids:
+                    await conn.execute("DELETE FROM carts WHERE user_id = ANY($1::bigint[])", delete_ids)
+
+    async def expire(self, cutoff: float) -> int:
+        async with database.acquire() as conn:
+            status = await conn.execute("DELETE FROM carts WHERE updated_at < to_timestamp($1)", cutoff)
+        return int(status.split()[-1])  # "DELETE <n>"
+
+
+BACKENDS = {
+    JsonFileBackend.name: JsonFileBackend,
+    SQLiteBackend.name: SQLiteBackend,
+    PostgresBackend.name: PostgresBackend,
+}
+
+
+def create_backend(name: str = CART_BACKEND) -> CartBackend:
+    """Хранилище по имени из config.CART_BACKEND: json, sqlite или postgres."""
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестное хранилище корзин: {name!r}, доступны: {', '.join(BACKENDS)}") from None
@@ -1,97 +1,373 @@
 # cart_store.py — единая точка работы с корзиной
 # -------------------------------------------------
 # Этот модуль отвечает за хранение корзин пользователей в памяти
-# и синхронизацию их с JSON-файлом, чтобы данные не терялись при
-# перезапуске бота.
+# и синхронизацию их с хранилищем (cart_backends: JSON-файл, SQLite
+# или PostgreSQL), чтобы данные не терялись при перезапуске бота.
+#
+# В памяти живёт только «горячий» слой: не больше CART_CACHE_SIZE
+# корзин в порядке LRU. Корзина подгружается из хранилища при первом
+# обращении, вытесняется при переполнении или после CART_CACHE_TTL
+# без обращений. Пустые корзины в хранилище не хранятся, а брошенные
+# (не менявшиеся дольше CART_MAX_AGE) удаляются фоновой задачей.
+#
+# Запись отложенная (write-behind): изменения только помечают корзину
+# «грязной», а фоновая задача (start_writer) раз в CART_FLUSH_INTERVAL
+# или при накоплении CART_FLUSH_THRESHOLD изменений отдаёт их пачкой
+# в хранилище — event loop не ждёт диск. Несколько изменений одной
+# корзины между сбросами схлопываются в одну запись. Пока фоновая
+# задача не запущена (скрипты, тесты — всё, кроме main.py), изменение
+# записывается сразу, в том же вызове.
+#
+# В памяти корзина — словарь код товара → CartItem, поэтому добавление
+# и изменение позиции — O(1). Блокировки полосатые: пользователи
+# распределены по _LOCK_STRIPES замкам, а не ждут один общий.
 # -------------------------------------------------
 
-import sys
-print("[CART] module key in sys.modules:", __name__)
-
-import json
-import os
+import asyncio
+import logging
 import threading
-from typing import Dict, List, Tuple
-
-# Фиксируем путь к файлу рядом с модулем (чтобы не зависеть от CWD)
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CART_FILE = os.path.join(BASE_DIR, "cart_store.json")
-
-# Потокобезопасность на случай параллельных хендлеров
-_LOCK = threading.RLock()
-
-# Внутреннее хранилище корзин в памяти (RAM).
-# Ключ — user_id (str). Значение — список: [код, название, кол-во, цена]
-_cart: Dict[str, List[Tuple[str, str, int, int]]] = {}
-
-
-def load_cart() -> None:
-    """Загружает корзины из JSON-файла в память (_cart)."""
-    global _cart
-    with _LOCK:
-        if os.path.exists(CART_FILE):
-            try:
-                with open(CART_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                # safety: убедимся, что структура валидна
-                if isinstance(data, dict):
-                    _cart = {str(k): list(v) for k, v in data.items()}
-                else:
-                    _cart = {}
-            except Exception:
-                # В проде можно добавить логирование
-                _cart = {}
-        else:
-            _cart = {}
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import metrics
+from cart_backends import CartBackend, create_backend
+from config import (
+    CART_FLUSH_INTERVAL,
+    CART_FLUSH_THRESHOLD,
+    CART_CACHE_SIZE,
+    CART_CACHE_TTL,
+    CART_MAX_AGE,
+    CART_SWEEP_INTERVAL,
+)
+
+# Потокобезопасность на случай параллельных хендлеров: замок выбирается по user_id
+_LOCK_STRIPES = 64
+_LOCKS = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+_DIRTY_LOCK = threading.Lock()
+
+
+def _lock_for(user_id: str) -> threading.Lock:
+    return _LOCKS[hash(user_id) % _LOCK_STRIPES]
+
+
+class CartItem:
+    """Позиция корзины."""
+
+    __slots__ = ("code", "name", "qty", "price")
+
+    def __init__(self, code: str, name: str, qty: int, price: int):
+        self.code = code
+        self.name = name
+        self.qty = qty
+        self.price = price
+
+    def as_tuple(self) -> Tuple[str, str, int, int]:
+        return (self.code, self.name, self.qty, self.price)
+
+    def as_row(self) -> list:
+        """Представление для хранилища: [код, название, кол-во, цена]."""
+        return [self.code, self.name, self.qty, self.price]
+
+
+class _Entry:
+    """Корзина в горячем слое: позиции и отметки времени."""
+
+    __slots__ = ("items", "accessed", "updated")
+
+    def __init__(self, items: Dict[str, CartItem], updated: float):
+        self.items = items
+        self.accessed = time.monotonic()  # последнее обращение — для вытеснения по TTL
+        self.updated = updated            # последнее изменение (unix time) — для CART_MAX_AGE
+
+
+def _from_rows(rows) -> Dict[str, CartItem]:
+    return {row[0]: CartItem(*row) for row in rows}
+
+
+def _to_rows(items: Dict[str, CartItem]) -> list:
+    return [item.as_row() for item in items.values()]
+
+
+# Горячий слой корзин в памяти (RAM), в порядке LRU: от давно не использованных к свежим.
+# Ключ — user_id (str). Пустые корзины тоже кэшируются, чтобы не ходить за ними в хранилище.
+_cart: "OrderedDict[str, _Entry]" = OrderedDict()
+
+# Изменённые, но ещё не записанные корзины (состояние берётся при сбросе)
+_dirty: Set[str] = set()
+# Грязные корзины, вытесненные из памяти до сброса: user_id → позиции
+_evicted_dirty: Dict[str, list] = {}
+# Пачка, которая пишется в хранилище прямо сейчас
+_inflight: Dict[str, list] = {}
+
+# Хранилище, выбранное в config.CART_BACKEND (создаётся в load_cart)
+_backend: Optional[CartBackend] = None
+
+# Фоновая задача отложенной записи
+_writer: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+_flush_lock = asyncio.Lock()
+_stopping = False
+
+_stats = {"hits": 0, "misses": 0, "evicted_lru": 0, "evicted_ttl": 0, "expired": 0}
+_last_sweep = time.monotonic()
+_last_evictions = 0
+
+
+async def load_cart(backend: Optional[CartBackend] = None) -> None:
+    """Открывает хранилище. Сами корзины подгружаются по мере обращения."""
+    global _backend
+    if _backend is None:
+        _backend = backend or create_backend()
+        await _backend.open()
+    with _DIRTY_LOCK:
+        _cart.clear()
+        _dirty.clear()
+        _evicted_dirty.clear()
+    logging.info("[CART] хранилище корзин: %s", _backend.name)
+
+
+# ------------------------------
+# Горячий слой: подгрузка и вытеснение
+# ------------------------------
+def _evict(user_id: str) -> None:
+    """Убирает корзину из памяти; несохранённые изменения остаются в очереди на запись."""
+    entry = _cart.pop(user_id)
+    with _DIRTY_LOCK:
+        if user_id in _dirty:
+            _dirty.discard(user_id)
+            _evicted_dirty[user_id] = _to_rows(entry.items)
+
 
+def _put(user_id: str, entry: _Entry) -> _Entry:
+    """Кладёт корзину в конец LRU и вытесняет самые старые сверх CART_CACHE_SIZE."""
+    _cart.pop(user_id, None)
+    _cart[user_id] = entry
+    while len(_cart) > CART_CACHE_SIZE:
+        _evict(next(iter(_cart)))
+        _stats["evicted_lru"] += 1
+    return entry
 
-def save_cart() -> None:
-    """Сохраняет текущее состояние корзин (_cart) в JSON-файл."""
-    with _LOCK:
-        tmp_file = CART_FILE + ".tmp"
-        with open(tmp_file, "w", encoding="utf-8") as f:
-            json.dump(_cart, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_file, CART_FILE)  # атомарная запись
 
+async def _entry(user_id: str) -> _Entry:
+    """Корзина из памяти, а при промахе — из хранилища."""
+    entry = _cart.get(user_id)
+    if entry is not None:
+        _stats["hits"] += 1
+        _cart.move_to_end(user_id)
+        entry.accessed = time.monotonic()
+        return entry
 
-def get_user_cart(user_id: int) -> List[Tuple[str, str, int, int]]:
-    """Возвращает корзину пользователя. Пустой список, если нет."""
-    with _LOCK:
-        data = [tuple(x) for x in _cart.get(str(user_id), [])]
-        print(f"[CART] get_user_cart user={user_id} items={len(data)} file={CART_FILE}")
-        return data
+    _stats["misses"] += 1
+    # Ещё не записанное состояние новее того, что лежит в хранилище
+    with _DIRTY_LOCK:
+        rows = _evicted_dirty.pop(user_id, None)
+        if rows is not None:
+            _dirty.add(user_id)
+    if rows is None:
+        rows = _inflight.get(user_id)
+    if rows is not None:
+        return _put(user_id, _Entry(_from_rows(rows), time.time()))
 
+    with metrics.timer("cart_backend", backend=_backend.name, op="load"):
+        loaded = await _backend.load(user_id)
+    # Пока ждали хранилище, корзину мог подгрузить или изменить соседний апдейт
+    entry = _cart.get(user_id)
+    if entry is not None:
+        return entry
+    if loaded is None:
+        return _put(user_id, _Entry({}, time.time()))
+    rows, updated = loaded
+    return _put(user_id, _Entry(_from_rows(rows), updated))
 
-def set_user_cart(user_id: int, items: List[Tuple[str, str, int, int]]) -> None:
-    """Полностью заменяет корзину пользователя и сохраняет на диск."""
-    with _LOCK:
-        _cart[str(user_id)] = [list(x) for x in items]
-    save_cart()
 
+def _sweep() -> None:
+    """Вытесняет корзины без обращений дольше CART_CACHE_TTL и забывает брошенные."""
+    idle_deadline = time.monotonic() - CART_CACHE_TTL
+    while _cart:
+        user_id, entry = next(iter(_cart.items()))
+        if entry.accessed > idle_deadline:
+            break  # дальше по LRU только более свежие
+        _evict(user_id)
+        _stats["evicted_ttl"] += 1
 
-def clear_user_cart(user_id: int) -> None:
-    """Очищает корзину пользователя и сохраняет на диск."""
-    with _LOCK:
-        _cart[str(user_id)] = []
-    save_cart()
+    # Брошенные корзины хранилище удалит в expire(); из памяти убираем их сами
+    age_deadline = time.time() - CART_MAX_AGE
+    for user_id in [u for u, e in _cart.items() if e.items and e.updated < age_deadline and u not in _dirty]:
+        del _cart[user_id]
 
-def add_item(user_id: int, product_code: str, product_name: str, qty: int, price: int) -> None:
+
+async def _maintenance() -> None:
+    """Периодически: вытеснение по TTL, удаление брошенных корзин и метрики в лог."""
+    global _last_sweep, _last_evictions
+    now = time.monotonic()
+    elapsed = now - _last_sweep
+    if elapsed < CART_SWEEP_INTERVAL:
+        return
+    _sweep()
+    with metrics.timer("cart_backend", backend=_backend.name, op="expire"):
+        expired = await _backend.expire(time.time() - CART_MAX_AGE)
+    _stats["expired"] += expired
+
+    evictions = _stats["evicted_lru"] + _stats["evicted_ttl"]
+    logging.info(
+        "[CART] в памяти %d корзин, вытеснений %.1f/мин, удалено брошенных %d; %s",
+        len(_cart), (evictions - _last_evictions) * 60 / elapsed, expired, stats()
+    )
+    _last_sweep, _last_evictions = now, evictions
+
+
+def stats() -> Dict[str, int]:
+    """Метрики горячего слоя: размер, попадания/промахи, вытеснения, удалённые брошенные."""
+    return dict(_stats, resident=len(_cart), dirty=len(_dirty) + len(_evicted_dirty))
+
+
+# ------------------------------
+# Отложенная запись (write-behind)
+# ------------------------------
+def _take_dirty() -> Dict[str, list]:
+    """Забирает изменённые корзины и снимает с них текущее состояние для записи."""
+    global _dirty, _evicted_dirty
+    with _DIRTY_LOCK:
+        user_ids, _dirty = _dirty, set()
+        batch, _evicted_dirty = _evicted_dirty, {}
+    for user_id in user_ids:
+        with _lock_for(user_id):
+            entry = _cart.get(user_id)
+            batch[user_id] = _to_rows(entry.items) if entry is not None else []
+    return batch
+
+
+def _restore_dirty(batch: Dict[str, list]) -> None:
+    # Несохранённое возвращаем в очередь, не затирая более свежие изменения
+    with _DIRTY_LOCK:
+        for user_id, rows in batch.items():
+            if user_id in _cart:
+                _dirty.add(user_id)
+            else:
+                _evicted_dirty.setdefault(user_id, rows)
+
+
+def _mark_dirty(user_id: str) -> None:
+    """Помечает корзину для записи."""
+    with _DIRTY_LOCK:
+        _dirty.add(user_id)
+
+
+async def _schedule_flush() -> None:
+    """Будит фоновую запись при накоплении изменений; без неё — записывает сразу."""
+    if _writer is None:
+        await flush()
+    elif len(_dirty) >= CART_FLUSH_THRESHOLD:
+        _wakeup.set()
+
+
+async def flush() -> None:
+    """Записывает все накопленные изменения в хранилище."""
+    global _inflight
+    # Пачки пишутся строго по очереди, иначе старая могла бы лечь поверх новой
+    async with _flush_lock:
+        batch = _take_dirty()
+        if not batch:
+            return
+        _inflight = batch
+        try:
+            with metrics.timer("cart_backend", backend=_backend.name, op="write"):
+                await _backend.write(batch)
+            metrics.inc("cart_backend_written_total", len(batch), backend=_backend.name)
+        except Exception:
+            _restore_dirty(batch)
+            raise
+        finally:
+            _inflight = {}
+
+
+async def _writer_loop() -> None:
+    while not _stopping:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), CART_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            await flush()
+            await _maintenance()
+        except Exception:
+            logging.exception("[CART] ошибка записи корзин, повтор через %s с", CART_FLUSH_INTERVAL)
+
+
+def start_writer() -> None:
+    """Запускает фоновую запись корзин (вызывать из работающего event loop)."""
+    global _writer, _wakeup, _stopping
+    if _writer is not None:
+        return
+    _stopping = False
+    _wakeup = asyncio.Event()
+    _writer = asyncio.get_running_loop().create_task(_writer_loop())
+
+
+async def stop_writer() -> None:
+    """Останавливает фоновую запись и сохраняет всё, что накопилось."""
+    global _writer, _stopping
+    if _writer is None:
+        return
+    _stopping = True
+    _wakeup.set()
+    await _writer
+    await flush()  # финальный сброс: всё, о чём пользователю уже ответили
+    _writer = None
+
+
+async def get_user_cart(user_id: int) -> List[Tuple[str, str, int, int]]:
+    """Возвращает корзину пользователя: [(код, название, кол-во, цена)]. Пустой список, если нет."""
+    key = str(user_id)
+    entry = await _entry(key)
+    with _lock_for(key):
+        return [item.as_tuple() for item in entry.items.values()]
+
+
+async def set_user_cart(user_id: int, items: List[Tuple[str, str, int, int]]) -> None:
+    """Полностью заменяет корзину пользователя и ставит изменение в очередь на запись."""
+    key = str(user_id)
+    entry = await _entry(key)
+    with _lock_for(key):
+        entry.items = _from_rows(items)
+        entry.updated = time.time()
+    _mark_dirty(key)
+    await _schedule_flush()
+
+
+async def clear_user_cart(user_id: int) -> None:
+    """Очищает корзину пользователя: из хранилища она удаляется, в памяти остаётся пустой."""
+    key = str(user_id)
+    with _lock_for(key):
+        _put(key, _Entry({}, time.time()))
+    _mark_dirty(key)
+    await _schedule_flush()
+
+
+async def add_item(user_id: int, product_code: str, product_name: str, qty: int, price: int) -> None:
     """Добавляет товар в корзину пользователя, увеличивает количество если позиция уже есть."""
-    with _LOCK:
-        print(f"[CART] add_item user={user_id} code={product_code} qty={qty} before={len(_cart.get(str(user_id), []))}")
-        items = [tuple(x) for x in _cart.get(str(user_id), [])]
-        for i, (code, name, q, p) in enumerate(items):
-            if code == product_code:
-                items[i] = (code, name, q + qty, p)
-                _cart[str(user_id)] = [list(x) for x in items]
-                save_cart()
-                print(f"[CART] add_item updated, after={len(items)}")
-                return
-        items.append((product_code, product_name, qty, price))
-        _cart[str(user_id)] = [list(x) for x in items]
-    save_cart()
-    print(f"[CART] add_item appended, after={len(items)}")
-
-
-# Загружаем корзины при импорте модуля
-load_cart()
+    key = str(user_id)
+    entry = await _entry(key)
+    with _lock_for(key):
+        item = entry.items.get(product_code)
+        if item is None:
+            entry.items[product_code] = CartItem(product_code, product_name, qty, price)
+        else:
+            item.qty += qty
+        entry.updated = time.time()
+    _mark_dirty(key)
+    await _schedule_flush()
+
+
+async def close_cart() -> None:
+    """Записывает оставшиеся изменения и закрывает хранилище (при остановке бота)."""
+    global _backend
+    if _backend is None:
+        return
+    await stop_writer()
+    await flush()
+    await _backend.close()
+    _backend = None
+    logging.info("[CART] итог: %s", stats())
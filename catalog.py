@@ -0,0 +1,282 @@
+# catalog.py — кэш каталога товаров в памяти
+# -------------------------------------------------
+# Каталог меняется редко, поэтому держим его целиком в RAM:
+# отсортированный по названию список и словарь code → товар.
+# Инвалидация — по NOTIFY из триггера на products
+# (migrations/001_products_notify.sql), страховка — TTL.
+# Остатки (stock, migrations/009_products_stock.sql) тоже берутся отсюда:
+# каждое списание при заказе приходит уведомлением и освежает товар.
+# Изменение только остатка не меняет version(): запись товара заменяется
+# на месте, а подписчики на остатки (add_stock_listener) сами решают,
+# что перерисовать, — иначе каждая покупка сбрасывала бы кэш страниц.
+# -------------------------------------------------
+
+import asyncio
+import bisect
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+
+import database
+from config import CATALOG_TTL, CATALOG_GROUP_BY_CATEGORY
+
+NOTIFY_CHANNEL = "products_changed"
+FULL_RELOAD = "*"  # payload уведомления «перечитать весь каталог»
+LOW_STOCK = 5  # «осталось N шт.» — при остатке не больше этого
+
+# Категория нужна только для группировки каталога (migrations/005_products_category.sql)
+_COLUMNS = "code, name, price, image_file_id, stock" + (", category" if CATALOG_GROUP_BY_CATEGORY else "")
+# Порядок задаёт _sort_key в Python, а не ORDER BY: сортировка по collation БД (ru_RU, en_US
+# игнорируют регистр и пунктуацию) не совпадает со сравнением строк, на котором держится bisect
+_SELECT_ALL = f"SELECT {_COLUMNS} FROM products"
+_SELECT_ONE = f"SELECT {_COLUMNS} FROM products WHERE code = $1"
+
+_products: List[asyncpg.Record] = []   # отсортирован по _sort_key
+_keys: List[Tuple[str, str]] = []      # _sort_key каждого товара из _products — для bisect
+_by_code: Dict[str, asyncpg.Record] = {}
+_loaded_at = 0.0
+_version = 0  # растёт при любом изменении каталога
+_reload_lock = asyncio.Lock()
+
+_listener: Optional[asyncpg.Connection] = None
+_pending: set = set()  # фоновые задачи обработки уведомлений
+_queued: set = set()   # payload'ы, которые уже ждут обработки: повторные уведомления сливаются
+
+_stats = {"hits": 0, "misses": 0, "reloads": 0, "invalidations": 0, "stock_updates": 0}
+
+# Подписчики на изменения: fn(code, product) — product None, если товар удалён;
+# code None — каталог перечитан целиком
+_change_listeners: List[Callable] = []
+# Подписчики на изменение только остатка: fn(product, previous)
+_stock_listeners: List[Callable] = []
+
+
+def _sort_key(product) -> Tuple[str, str]:
+    # Без учёта регистра, как привычно в каталоге; код — чтобы порядок одноимённых был однозначен
+    return product["name"].casefold(), product["code"]
+
+
+def _bump(code: Optional[str] = None, product=None) -> None:
+    global _version
+    _version += 1
+    for listener in _change_listeners:
+        try:
+            listener(code, product)
+        except Exception:
+            logging.exception("Ошибка подписчика каталога %r", listener)
+
+
+def add_change_listener(listener: Callable) -> None:
+    """Подписывает fn(code, product) на изменения каталога."""
+    _change_listeners.append(listener)
+
+
+def add_stock_listener(listener: Callable) -> None:
+    """Подписывает fn(product, previous) на изменения, затронувшие только остаток."""
+    _stock_listeners.append(listener)
+
+
+async def load(force: bool = True) -> None:
+    """Полностью перечитывает каталог из БД (force=False — только если TTL истёк)."""
+    global _products, _keys, _by_code, _loaded_at
+    async with _reload_lock:
+        # Пока ждали замок, каталог мог перечитать соседний запрос — не повторяем за ним
+        if not force and not _expired():
+            return
+        async with database.acquire() as conn:
+            rows = await conn.fetch(_SELECT_ALL)
+        _products = sorted(rows, key=_sort_key)
+        _keys = [_sort_key(row) for row in _products]
+        _by_code = {row["code"]: row for row in rows}
+        _loaded_at = time.monotonic()
+        _stats["reloads"] += 1
+        _bump()
+    logging.info("Каталог загружен: %d товаров", len(_products))
+
+
+def _expired() -> bool:
+    # При живом LISTEN TTL — только страховка от потерянных уведомлений
+    return time.monotonic() - _loaded_at > CATALOG_TTL
+
+
+def position(code: str) -> Optional[int]:
+    """Индекс товара в snapshot() или None, если его нет."""
+    product = _by_code.get(code)
+    if product is None:
+        return None
+    index = bisect.bisect_left(_keys, _sort_key(product))
+    if index == len(_keys) or _products[index]["code"] != code:
+        raise RuntimeError(f"Каталог: товар {code!r} не на своём месте в отсортированном списке")
+    return index
+
+
+def _remove(code: str) -> None:
+    index = position(code)
+    if index is not None:
+        del _by_code[code]
+        del _products[index]
+        del _keys[index]
+
+
+def _put(product: asyncpg.Record) -> None:
+    _remove(product["code"])
+    key = _sort_key(product)
+    index = bisect.bisect_left(_keys, key)
+    _products.insert(index, product)
+    _keys.insert(index, key)
+    _by_code[product["code"]] = product
+
+
+def _stock_only(previous, product) -> bool:
+    return all(previous[column] == product[column] for column in product.keys() if column != "stock")
+
+
+async def refresh_product(code: str) -> None:
+    """Точечно перечитывает один товар (добавлен, изменён или удалён)."""
+    async with database.acquire() as conn:
+        product = await conn.fetchrow(_SELECT_ONE, code)
+    previous = _by_code.get(code)
+    if product is not None and previous is not None and _stock_only(previous, product):
+        # Списание при заказе: место в списке то же, версия каталога не меняется
+        _products[position(code)] = product
+        _by_code[code] = product
+        _stats["stock_updates"] += 1
+        for listener in _stock_listeners:
+            try:
+                listener(product, previous)
+            except Exception:
+                logging.exception("Ошибка подписчика остатков %r", listener)
+        return
+    if product is None:
+        _remove(code)
+    else:
+        _put(product)
+    _stats["invalidations"] += 1
+    _bump(code, product)
+
+
+async def get_products() -> List[asyncpg.Record]:
+    """Все товары, отсортированные по названию."""
+    if _expired():
+        _stats["misses"] += 1
+        await load(force=False)
+    else:
+        _stats["hits"] += 1
+    return _products
+
+
+async def get_product(code: str) -> Optional[asyncpg.Record]:
+    """Товар по коду или None, если такого нет."""
+    if _expired():
+        _stats["misses"] += 1
+        await load(force=False)
+        return _by_code.get(code)
+
+    product = _by_code.get(code)
+    if product is not None:
+        _stats["hits"] += 1
+        return product
+
+    # Промах: возможно, уведомление о новом товаре ещё не дошло
+    _stats["misses"] += 1
+    async with database.acquire() as conn:
+        product = await conn.fetchrow(_SELECT_ONE, code)
+    if product is not None:
+        _put(product)
+        _bump(code, product)
+    return product
+
+
+def peek(code: str) -> Optional[asyncpg.Record]:
+    """Товар из кэша без запроса к БД (None — нет в кэше)."""
+    return _by_code.get(code)
+
+
+def availability(product) -> str:
+    """Наличие товара для показа: пусто, если остаток не ведётся."""
+    stock = product["stock"]
+    if stock is None:
+        return ""
+    if stock <= 0:
+        return "❌ нет в наличии"
+    if stock <= LOW_STOCK:
+        return f"⚠️ осталось {stock} шт."
+    return "✅ в наличии"
+
+
+def snapshot() -> List[asyncpg.Record]:
+    """Текущий список товаров без проверки TTL (после await get_products())."""
+    return _products
+
+
+def version() -> int:
+    """Номер версии каталога — для кэшей, построенных поверх него."""
+    return _version
+
+
+def stats() -> Dict[str, int]:
+    """Счётчики попаданий/промахов и размер каталога."""
+    return dict(_stats, size=len(_products), listening=int(_listener is not None))
+
+
+# ------------------------------
+# LISTEN/NOTIFY
+# ------------------------------
+def _spawn(coro) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def _handle(payload: str) -> None:
+    # Уведомление, пришедшее во время запроса, снова поставит товар в очередь
+    _queued.discard(payload)
+    try:
+        if payload == FULL_RELOAD:
+            await load(force=True)
+        else:
+            await refresh_product(payload)
+    except Exception:
+        logging.exception("Не удалось обработать уведомление каталога: %r", payload)
+
+
+def _on_notify(conn, pid, channel, payload) -> None:
+    # Распродажа горячего товара — поток уведомлений о нём; перечитываем один раз на пачку
+    if payload in _queued:
+        return
+    _queued.add(payload)
+    _spawn(_handle(payload))
+
+
+def _on_listener_lost(conn) -> None:
+    global _listener
+    _listener = None
+    logging.warning("Соединение LISTEN %s потеряно, каталог обновляется по TTL", NOTIFY_CHANNEL)
+
+
+async def start() -> None:
+    """Загружает каталог и подписывается на уведомления об изменениях."""
+    global _listener
+    await load()
+    try:
+        # LISTEN держит соединение всё время работы — берём его вне пула
+        conn = await database.get_db_connection()
+        await conn.add_listener(NOTIFY_CHANNEL, _on_notify)
+        conn.add_termination_listener(_on_listener_lost)
+        _listener = conn
+    except Exception:
+        logging.exception("LISTEN %s недоступен, каталог обновляется по TTL", NOTIFY_CHANNEL)
+
+
+async def stop() -> None:
+    """Отписывается от уведомлений и закрывает соединение LISTEN."""
+    global _listener
+    if _listener is not None:
+        conn, _listener = _listener, None
+        conn.remove_termination_listener(_on_listener_lost)  # закрываем сами — это не потеря LISTEN
+        await conn.close()
+    for task in list(_pending):
+        task.cancel()
+    logging.info("Кэш каталога: %s", stats())
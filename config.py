@@ -7,4 +7,90 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@" \
-               f"{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
\ No newline at end of file
+               f"{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+
+# Пул соединений с PostgreSQL
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5"))  # сек. ожидания свободного соединения
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))  # сек. простоя до закрытия
+
+# Кэш каталога товаров: страховочный TTL на случай потерянных NOTIFY
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "600"))
+# Постраничный каталог: товаров на странице и группировка по products.category
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "10"))
+CATALOG_GROUP_BY_CATEGORY = os.getenv("CATALOG_GROUP_BY_CATEGORY", "0") == "1"
+
+# Кэш зарегистрированных пользователей: сколько user_id помнить (LRU)
+KNOWN_USERS_CACHE_SIZE = int(os.getenv("KNOWN_USERS_CACHE_SIZE", "100000"))
+
+# История заказов: заказов на одной странице
+ORDERS_PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE", "5"))
+# Кэш отрисованных страниц истории (LRU по пользователям): предел памяти в байтах, 0 — без кэша
+ORDERS_CACHE_BYTES = int(os.getenv("ORDERS_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Хранилище корзин: json (файлы рядом с ботом), sqlite или postgres
+CART_BACKEND = os.getenv("CART_BACKEND", "json")
+CART_SQLITE_PATH = os.getenv("CART_SQLITE_PATH", "cart_store.sqlite3")
+
+# Запись корзин в хранилище
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "1"))  # фоновая запись не реже раза в N сек.
+CART_FLUSH_THRESHOLD = int(os.getenv("CART_FLUSH_THRESHOLD", "256"))  # ...или сразу при стольких изменённых корзинах
+CART_JOURNAL_COMPACT_BYTES = int(os.getenv("CART_JOURNAL_COMPACT_BYTES", str(4 * 1024 * 1024)))  # json: порог свёртки журнала в снимок
+
+# Состояния FSM (fsm_storage.py): memory, sqlite или postgres — по умолчанию там же, где корзины
+FSM_STORAGE = os.getenv("FSM_STORAGE", CART_BACKEND if CART_BACKEND in ("sqlite", "postgres") else "memory")
+FSM_TTL = float(os.getenv("FSM_TTL", "3600"))  # брошенный сценарий забывается через N сек. без изменений
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", "300"))  # период удаления просроченных состояний
+FSM_SWEEP_BATCH = int(os.getenv("FSM_SWEEP_BATCH", "1000"))  # строк за один DELETE
+
+# Горячий слой корзин в памяти
+CART_CACHE_SIZE = int(os.getenv("CART_CACHE_SIZE", "10000"))  # не больше стольких корзин в RAM (LRU)
+CART_CACHE_TTL = float(os.getenv("CART_CACHE_TTL", "1800"))  # вытеснять из RAM после N сек. без обращений
+CART_MAX_AGE = float(os.getenv("CART_MAX_AGE", str(30 * 24 * 3600)))  # удалять корзины, не менявшиеся N сек.
+CART_SWEEP_INTERVAL = float(os.getenv("CART_SWEEP_INTERVAL", "60"))  # период очистки и метрик в логе
+
+# Приём апдейтов: polling (локальная разработка) или webhook (aiohttp-сервер)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # публичный https-адрес бота, без пути
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None  # сверяется с X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "32"))  # апдейтов, обрабатываемых одновременно
+WEBHOOK_BACKLOG = int(os.getenv("WEBHOOK_BACKLOG", "1000"))  # очередь апдейтов; при переполнении — 503, Telegram повторит
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # одновременных запросов от Telegram (1–100)
+
+# Несколько процессов (supervisor.py): при BOT_WORKERS > 1 main.py раздаёт апдейты воркерам по user_id
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "64"))  # апдейтов в обработке в одном воркере
+WORKER_BACKLOG = int(os.getenv("WORKER_BACKLOG", "1000"))  # очередь воркера у супервизора; полная — приём ждёт
+WORKER_REPORT_INTERVAL = float(os.getenv("WORKER_REPORT_INTERVAL", "60"))  # апдейтов/с по воркерам в лог раз в N сек.
+
+# Метрики задержек (metrics.py): middleware хендлеров, время запросов к БД и Bot API
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "60"))  # сводка в лог раз в N сек. (0 — выключить)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # порт эндпоинта /metrics для Prometheus (0 — не поднимать)
+
+# Исходящие вызовы Bot API (outbound.py): лимиты Telegram и повтор после RetryAfter
+OUTBOUND_RATE_LIMIT = os.getenv("OUTBOUND_RATE_LIMIT", "1") == "1"
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))  # вызовов в секунду на весь бот
+OUTBOUND_GLOBAL_BURST = float(os.getenv("OUTBOUND_GLOBAL_BURST", "30"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))  # сообщений в секунду в один личный чат
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))  # ...с коротким всплеском (несколько ответов подряд)
+OUTBOUND_GROUP_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_PER_MINUTE", "20"))  # сообщений в минуту в группу
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))  # повторов после RetryAfter
+
+# Пропуск правок сообщений без изменений (edit_cache.py): сколько отпечатков помнить (LRU)
+EDIT_CACHE_SIZE = int(os.getenv("EDIT_CACHE_SIZE", "50000"))
+
+# Администраторы бота: user_id через запятую (загрузка фото товаров и другие служебные команды)
+ADMIN_IDS = tuple(int(user_id) for user_id in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if user_id)
+# Массовая загрузка фото товаров (image_ingest.py): одновременных отправок в Telegram
+IMAGE_UPLOAD_PARALLEL = int(os.getenv("IMAGE_UPLOAD_PARALLEL", "4"))
+
+# Сводки продаж для /stats (analytics.py): обновление из новых заказов раз в N сек. (0 — только по /stats)
+SALES_REFRESH_INTERVAL = float(os.getenv("SALES_REFRESH_INTERVAL", "300"))
+SALES_REFRESH_LAG = float(os.getenv("SALES_REFRESH_LAG", "60"))  # заказы моложе N сек. ждут следующего раза
+SALES_REFRESH_BATCH = int(os.getenv("SALES_REFRESH_BATCH", "5000"))  # заказов за одну транзакцию обновления
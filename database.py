@@ -1,10 +1,91 @@
 # database.py
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
 import asyncpg
-from config import DATABASE_URL
+import metrics
+from config import (
+    DATABASE_URL,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_ACQUIRE_TIMEOUT,
+    DB_POOL_MAX_INACTIVE_LIFETIME,
+    METRICS_ENABLED,
+)
+
+# Общий пул соединений: создаётся в main.on_startup, закрывается в on_shutdown
+_pool: Optional[asyncpg.Pool] = None
+# Сколько корутин сейчас ждут свободное соединение
+_waiters = 0
+
 
 async def get_db_connection():
+    """Отдельное соединение вне пула — для разовых скриптов. Хендлеры используют acquire()."""
     return await asyncpg.connect(DATABASE_URL)
 
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    # Каждое соединение пула отдаёт время своих запросов в metrics
+    conn.add_query_logger(metrics.log_query)
+
+
+async def create_pool() -> asyncpg.Pool:
+    """Создаёт общий пул соединений (повторный вызов возвращает уже созданный)."""
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_LIFETIME,
+            init=_init_connection if METRICS_ENABLED else None,
+        )
+    return _pool
+
+
+async def close_pool() -> None:
+    """Корректно закрывает пул, дожидаясь возврата занятых соединений."""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+@asynccontextmanager
+async def acquire() -> AsyncIterator[asyncpg.Connection]:
+    """Берёт соединение из пула на время блока `async with` и возвращает его обратно."""
+    global _waiters
+    if _pool is None:
+        raise RuntimeError("Пул соединений не создан: вызовите database.create_pool() при старте")
+    pool = _pool
+    _waiters += 1
+    started = time.perf_counter()
+    try:
+        conn = await pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT)
+    finally:
+        _waiters -= 1
+        metrics.observe("db_pool_acquire_seconds", time.perf_counter() - started)
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+def pool_stats() -> Dict[str, int]:
+    """Текущее состояние пула: занято, свободно, ожидающих, размер."""
+    if _pool is None:
+        return {"size": 0, "in_use": 0, "idle": 0, "waiters": _waiters, "max_size": DB_POOL_MAX_SIZE}
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    return {
+        "size": size,
+        "in_use": size - idle,
+        "idle": idle,
+        "waiters": _waiters,
+        "max_size": _pool.get_max_size(),
+    }
+
 # async def create_tables():
 #     conn = await get_db_connection()
 #     # Table creation is disabled for now
@@ -17,4 +98,4 @@ async def get_db_connection():
 #     #         created_at TIMESTAMP DEFAULT NOW()
 #     #     )
 #     # ''')
-#     # await conn.close()
\ No newline at end of file
+#     # await conn.close()
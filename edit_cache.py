@@ -0,0 +1,104 @@
+# edit_cache.py — пропуск правок сообщения, которые ничего не меняют
+# -------------------------------------------------
+# Повторное нажатие «🧺 Моя корзина» или «🔍 Просмотреть товары» заново
+# рисует то же самое, и Telegram отвечает на edit_text ошибкой
+# «message is not modified», потратив вызов API из лимита.
+#
+# Middleware сессии бота помнит отпечаток (hash текста, parse_mode,
+# entities, превью ссылок и клавиатуры) последней правки каждого
+# сообщения — (чат, message_id)
+# или inline_message_id — и пропускает EditMessageText с тем же
+# отпечатком, сразу возвращая True. Хендлер при этом без задержки
+# переходит к callback.answer(). Любая другая правка сообщения
+# (фото, подпись, клавиатура, удаление) отпечаток сбрасывает.
+# Отпечатков не больше EDIT_CACHE_SIZE, лишние вытесняются по LRU.
+# -------------------------------------------------
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest
+
+from config import EDIT_CACHE_SIZE
+
+# Методы, после которых сообщение выглядит иначе, чем говорит отпечаток
+_INVALIDATING = {
+    "EditMessageMedia", "EditMessageCaption", "EditMessageReplyMarkup",
+    "EditMessageLiveLocation", "DeleteMessage",
+}
+
+
+def _message_key(method) -> Optional[Tuple]:
+    inline_id = getattr(method, "inline_message_id", None)
+    if inline_id:
+        return ("inline", inline_id)
+    chat_id = getattr(method, "chat_id", None)
+    message_id = getattr(method, "message_id", None)
+    if chat_id is None or message_id is None:
+        return None
+    return (chat_id, message_id)
+
+
+def _fingerprint(method) -> int:
+    markup = method.reply_markup
+    return hash((
+        method.text,
+        str(method.parse_mode),
+        repr(method.entities),
+        # Та же правка с другим превью ссылки меняет сообщение — пропускать её нельзя
+        repr(method.link_preview_options),
+        repr(method.disable_web_page_preview),
+        markup.model_dump_json(exclude_none=True) if markup is not None else None,
+    ))
+
+
+class EditDedupMiddleware(BaseRequestMiddleware):
+    """Пропускает EditMessageText, если сообщение уже показывает ровно это."""
+
+    def __init__(self, size: int = EDIT_CACHE_SIZE):
+        self.size = size
+        self._seen: "OrderedDict[Tuple, int]" = OrderedDict()
+        self._stats = {"edits": 0, "skipped": 0, "not_modified": 0}
+
+    def _remember(self, key: Tuple, fingerprint: int) -> None:
+        self._seen[key] = fingerprint
+        self._seen.move_to_end(key)
+        if len(self._seen) > self.size:
+            self._seen.popitem(last=False)
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        if name in _INVALIDATING:
+            key = _message_key(method)
+            if key is not None:
+                self._seen.pop(key, None)
+            return await make_request(bot, method)
+        if name != "EditMessageText":
+            return await make_request(bot, method)
+
+        key = _message_key(method)
+        if key is None:
+            return await make_request(bot, method)
+        fingerprint = _fingerprint(method)
+        if self._seen.get(key) == fingerprint:
+            self._seen.move_to_end(key)
+            self._stats["skipped"] += 1
+            return True
+
+        self._stats["edits"] += 1
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                self._seen.pop(key, None)
+                raise
+            # Правку сделали мимо кэша (другой процесс, перезапуск) — содержимое уже такое
+            self._stats["not_modified"] += 1
+            result = True
+        self._remember(key, fingerprint)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """Сделанные и пропущенные правки, размер кэша отпечатков."""
+        return dict(self._stats, size=len(self._seen))
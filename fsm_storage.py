@@ -0,0 +1,358 @@
+# fsm_storage.py — хранилище состояний FSM aiogram в SQLite или PostgreSQL
+# -------------------------------------------------
+# Состояния сценариев (например, AddToCart.waiting_for_quantity) живут
+# в том же хранилище, что и корзины: таблица fsm_states в файле SQLite
+# (CART_SQLITE_PATH) или в основной БД (migrations/006_fsm_states.sql).
+# Поэтому они переживают перезапуск и видны всем процессам бота.
+#
+# У каждой записи есть срок жизни: любое изменение продлевает его на
+# FSM_TTL, а просроченная запись при чтении считается пустой — брошенный
+# на полпути сценарий просто исчезает. Сброшенные состояния (state.clear())
+# помечаются просроченными сразу. Физически строки удаляет фоновая задача
+# пачками по FSM_SWEEP_BATCH раз в FSM_SWEEP_INTERVAL, поэтому ни память,
+# ни таблица не растут от миллионов брошенных сценариев.
+#
+# FSM_STORAGE=memory — стандартный MemoryStorage aiogram для разработки
+# (по умолчанию, если корзины лежат в JSON).
+# -------------------------------------------------
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import database
+from cart_backends import BASE_DIR, _in_thread
+from config import (
+    FSM_STORAGE,
+    FSM_TTL,
+    FSM_SWEEP_INTERVAL,
+    FSM_SWEEP_BATCH,
+    CART_SQLITE_PATH,
+)
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(str(part) if part is not None else "" for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+    ))
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class ExpiringStorage(BaseStorage):
+    """Общая часть: фоновая очистка просроченных записей пачками."""
+
+    name = "base"
+
+    def __init__(self, ttl: float = FSM_TTL):
+        self.ttl = ttl
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        """Готовит таблицу и запускает фоновую очистку."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def sweep(self) -> int:
+        """Удаляет все просроченные записи пачками. Возвращает их число."""
+        total = 0
+        while True:
+            deleted = await self._delete_expired(FSM_SWEEP_BATCH)
+            total += deleted
+            if deleted < FSM_SWEEP_BATCH:
+                return total
+            await asyncio.sleep(0)  # не держим event loop между пачками
+
+    async def _delete_expired(self, limit: int) -> int:
+        raise NotImplementedError
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(FSM_SWEEP_INTERVAL)
+            try:
+                deleted = await self.sweep()
+                if deleted:
+                    logging.info("[FSM] удалено просроченных состояний: %d", deleted)
+            except Exception:
+                logging.exception("[FSM] ошибка очистки состояний")
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+
+# ------------------------------
+# SQLite (WAL): таблица fsm_states рядом с корзинами
+# ------------------------------
+class SQLiteStorage(ExpiringStorage):
+    """FSM в файле SQLite; несколько процессов на одной машине работают с одним файлом."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = CART_SQLITE_PATH, ttl: float = FSM_TTL):
+        super().__init__(ttl)
+        self.path = os.path.join(BASE_DIR, path)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _open_sync(self) -> None:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                key        TEXT PRIMARY KEY,
+                state      TEXT,
+                data       TEXT NOT NULL DEFAULT '{}',
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS fsm_states_expires_at_idx ON fsm_states (expires_at)")
+        self._conn = conn
+
+    def _get_sync(self, key: str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT state, data FROM fsm_states WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+
+    def _set_state_sync(self, key: str, state: Optional[str]) -> None:
+        now = time.time()
+        with self._lock:
+            if state is None:
+                # Без состояния и данных запись не нужна — сразу просрочена
+                self._conn.execute("""
+                    UPDATE fsm_states SET state = NULL,
+                        expires_at = CASE WHEN data = '{}' OR expires_at <= ? THEN ? ELSE ? END
+                    WHERE key = ?
+                """, (now, now, now + self.ttl, key))
+                return
+            self._conn.execute("""
+                INSERT INTO fsm_states (key, state, data, expires_at) VALUES (?, ?, '{}', ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    state = excluded.state,
+                    data = CASE WHEN fsm_states.expires_at > ? THEN fsm_states.data ELSE '{}' END,
+                    expires_at = excluded.expires_at
+            """, (key, state, now + self.ttl, now))
+
+    def _set_data_sync(self, key: str, data: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            if not data:
+                self._conn.execute("""
+                    UPDATE fsm_states SET data = '{}',
+                        expires_at = CASE WHEN state IS NULL OR expires_at <= ? THEN ? ELSE ? END
+                    WHERE key = ?
+                """, (now, now, now + self.ttl, key))
+                return
+            self._conn.execute("""
+                INSERT INTO fsm_states (key, state, data, expires_at) VALUES (?, NULL, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    state = CASE WHEN fsm_states.expires_at > ? THEN fsm_states.state END,
+                    data = excluded.data,
+                    expires_at = excluded.expires_at
+            """, (key, _dumps(data), now + self.ttl, now))
+
+    def _update_data_sync(self, key: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE: чтение и запись без вклинившегося соседнего процесса
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT state, data FROM fsm_states WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                state, current = (row[0], json.loads(row[1])) if row else (None, {})
+                current.update(data)
+                self._conn.execute("""
+                    INSERT INTO fsm_states (key, state, data, expires_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        state = excluded.state, data = excluded.data, expires_at = excluded.expires_at
+                """, (key, state, _dumps(current), now + self.ttl))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return current
+
+    def _delete_expired_sync(self, limit: int) -> int:
+        with self._lock:
+            return self._conn.execute("""
+                DELETE FROM fsm_states WHERE key IN (
+                    SELECT key FROM fsm_states WHERE expires_at <= ? LIMIT ?
+                )
+            """, (time.time(), limit)).rowcount
+
+    def _close_sync(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def open(self) -> None:
+        await _in_thread(self._open_sync)
+        await super().open()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await _in_thread(self._get_sync, _key(key))
+        return row[0] if row else None
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await _in_thread(self._get_sync, _key(key))
+        return json.loads(row[1]) if row else {}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await _in_thread(self._set_state_sync, _key(key), _state_name(state))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await _in_thread(self._set_data_sync, _key(key), data)
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await _in_thread(self._update_data_sync, _key(key), data)
+
+    async def _delete_expired(self, limit: int) -> int:
+        return await _in_thread(self._delete_expired_sync, limit)
+
+    async def close(self) -> None:
+        await super().close()
+        await _in_thread(self._close_sync)
+
+
+# ------------------------------
+# PostgreSQL: таблица fsm_states в основной БД
+# ------------------------------
+class PostgresStorage(ExpiringStorage):
+    """FSM в основной БД (migrations/006_fsm_states.sql): каждая операция — один запрос через пул."""
+
+    name = "postgres"
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        async with database.acquire() as conn:
+            return await conn.fetchval(
+                "SELECT state FROM fsm_states WHERE key = $1 AND expires_at > now()", _key(key)
+            )
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        async with database.acquire() as conn:
+            data = await conn.fetchval(
+                "SELECT data FROM fsm_states WHERE key = $1 AND expires_at > now()", _key(key)
+            )
+        return json.loads(data) if data is not None else {}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = _state_name(state)
+        async with database.acquire() as conn:
+            if state is None:
+                # Без состояния и данных запись не нужна — сразу просрочена
+                await conn.execute("""
+                    UPDATE fsm_states SET state = NULL,
+                        expires_at = CASE WHEN data = '{}'::jsonb OR expires_at <= now()
+                                          THEN now() ELSE now() + make_interval(secs => $2) END
+                    WHERE key = $1
+                """, _key(key), self.ttl)
+                return
+            await conn.execute("""
+                INSERT INTO fsm_states (key, state, data, expires_at)
+                VALUES ($1, $2, '{}'::jsonb, now() + make_interval(secs => $3))
+                ON CONFLICT (key) DO UPDATE SET
+                    state = EXCLUDED.state,
+                    data = CASE WHEN fsm_states.expires_at > now() THEN fsm_states.data ELSE '{}'::jsonb END,
+                    expires_at = EXCLUDED.expires_at
+            """, _key(key), state, self.ttl)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        async with database.acquire() as conn:
+            if not data:
+                await conn.execute("""
+                    UPDATE fsm_states SET data = '{}'::jsonb,
+                        expires_at = CASE WHEN state IS NULL OR expires_at <= now()
+                                          THEN now() ELSE now() + make_interval(secs => $2) END
+                    WHERE key = $1
+                """, _key(key), self.ttl)
+                return
+            await conn.execute("""
+                INSERT INTO fsm_states (key, state, data, expires_at)
+                VALUES ($1, NULL, $2::jsonb, now() + make_interval(secs => $3))
+                ON CONFLICT (key) DO UPDATE SET
+                    state = CASE WHEN fsm_states.expires_at > now() THEN fsm_states.state END,
+                    data = EXCLUDED.data,
+                    expires_at = EXCLUDED.expires_at
+            """, _key(key), _dumps(data), self.ttl)
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        # Слияние прямо в БД (jsonb || jsonb — как dict.update): один запрос и без гонок между процессами
+        async with database.acquire() as conn:
+            merged = await conn.fetchval("""
+                INSERT INTO fsm_states (key, state, data, expires_at)
+                VALUES ($1, NULL, $2::jsonb, now() + make_interval(secs => $3))
+                ON CONFLICT (key) DO UPDATE SET
+                    state = CASE WHEN fsm_states.expires_at > now() THEN fsm_states.state END,
+                    data = CASE WHEN fsm_states.expires_at > now() THEN fsm_states.data ELSE '{}'::jsonb END
+                           || EXCLUDED.data,
+                    expires_at = EXCLUDED.expires_at
+                RETURNING data
+            """, _key(key), _dumps(data), self.ttl)
+        return json.loads(merged)
+
+    async def _delete_expired(self, limit: int) -> int:
+        async with database.acquire() as conn:
+            # SKIP LOCKED: несколько процессов чистят таблицу, не мешая друг другу
+            status = await conn.execute("""
+                DELETE FROM fsm_states WHERE key IN (
+                    SELECT key FROM fsm_states WHERE expires_at <= now()
+                    LIMIT $1 FOR UPDATE SKIP LOCKED
+                )
+            """, limit)
+        return int(status.split()[-1])  # "DELETE <n>"
+
+
+STORAGES = {
+    SQLiteStorage.name: SQLiteStorage,
+    PostgresStorage.name: PostgresStorage,
+}
+
+# Хранилище бота (create_storage в main.py)
+storage: Optional[BaseStorage] = None
+
+
+def create_storage(name: str = FSM_STORAGE) -> BaseStorage:
+    """Хранилище FSM для Dispatcher: memory, sqlite или postgres."""
+    global storage
+    if name == "memory":
+        storage = MemoryStorage()
+    else:
+        try:
+            storage = STORAGES[name]()
+        except KeyError:
+            raise ValueError(f"Неизвестное хранилище FSM: {name!r}, доступны: memory, {', '.join(STORAGES)}")
+    return storage
+
+
+async def start() -> None:
+    """Открывает хранилище и запускает очистку (после database.create_pool)."""
+    if isinstance(storage, ExpiringStorage):
+        await storage.open()
+        logging.info("[FSM] состояния в %s, срок жизни %s с", storage.name, storage.ttl)
+
+
+async def stop() -> None:
+    """Останавливает очистку и закрывает хранилище."""
+    if storage is not None:
+        await storage.close()
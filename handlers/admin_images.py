@@ -0,0 +1,51 @@
+# handlers/admin_images.py
+# Администратор присылает zip-архив с фото товаров (файлы <код>.jpg) с подписью /images —
+# бот загружает их и пишет image_file_id в products (см. image_ingest.py).
+# Bot API отдаёт боту файлы не больше 20 МБ — архив крупнее загружается
+# с сервера командой python -m tools.ingest_images
+
+import asyncio
+import logging
+import os
+import tempfile
+
+from aiogram import Bot, F, Router, types
+
+import image_ingest
+from config import ADMIN_IDS
+
+router = Router()
+
+MAX_DOWNLOAD_SIZE = 20 * 1024 * 1024  # предел getFile в Bot API
+
+_running: set = set()  # фоновые загрузки (ссылки, чтобы задачи не собрал GC)
+
+
+async def _ingest_archive(bot: Bot, message: types.Message) -> None:
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "images.zip")
+            await bot.download(message.document, destination=path)
+            report = await image_ingest.ingest(bot, path, message.chat.id)
+        await message.answer("🖼 Загрузка фото завершена\n" + image_ingest.format_report(report))
+    except Exception as e:
+        logging.exception("[IMAGES] ошибка загрузки архива %s", message.document.file_name)
+        await message.answer(f"❌ Не удалось загрузить фото: {e}")
+
+
+@router.message(F.document, F.caption == "/images", F.from_user.id.in_(ADMIN_IDS))
+async def admin_images(message: types.Message, bot: Bot):
+    if not (message.document.file_name or "").lower().endswith(".zip"):
+        await message.answer("❌ Нужен zip-архив с файлами <код товара>.jpg / .png / .webp")
+        return
+    if (message.document.file_size or 0) > MAX_DOWNLOAD_SIZE:
+        await message.answer(
+            f"❌ Архив больше {MAX_DOWNLOAD_SIZE // (1024 * 1024)} МБ — Telegram не отдаст его боту.\n"
+            "Разбейте его на части или загрузите с сервера: python -m tools.ingest_images <архив или каталог>"
+        )
+        return
+    await message.answer("⏳ Загружаю фото, по окончании пришлю итог…")
+    # Архив на тысячи фото грузится минутами — не держим апдейт (и воркер webhook)
+    task = asyncio.get_running_loop().create_task(_ingest_archive(bot, message))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
@@ -0,0 +1,58 @@
+# handlers/admin_stats.py
+# Статистика продаж для администраторов (ADMIN_IDS), по сводным таблицам analytics.py:
+#   /stats [дней]     — выручка по дням, топ товаров, средний чек, доля повторных покупателей
+#   /stats_csv [дней] — те же данные CSV-файлами
+
+import logging
+
+from aiogram import F, Router, types
+from aiogram.filters import Command, CommandObject
+
+import analytics
+from config import ADMIN_IDS
+
+router = Router()
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+
+
+def _days(command: CommandObject) -> int:
+    arg = (command.args or "").strip()
+    if not arg.isdigit():
+        return DEFAULT_DAYS
+    return min(max(int(arg), 1), MAX_DAYS)
+
+
+async def _report(message: types.Message, command: CommandObject):
+    try:
+        await analytics.refresh()  # досчитываем заказы с прошлого обновления
+        return await analytics.summary(_days(command))
+    except Exception as e:
+        logging.exception("[ANALYTICS] ошибка построения отчёта")
+        await message.answer(f"❌ Не удалось построить отчёт: {e}")
+        return None
+
+
+@router.message(Command("stats"), F.from_user.id.in_(ADMIN_IDS))
+async def admin_stats(message: types.Message, command: CommandObject):
+    report = await _report(message, command)
+    if report is not None:
+        await message.answer(analytics.render(report))
+
+
+@router.message(Command("stats_csv"), F.from_user.id.in_(ADMIN_IDS))
+async def admin_stats_csv(message: types.Message, command: CommandObject):
+    report = await _report(message, command)
+    if report is None:
+        return
+    suffix = f"{report['since']:%Y%m%d}_{report['days']}d"
+    files = {
+        f"sales_daily_{suffix}.csv": report["daily"],
+        f"sales_products_{suffix}.csv": await analytics.top_products(report["since"], limit=None),
+    }
+    for name, rows in files.items():
+        if rows:
+            await message.answer_document(types.BufferedInputFile(analytics.to_csv(rows), filename=name))
+    if not any(files.values()):
+        await message.answer("📭 За этот период продаж нет")
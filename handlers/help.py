@@ -1,6 +1,7 @@
 # handlers/help.py
-from aiogram import Router, types, F
+from aiogram import Router, types
 from aiogram.filters import Command
+import callback_dispatch
 
 router = Router()
 
@@ -12,6 +13,8 @@ async def send_help(target: types.Message | types.CallbackQuery):
         "🔹 /help — показать эту справку.\n\n"
         "🛍 Работа с товарами:\n"
         "   • /products — показать список доступных товаров с ценами.\n"
+        "   • /search <запрос> — поиск товара по названию или коду, можно с опечатками и по-русски.\n"
+        "   • @имя_бота <запрос> в любом чате — тот же поиск в inline-режиме.\n"
         "   • Нажмите на товар, чтобы выбрать его и указать количество для добавления в корзину.\n\n"
         "🛒 Работа с корзиной:\n"
         "   • /cart — показать содержимое корзины: товары, количество, стоимость и общую сумму.\n"
@@ -38,6 +41,6 @@ async def cmd_help(message: types.Message):
     await send_help(message)
 
 # Хендлер нажатия кнопки "Помощь" в inline‑меню
-@router.callback_query(F.data == "help")
+@callback_dispatch.on("help")
 async def cb_help(callback: types.CallbackQuery):
     await send_help(callback)
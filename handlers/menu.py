@@ -17,9 +17,3 @@ async def menu_cart(message: types.Message):
 @router.message(F.text == "📜 Мои заказы")
 async def menu_orders(message: types.Message):
     await show_orders(message)
-
-# просмотр корзины
-@router.callback_query(F.data == "view_cart")
-async def menu_inline_cart(callback: types.CallbackQuery):
-    await show_cart(callback)
-    await callback.answer()
@@ -1,21 +1,22 @@
 # handlers/menu_inline.py — обработчики callback'ов стартового меню
-from aiogram import Router, types, F
+# Нажатия разбирает callback_dispatch, своего роутера у модуля нет
+from aiogram import types
 from keyboards.inline_main import get_inline_main_menu
 from handlers.products import show_products, show_cart  # общие функции
-router = Router()
+import callback_dispatch
 
-@router.callback_query(F.data == "browse_products")
+@callback_dispatch.on("browse_products")
 async def cb_browse_products(callback: types.CallbackQuery):
     await show_products(callback)
     await callback.answer()
 
-@router.callback_query(F.data == "view_cart")
+@callback_dispatch.on("view_cart")
 async def cb_view_cart(callback: types.CallbackQuery):
     await show_cart(callback)
     await callback.answer()
 
 # возврат в главное меню
-@router.callback_query(F.data == "back_to_main")
+@callback_dispatch.on("back_to_main")
 async def cb_back_to_main(callback: types.CallbackQuery):
     await callback.message.edit_text(
         "🏠 Главное меню",
@@ -23,4 +24,4 @@ async def cb_back_to_main(callback: types.CallbackQuery):
     )
     await callback.answer()
 
-# clear_cart есть как callback; важно, чтобы callback_data совпадала: "clear_cart"
+# clear_cart обрабатывает handlers/products.py; callback_data кнопки — "clear_cart"
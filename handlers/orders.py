@@ -1,48 +1,232 @@
+import json
+import sys
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict
+
 from aiogram import Router, types, F
-from database import get_db_connection
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from config import ORDERS_CACHE_BYTES, ORDERS_PAGE_SIZE
+from database import acquire
+from keyboards.callbacks import OrdersPage
+from keyboards.inline_main import get_back_to_main_button
+import callback_dispatch
 
 router = Router()
 
-@router.message(F.text == "/orders")
-async def show_orders(message: types.Message):
-    user_id = message.from_user.id
-    conn = await get_db_connection()
+# Лимит Telegram на длину текста сообщения
+MESSAGE_LIMIT = 4096
 
-    # Получаем все заказы пользователя
-    orders = await conn.fetch("""
+# Направления листания: к более старым заказам и к более новым
+OLDER = "older"
+NEWER = "newer"
+
+# Один запрос на страницу: заказы по ключу (created_at, order_id) + состав, собранный в JSON.
+# Опирается на индексы из migrations/002_orders_indexes.sql.
+_PAGE_SQL = """
+    SELECT o.order_id, o.total_price, o.created_at,
+           COALESCE(
+               json_agg(
+                   json_build_object(
+                       'name', COALESCE(p.name, oi.product_code),
+                       'qty', oi.quantity,
+                       'price', oi.price_per_unit
+                   )
+               ) FILTER (WHERE oi.order_id IS NOT NULL),
+               '[]'
+           ) AS items
+    FROM (
         SELECT order_id, total_price, created_at
         FROM orders
-        WHERE user_id = $1
-        ORDER BY created_at DESC
-    """, user_id)
+        WHERE user_id = $1 {cursor}
+        ORDER BY created_at {direction}, order_id {direction}
+        LIMIT {limit}
+    ) o
+    LEFT JOIN order_items oi ON oi.order_id = o.order_id
+    LEFT JOIN products p ON p.code = oi.product_code
+    GROUP BY o.order_id, o.total_price, o.created_at
+    ORDER BY o.created_at {direction}, o.order_id {direction}
+"""
 
-    if not orders:
-        await message.answer("📭 У вас пока нет заказов.")
-        await conn.close()
-        return
 
+def _page_sql(direction: str | None) -> str:
+    # На одну запись больше размера страницы — чтобы понять, есть ли следующая
+    limit = ORDERS_PAGE_SIZE + 1
+    if direction == NEWER:
+        return _PAGE_SQL.format(cursor="AND (created_at, order_id) > ($2, $3)", direction="ASC", limit=limit)
+    if direction == OLDER:
+        return _PAGE_SQL.format(cursor="AND (created_at, order_id) < ($2, $3)", direction="DESC", limit=limit)
+    return _PAGE_SQL.format(cursor="", direction="DESC", limit=limit)
+
+
+def _cursor_data(direction: str, order) -> str:
+    # Ключ страницы в callback_data: направление и (created_at, order_id) крайнего заказа
+    return OrdersPage(
+        direction=direction, created_at=order["created_at"].isoformat(), order_id=order["order_id"]
+    ).pack()
+
+
+async def fetch_orders_page(user_id: int, direction: str | None = None,
+                            created_at: datetime | None = None, order_id: int | None = None):
+    """Страница заказов (от новых к старым) и флаги наличия более новых/старых страниц."""
+    args = [user_id] if direction is None else [user_id, created_at, order_id]
+    async with acquire() as conn:
+        rows = await conn.fetch(_page_sql(direction), *args)
+
+    has_more = len(rows) > ORDERS_PAGE_SIZE
+    rows = rows[:ORDERS_PAGE_SIZE]
+    if direction == NEWER:
+        rows.reverse()
+        return rows, has_more, True
+    return rows, direction == OLDER, has_more
+
+
+def render_orders_page(rows, has_newer: bool, has_older: bool):
+    """Текст страницы истории заказов и клавиатура навигации."""
     text_lines = ["📜 История ваших заказов:\n"]
 
-    for order in orders:
+    for order in rows:
         text_lines.append(
             f"🆔 Заказ №{order['order_id']} от {order['created_at'].strftime('%d.%m.%Y %H:%M')}\n"
             f"💰 Сумма: {order['total_price']} руб."
         )
+        for item in json.loads(order["items"]):
+            qty, price = item["qty"], item["price"]
+            text_lines.append(f"   • {item['name']} — {qty} шт. × {price} руб. = {qty * price} руб.")
+        text_lines.append("")  # пустая строка между заказами
 
-        # Получаем состав заказа
-        items = await conn.fetch("""
-            SELECT oi.product_code, p.name, oi.quantity, oi.price_per_unit
-            FROM order_items oi
-            JOIN products p ON p.code = oi.product_code
-            WHERE oi.order_id = $1
-        """, order["order_id"])
+    text = "\n".join(text_lines)
+    if len(text) > MESSAGE_LIMIT:
+        text = text[:MESSAGE_LIMIT - 1] + "…"
 
-        for code, name, qty, price in items:
-            item_sum = qty * price
-            text_lines.append(f"   • {name} — {qty} шт. × {price} руб. = {item_sum} руб.")
+    nav = []
+    if has_newer:
+        nav.append(InlineKeyboardButton(text="⬅️ Новее", callback_data=_cursor_data(NEWER, rows[0])))
+    if has_older:
+        nav.append(InlineKeyboardButton(text="Старее ➡️", callback_data=_cursor_data(OLDER, rows[-1])))
+
+    keyboard = [nav] if nav else []
+    keyboard.append(get_back_to_main_button())
+    return text, InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+# ------------------------------
+# Кэш отрисованных страниц
+# ------------------------------
+# История пользователя меняется только при оформлении заказа, поэтому готовые
+# страницы (текст и клавиатура) держим в памяти: user_id → {(направление, order_id
+# курсора): страница}, пользователи в порядке LRU, общий объём — не больше
+# ORDERS_CACHE_BYTES. send_order после коммита сбрасывает страницы пользователя
+# (invalidate). В режиме supervisor все апдейты пользователя попадают в один
+# воркер, так что кэш процесса не расходится с БД.
+_PAGE_OVERHEAD = 1024  # примерная память клавиатуры и ключа, сверх текста
+
+_pages: "OrderedDict[int, dict]" = OrderedDict()
+_user_bytes: Dict[int, int] = {}
+_bytes = 0
+# Пользователи, чьи страницы сейчас читаются из БД: число чтений и номер сброса.
+# Сброс во время чтения увеличивает номер — прочитанная до него страница в кэш не попадёт.
+# Запись живёт, только пока идут чтения, поэтому словари не растут с числом покупателей
+_loading: Dict[int, int] = {}
+_generations: Dict[int, int] = {}
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+def _drop(user_id: int) -> None:
+    global _bytes
+    _pages.pop(user_id, None)
+    _bytes -= _user_bytes.pop(user_id, 0)
 
-        text_lines.append("")  # пустая строка между заказами
 
-    await conn.close()
+def _page_bytes(page) -> int:
+    return _PAGE_OVERHEAD + (sys.getsizeof(page[0]) if page is not None else 0)
+
+
+def _remember(user_id: int, key, page) -> None:
+    global _bytes
+    pages = _pages.setdefault(user_id, {})
+    # Два одновременных промаха по одной странице: вторая запись заменяет первую, а не добавляется
+    size = _page_bytes(page) - (_page_bytes(pages[key]) if key in pages else 0)
+    pages[key] = page
+    _pages.move_to_end(user_id)
+    _user_bytes[user_id] = _user_bytes.get(user_id, 0) + size
+    _bytes += size
+    while _bytes > ORDERS_CACHE_BYTES and _pages:
+        _drop(next(iter(_pages)))
+        _stats["evictions"] += 1
+
+
+async def get_orders_page(user_id: int, direction: str | None = None,
+                          created_at: datetime | None = None, order_id: int | None = None):
+    """Страница истории (текст, клавиатура) из кэша или из БД; None — заказов на ней нет."""
+    key = (direction, order_id)
+    pages = _pages.get(user_id)
+    if pages is not None and key in pages:
+        _pages.move_to_end(user_id)
+        _stats["hits"] += 1
+        return pages[key]
+
+    _stats["misses"] += 1
+    _loading[user_id] = _loading.get(user_id, 0) + 1
+    generation = _generations.get(user_id, 0)
+    try:
+        rows, has_newer, has_older = await fetch_orders_page(user_id, direction, created_at, order_id)
+        page = render_orders_page(rows, has_newer, has_older) if rows else None
+        if ORDERS_CACHE_BYTES > 0 and generation == _generations.get(user_id, 0):
+            _remember(user_id, key, page)
+    finally:
+        _loading[user_id] -= 1
+        if not _loading[user_id]:
+            del _loading[user_id]
+            _generations.pop(user_id, None)
+    return page
+
+
+def invalidate(user_id: int) -> None:
+    """Сбрасывает страницы пользователя — вызывается после коммита нового заказа."""
+    if user_id in _loading:
+        _generations[user_id] = _generations.get(user_id, 0) + 1
+    _stats["invalidations"] += 1
+    _drop(user_id)
+
+
+def stats() -> Dict[str, int]:
+    """Попадания/промахи (и их доля в процентах), сбросы, вытеснения и занятая память."""
+    lookups = _stats["hits"] + _stats["misses"]
+    hit_rate = _stats["hits"] * 100 // lookups if lookups else 0
+    return dict(_stats, hit_rate=hit_rate, users=len(_pages), bytes=_bytes)
+
+
+@router.message(F.text == "/orders")
+async def show_orders(message: types.Message):
+    page = await get_orders_page(message.from_user.id)
+
+    if page is None:
+        await message.answer("📭 У вас пока нет заказов.")
+        return
+
+    text, markup = page
+    await message.answer(text, reply_markup=markup)
+
+
+# ------------------------------
+# Callback: листание истории заказов
+# ------------------------------
+@callback_dispatch.on(OrdersPage)
+async def orders_page(callback: types.CallbackQuery, callback_data: OrdersPage):
+    page = await get_orders_page(
+        callback.from_user.id, callback_data.direction,
+        datetime.fromisoformat(callback_data.created_at), callback_data.order_id
+    )
+
+    if page is None:
+        # Страница опустела (например, соседние заказы удалены) — начинаем с первой
+        page = await get_orders_page(callback.from_user.id)
+    if page is None:
+        await callback.message.edit_text("📭 У вас пока нет заказов.")
+        await callback.answer()
+        return
 
-    await message.answer("\n".join(text_lines))
+    text, markup = page
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
@@ -5,10 +5,18 @@ from aiogram import Router, types, F
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
-from database import get_db_connection
+from database import acquire
+import catalog
 from keyboards.inline_main import *
+from keyboards.catalog_pages import get_catalog_page, get_categories_page
+from keyboards.callbacks import CatalogPage, ProductAdd, ProductDetails
+from config import CATALOG_GROUP_BY_CATEGORY
 from html import escape
+import json
+import callback_dispatch
 import cart_store
+import users
+from handlers import orders
 
 router = Router()
 
@@ -23,13 +31,11 @@ class AddToCart(StatesGroup):
 
 
 # ------------------------------
-# /products — компактный список товаров
+# /products — каталог по страницам
 # ------------------------------
 @router.message(F.text == "/products")
 async def show_products(event: types.Message | types.CallbackQuery):
-    conn = await get_db_connection()
-    rows = await conn.fetch("SELECT code, name, price FROM products ORDER BY name")
-    await conn.close()
+    rows = await catalog.get_products()
 
     if not rows:
         text = "❌ Товары пока не добавлены."
@@ -40,19 +46,8 @@ async def show_products(event: types.Message | types.CallbackQuery):
             await event.answer(text, reply_markup=reply_markup)
         return
 
-    lines = []
-    kb = InlineKeyboardMarkup(inline_keyboard=[])
-
-    for row in rows:
-        name_html = escape(row["name"])
-        lines.append(f"{name_html} — {row['price']} руб.")
-        kb.inline_keyboard.append([
-            InlineKeyboardButton(text=name_html, callback_data=f"details_{row['code']}"),
-            InlineKeyboardButton(text="🛒", callback_data=f"add_{row['code']}")
-        ])
-
-    kb.inline_keyboard.append(get_back_to_main_button())
-    text = "\n".join(lines)
+    # Страницы уже собраны и лежат в кэше, пока каталог не изменится
+    text, kb = get_categories_page() if CATALOG_GROUP_BY_CATEGORY else get_catalog_page()
 
     if isinstance(event, types.CallbackQuery):
         await event.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
@@ -60,19 +55,37 @@ async def show_products(event: types.Message | types.CallbackQuery):
         await event.reply(text, parse_mode="HTML", reply_markup=kb)
 
 
+# ------------------------------
+# Callback: листание каталога и выбор категории
+# ------------------------------
+@callback_dispatch.on(CatalogPage)
+async def catalog_page(callback: types.CallbackQuery, callback_data: CatalogPage):
+    await catalog.get_products()  # освежает каталог по TTL
+
+    page = get_catalog_page(callback_data.page, category=callback_data.category)
+    if page is None:
+        # Категория исчезла после обновления каталога
+        page = get_categories_page()
+
+    text, kb = page
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+    await callback.answer()
+
+
+@callback_dispatch.on("cats")
+async def catalog_categories(callback: types.CallbackQuery):
+    await catalog.get_products()
+    text, kb = get_categories_page()
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+    await callback.answer()
+
+
 # ------------------------------
 # Callback: показать карточку товара с фото
 # ------------------------------
-@router.callback_query(F.data.startswith("details_"))
-async def product_details(callback: types.CallbackQuery):
-    product_code = callback.data.split("_", 1)[1]
-
-    conn = await get_db_connection()
-    product = await conn.fetchrow(
-        "SELECT code, name, price, image_file_id FROM products WHERE code = $1",
-        product_code
-    )
-    await conn.close()
+@callback_dispatch.on(ProductDetails)
+async def product_details(callback: types.CallbackQuery, callback_data: ProductDetails):
+    product = await catalog.get_product(callback_data.code)
 
     if not product:
         await callback.message.answer("❌ Товар не найден.", reply_markup=get_inline_main_menu())
@@ -81,9 +94,14 @@ async def product_details(callback: types.CallbackQuery):
 
     name_html = escape(product["name"])
     caption = f"<b>{name_html}</b>\n💰 Цена: {product['price']} руб."
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🛒 В корзину", callback_data=f"add_{product['code']}")]
-    ])
+    availability = catalog.availability(product)
+    if availability:
+        caption += f"\n{availability}"
+    kb = InlineKeyboardMarkup(inline_keyboard=[])
+    if product["stock"] is None or product["stock"] > 0:
+        kb.inline_keyboard.append(
+            [InlineKeyboardButton(text="🛒 В корзину", callback_data=ProductAdd(code=product["code"]).pack())]
+        )
     kb.inline_keyboard.append(get_back_to_main_button())
 
     if product["image_file_id"]:
@@ -104,21 +122,17 @@ async def product_details(callback: types.CallbackQuery):
 # ------------------------------
 # Callback: начать добавление в корзину
 # ------------------------------
-@router.callback_query(F.data.startswith("add_"))
-async def add_to_cart_start(callback: types.CallbackQuery, state: FSMContext):
-    product_code = callback.data.split("_", 1)[1]
-
-    conn = await get_db_connection()
-    product = await conn.fetchrow(
-        "SELECT code, name, price FROM products WHERE code = $1",
-        product_code
-    )
-    await conn.close()
+@callback_dispatch.on(ProductAdd)
+async def add_to_cart_start(callback: types.CallbackQuery, callback_data: ProductAdd, state: FSMContext):
+    product = await catalog.get_product(callback_data.code)
 
     if not product:
         await callback.message.answer("❌ Товар не найден.", reply_markup=get_inline_main_menu())
         await callback.answer()
         return
+    if product["stock"] is not None and product["stock"] <= 0:
+        await callback.answer("❌ Товара нет в наличии", show_alert=True)
+        return
 
     await state.update_data(
         selected_product_code=product["code"],
@@ -145,7 +159,27 @@ async def get_quantity(message: types.Message, state: FSMContext):
         return
 
     data = await state.get_data()
-    cart_store.add_item(
+    # Остаток — из кэша каталога; окончательная проверка — при оформлении заказа
+    product = catalog.peek(data["selected_product_code"])
+    if product is not None and product["stock"] is not None:
+        in_cart = sum(
+            qty for code, _, qty, _ in await cart_store.get_user_cart(message.from_user.id)
+            if code == product["code"]
+        )
+        if in_cart + quantity > product["stock"]:
+            left = max(product["stock"] - in_cart, 0)
+            text = f"❌ В наличии только {product['stock']} шт."
+            if in_cart:
+                text += f" В корзине уже {in_cart}."
+            if left:
+                text += f" Введите число не больше {left}."
+            else:
+                text += " Больше добавить нельзя."
+                await state.clear()
+            await message.answer(text, reply_markup=None if left else get_inline_main_menu())
+            return
+
+    await cart_store.add_item(
         message.from_user.id,
         data["selected_product_code"],
         data["selected_product_name"],
@@ -165,7 +199,7 @@ async def get_quantity(message: types.Message, state: FSMContext):
 # ------------------------------
 async def show_cart(event: types.Message | types.CallbackQuery):
     user_id = event.from_user.id
-    items = cart_store.get_user_cart(user_id)
+    items = await cart_store.get_user_cart(user_id)
 
     if not items:
         text = "🛒 Ваша корзина пуста."
@@ -181,7 +215,11 @@ async def show_cart(event: types.Message | types.CallbackQuery):
     for idx, (code, name, qty, price) in enumerate(items, start=1):
         item_sum = qty * price
         total_sum += item_sum
-        lines.append(f"{idx}. {escape(name)} — {qty} шт. ({item_sum} руб.)")
+        line = f"{idx}. {escape(name)} — {qty} шт. ({item_sum} руб.)"
+        product = catalog.peek(code)  # наличие из кэша каталога, без запросов
+        if product is not None and product["stock"] is not None and product["stock"] < qty:
+            line += f" ⚠️ в наличии {product['stock']} шт."
+        lines.append(line)
     lines.append(f"\n💰 <b>Итого: {total_sum} руб.</b>")
 
     markup = InlineKeyboardMarkup(
@@ -202,20 +240,113 @@ async def show_cart(event: types.Message | types.CallbackQuery):
 # ------------------------------
 # Callback: очистка корзины
 # ------------------------------
-@router.callback_query(F.data == "clear_cart")
+@callback_dispatch.on("clear_cart")
 async def clear_cart_callback(callback: types.CallbackQuery):
-    cart_store.clear_user_cart(callback.from_user.id)
+    await cart_store.clear_user_cart(callback.from_user.id)
     await callback.message.edit_text("✅ Корзина очищена", reply_markup=get_inline_main_menu())
     await callback.answer()
 
 
+# ------------------------------
+# Оформление заказа: один запрос в одной транзакции
+# ------------------------------
+# Заказ, все позиции и списание остатков — один CTE-запрос, пользователь
+# регистрируется через users.ensure_user (кэш известных). Цены и сумма
+# берутся из products на момент оформления, а не из корзины.
+#
+# Остатки (migrations/009_products_stock.sql): строки товаров с учётом
+# остатка блокируются в порядке кода (два заказа на одни и те же товары
+# не получат deadlock) и списываются условным UPDATE — только если
+# остатка хватает. Блокировка держится до конца этой короткой транзакции,
+# так что конкурируют только заказы на общие товары. Если какой-то
+# позиции не хватило, запрос возвращает её в short, а create_order
+# откатывает транзакцию вместе с уже списанными позициями. Если часть
+# товаров удалена из каталога, ничего не списывается, а транзакция
+# тоже откатывается — на случай, если заказ не создался по другой причине.
+_CREATE_ORDER_SQL = """
+    WITH lines AS (
+        SELECT c.code, c.qty, p.price
+        FROM unnest($2::text[], $3::int[]) AS c(code, qty)
+        JOIN products p ON p.code = c.code
+    ),
+    locked AS MATERIALIZED (
+        SELECT p.code, p.stock
+        FROM products p
+        WHERE p.code = ANY($2::text[]) AND p.stock IS NOT NULL
+        ORDER BY p.code
+        FOR UPDATE
+    ),
+    reserved AS (
+        UPDATE products p SET stock = k.stock - l.qty
+        FROM locked k JOIN lines l ON l.code = k.code
+        WHERE p.code = k.code AND k.stock >= l.qty
+          AND (SELECT COUNT(*) FROM lines) = cardinality($2::text[])  -- заказ всё равно не создастся
+        RETURNING p.code
+    ),
+    new_order AS (
+        INSERT INTO orders (user_id, total_price)
+        SELECT $1, SUM(qty * price) FROM lines
+        HAVING COUNT(*) = cardinality($2::text[])
+           AND (SELECT COUNT(*) FROM reserved) = (SELECT COUNT(*) FROM locked)
+        RETURNING order_id, total_price
+    ),
+    new_items AS (
+        INSERT INTO order_items (order_id, product_code, quantity, price_per_unit)
+        SELECT new_order.order_id, lines.code, lines.qty, lines.price
+        FROM new_order CROSS JOIN lines
+    )
+    SELECT
+        (SELECT order_id FROM new_order) AS order_id,
+        (SELECT total_price FROM new_order) AS total_price,
+        (SELECT COUNT(*) FROM lines) AS found,
+        (SELECT json_object_agg(k.code, k.stock)
+         FROM locked k JOIN lines l ON l.code = k.code
+         WHERE k.stock < l.qty) AS short
+"""
+
+
+class _NoOrder(Exception):
+    """Заказ не создан (товары удалены из каталога) — откатывает транзакцию."""
+
+
+class OutOfStock(Exception):
+    """Остатка не хватило: short — код товара → сколько есть на самом деле."""
+
+    def __init__(self, short: dict):
+        super().__init__(short)
+        self.short = short
+
+
+async def create_order(conn, user: types.User, items):
+    """
+    Создаёт заказ из позиций корзины и списывает остатки. Возвращает
+    (order_id, сумма) или None, если часть товаров уже удалена из каталога.
+    Если остатка не хватает, ничего не меняет и поднимает OutOfStock.
+    """
+    codes = [code for code, _, _, _ in items]
+    quantities = [qty for _, _, qty, _ in items]
+    # До транзакции: регистрация фиксируется сразу и не откатится вместе с заказом,
+    # иначе кэш users считал бы пользователя известным. Обычно это попадание в кэш без запроса
+    await users.ensure_user(user, conn)
+    try:
+        async with conn.transaction():
+            row = await conn.fetchrow(_CREATE_ORDER_SQL, user.id, codes, quantities)
+            if row["short"] is not None:
+                raise OutOfStock(json.loads(row["short"]))  # откат: списанное по другим позициям вернётся
+            if row["order_id"] is None or row["found"] < len(items):
+                raise _NoOrder()  # откат до коммита: остатки не должны уйти без заказа
+    except _NoOrder:
+        return None
+    return row["order_id"], row["total_price"]
+
+
 # ------------------------------
 # Callback: отправка заказа в БД
 # ------------------------------
-@router.callback_query(F.data == "send_order")
+@callback_dispatch.on("send_order")
 async def send_order(callback: types.CallbackQuery):
     user_id = callback.from_user.id
-    items = cart_store.get_user_cart(user_id)
+    items = await cart_store.get_user_cart(user_id)
 
     # Если корзина пуста — редактируем текущее сообщение
     if not items:
@@ -227,39 +358,43 @@ async def send_order(callback: types.CallbackQuery):
         await callback.answer()
         return
 
-    conn = await get_db_connection()
     try:
-        # Добавляем пользователя в таблицу users (если нет)
-        await conn.execute("""
-            INSERT INTO users (user_id, username, first_name, last_name)
-            VALUES ($1, $2, $3, $4)
-            ON CONFLICT (user_id) DO NOTHING
-        """, user_id, callback.from_user.username, callback.from_user.first_name, callback.from_user.last_name)
-
-        total_sum = sum(qty * price for _, _, qty, price in items)
-
-        # Создаём заказ
-        order_row = await conn.fetchrow(
-            "INSERT INTO orders (user_id, total_price) VALUES ($1, $2) RETURNING order_id",
-            user_id, total_sum
+        async with acquire() as conn:
+            created = await create_order(conn, callback.from_user, items)
+    except OutOfStock as e:
+        # Корзину не трогаем: пользователь уменьшит количество или уберёт товар
+        names = {code: name for code, name, _, _ in items}
+        lines = [
+            f"• {escape(names.get(code, code))} — в наличии {stock} шт."
+            for code, stock in e.short.items()
+        ]
+        await callback.message.edit_text(
+            "❌ Не хватает товара на складе:\n" + "\n".join(lines) +
+            "\n\nОчистите корзину и соберите заказ заново.",
+            parse_mode="HTML",
+            reply_markup=get_inline_main_menu()
         )
-        order_id = order_row["order_id"]
+        await callback.answer()
+        return
 
-        # Добавляем позиции заказа
-        for product_code, _, qty, price in items:
-            await conn.execute(
-                "INSERT INTO order_items (order_id, product_code, quantity, price_per_unit) VALUES ($1, $2, $3, $4)",
-                order_id, product_code, qty, price
-            )
-    finally:
-        await conn.close()
+    if created is None:
+        # Корзину не трогаем — пользователь сам решит, что с ней делать
+        await callback.message.edit_text(
+            "❌ Некоторых товаров из корзины больше нет в каталоге. Очистите корзину и соберите заказ заново.",
+            parse_mode="HTML",
+            reply_markup=get_inline_main_menu()
+        )
+        await callback.answer()
+        return
+    order_id, total_sum = created
+    orders.invalidate(user_id)  # история заказов изменилась — кэшированные страницы устарели
 
     # Очищаем корзину
-    cart_store.clear_user_cart(user_id)
+    await cart_store.clear_user_cart(user_id)
 
     # Редактируем текущее сообщение, а не отправляем новое
     await callback.message.edit_text(
-        f"✅ Заказ №{order_id} успешно отправлен!",
+        f"✅ Заказ №{order_id} на сумму {total_sum} руб. успешно отправлен!",
         parse_mode="HTML",
         reply_markup=get_inline_main_menu()
     )
@@ -0,0 +1,87 @@
+# handlers/search.py
+# Поиск товаров: команда /search <запрос> и inline-режим (@бот запрос в любом чате)
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle, InputTextMessageContent
+)
+from html import escape
+import catalog
+import search_index
+from keyboards.catalog_pages import product_buttons
+from keyboards.inline_main import get_back_to_main_button
+
+router = Router()
+
+SEARCH_LIMIT = 10   # результатов в ответе на /search
+INLINE_LIMIT = 50   # максимум, который Telegram принимает в ответ на inline-запрос
+INLINE_CACHE_TIME = 60  # секунд, сколько Telegram может кэшировать ответ на inline-запрос
+
+
+async def find_products(query: str, limit: int) -> list:
+    """Товары по запросу, лучшие совпадения первыми."""
+    await catalog.get_products()  # освежает каталог (и индекс) по TTL
+    products = []
+    for code in search_index.search(query, limit):
+        # Коды из индекса почти всегда есть в кэше каталога — в БД не ходим
+        product = await catalog.get_product(code)
+        if product is not None:
+            products.append(product)
+    return products
+
+
+# ------------------------------
+# /search <запрос>
+# ------------------------------
+@router.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject):
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("🔍 Укажите, что искать: /search rtx 4060")
+        return
+
+    products = await find_products(query, SEARCH_LIMIT)
+    if not products:
+        await message.answer(f"🔍 По запросу «{escape(query)}» ничего не найдено.", parse_mode="HTML")
+        return
+
+    lines = [f"🔍 Найдено по запросу «{escape(query)}»:"]
+    kb = InlineKeyboardMarkup(inline_keyboard=[])
+    for product in products:
+        availability = catalog.availability(product)
+        lines.append(f"{escape(product['name'])} — {product['price']} руб." + (f" {availability}" if availability else ""))
+        buttons = product_buttons(product)
+        if buttons:
+            kb.inline_keyboard.append(buttons)
+    kb.inline_keyboard.append(get_back_to_main_button())
+    await message.answer("\n".join(lines), parse_mode="HTML", reply_markup=kb)
+
+
+# ------------------------------
+# Inline-режим: @бот <запрос>
+# ------------------------------
+@router.inline_query()
+async def inline_search(inline_query: types.InlineQuery):
+    query = inline_query.query.strip()
+    products = await find_products(query, INLINE_LIMIT) if query else []
+
+    results = [
+        InlineQueryResultArticle(
+            id=product["code"],
+            title=product["name"],
+            description=f"{product['price']} руб. · код {product['code']}",
+            input_message_content=InputTextMessageContent(
+                message_text=(
+                    f"<b>{escape(product['name'])}</b>\n"
+                    f"💰 Цена: {product['price']} руб.\n"
+                    f"Код: <code>{escape(product['code'])}</code>"
+                ),
+                parse_mode="HTML"
+            )
+        )
+        for product in products
+    ]
+    # Выдача одинакова для всех пользователей — Telegram может кэшировать её общей
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
@@ -0,0 +1,228 @@
+# image_ingest.py — массовая загрузка фото товаров и запись image_file_id
+# -------------------------------------------------
+# Источник — каталог или zip-архив с файлами <код товара>.<jpg|jpeg|png|webp>.
+#   1. Файлы товаров, которые есть в products, хэшируются (sha256) в потоке.
+#   2. Одинаковая картинка загружается один раз: file_id по хэшу лежит
+#      в image_uploads (migrations/008_image_uploads.sql) — и для файлов
+#      с одним содержимым, и при повторных запусках.
+#   3. Новые картинки уходят в Telegram (sendPhoto в служебный чат,
+#      сообщение потом удаляется): не больше IMAGE_UPLOAD_PARALLEL
+#      одновременно, с приоритетом outbound BULK — ответы пользователям
+#      идут первыми. Потолок скорости — лимит отправки в этот чат
+#      (OUTBOUND_CHAT_RATE для личного, OUTBOUND_GROUP_PER_MINUTE для
+#      группы — берите личный чат с ботом); удаление служебного
+#      сообщения этот лимит не тратит (outbound.CHAT_FREE_METHODS).
+#   4. Все file_id пишутся в products одним UPDATE ... FROM unnest(...)
+#      в одной транзакции; бот получает одно уведомление "*"
+#      (как при tools/import_catalog.py).
+# Запуск: tools/ingest_images.py или zip-архив с подписью /images от
+# администратора (handlers/admin_images.py).
+# -------------------------------------------------
+
+import asyncio
+import hashlib
+import logging
+import os
+import zipfile
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import BufferedInputFile
+
+import database
+import outbound
+from catalog import FULL_RELOAD, NOTIFY_CHANNEL
+from config import IMAGE_UPLOAD_PARALLEL
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+READ_CHUNK = 1024 * 1024
+PROGRESS_EVERY = 100  # загрузок между строками прогресса в логе
+
+_UPDATE_SQL = """
+    UPDATE products p SET image_file_id = v.file_id
+    FROM unnest($1::text[], $2::text[]) AS v(code, file_id)
+    WHERE p.code = v.code AND p.image_file_id IS DISTINCT FROM v.file_id
+"""
+
+
+class ImageSource:
+    """Файлы картинок из каталога или zip-архива: код товара → имя файла."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip: Optional[zipfile.ZipFile] = None
+        if os.path.isdir(path):
+            names = [
+                os.path.relpath(os.path.join(root, name), path)
+                for root, _, files in os.walk(path) for name in files
+            ]
+        elif zipfile.is_zipfile(path):
+            self._zip = zipfile.ZipFile(path)
+            names = [info.filename for info in self._zip.infolist() if not info.is_dir()]
+        else:
+            raise ValueError(f"{path}: нужен каталог или zip-архив")
+
+        self.files: Dict[str, str] = {}
+        self.duplicates: List[str] = []  # второй файл с тем же кодом (code.jpg и code.png)
+        for name in sorted(names):
+            stem, ext = os.path.splitext(os.path.basename(name))
+            if ext.lower() not in IMAGE_EXTENSIONS or stem.startswith("."):
+                continue
+            if stem in self.files:
+                self.duplicates.append(name)
+            else:
+                self.files[stem] = name
+
+    def _open(self, name: str):
+        if self._zip is not None:
+            return self._zip.open(name)
+        return open(os.path.join(self.path, name), "rb")
+
+    def digest(self, name: str) -> str:
+        sha = hashlib.sha256()
+        with self._open(name) as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def read(self, name: str) -> bytes:
+        with self._open(name) as f:
+            return f.read()
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+
+
+async def _cached_file_ids(bot_id: int, digests: List[str]) -> Dict[str, str]:
+    async with database.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT sha256, file_id FROM image_uploads WHERE bot_id = $1 AND sha256 = ANY($2::text[])",
+            bot_id, digests,
+        )
+    return {row["sha256"]: row["file_id"] for row in rows}
+
+
+async def _remember_file_ids(bot_id: int, uploaded: Dict[str, str]) -> None:
+    async with database.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO image_uploads (bot_id, sha256, file_id)
+            SELECT $1, v.sha256, v.file_id FROM unnest($2::text[], $3::text[]) AS v(sha256, file_id)
+            ON CONFLICT (bot_id, sha256) DO UPDATE SET file_id = EXCLUDED.file_id, uploaded_at = NOW()
+            """,
+            bot_id, list(uploaded), list(uploaded.values()),
+        )
+
+
+async def _write_products(codes: List[str], file_ids: List[str]) -> int:
+    async with database.acquire() as conn:
+        async with conn.transaction():
+            # Построчный триггер молчит (migrations/007_catalog_import.sql), уведомление — одно
+            await conn.execute("SET LOCAL catalog.bulk_import = 'on'")
+            status = await conn.execute(_UPDATE_SQL, codes, file_ids)
+            updated = int(status.rsplit(" ", 1)[-1])
+            if updated:
+                await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, FULL_RELOAD)
+    return updated
+
+
+async def _upload(bot: Bot, chat_id: int, name: str, data: bytes, keep_message: bool) -> str:
+    with outbound.bulk():
+        message = await bot.send_photo(
+            chat_id, BufferedInputFile(data, filename=os.path.basename(name)), disable_notification=True
+        )
+        if not keep_message:
+            try:
+                await bot.delete_message(chat_id, message.message_id)
+            except TelegramAPIError as e:
+                logging.warning("[IMAGES] не удалось удалить служебное сообщение: %s", e)
+    return message.photo[-1].file_id
+
+
+async def ingest(bot: Bot, path: str, chat_id: int, parallel: int = IMAGE_UPLOAD_PARALLEL,
+                 keep_messages: bool = False, dry_run: bool = False) -> Dict:
+    """
+    Загружает фото товаров из каталога или zip-архива и пишет image_file_id.
+    Возвращает счётчики и список ошибок (report["errors"]).
+    """
+    source = await asyncio.to_thread(ImageSource, path)
+    errors: List[str] = [f"{name}: второй файл для того же кода, пропущен" for name in source.duplicates]
+    try:
+        async with database.acquire() as conn:
+            rows = await conn.fetch("SELECT code FROM products WHERE code = ANY($1::text[])", list(source.files))
+        known = sorted(row["code"] for row in rows)
+        unknown = sorted(set(source.files) - set(known))
+
+        # Коды по хэшу содержимого: одна загрузка на одинаковые картинки
+        codes_by_digest: Dict[str, List[str]] = {}
+        for code in known:
+            digest = await asyncio.to_thread(source.digest, source.files[code])
+            codes_by_digest.setdefault(digest, []).append(code)
+
+        file_ids = await _cached_file_ids(bot.id, list(codes_by_digest))
+        missing = [digest for digest in codes_by_digest if digest not in file_ids]
+        report = {
+            "files": len(source.files), "unknown": len(unknown), "images": len(codes_by_digest),
+            "cached": len(file_ids), "uploaded": 0, "failed": 0, "updated": 0, "errors": errors,
+        }
+        if unknown:
+            errors.append(f"нет в products: {', '.join(unknown[:20])}" + (" …" if len(unknown) > 20 else ""))
+        if dry_run:
+            report["to_upload"] = len(missing)
+            return report
+
+        uploaded: Dict[str, str] = {}
+        limit = asyncio.Semaphore(parallel)
+
+        async def upload_one(digest: str) -> None:
+            codes = codes_by_digest[digest]
+            name = source.files[codes[0]]
+            async with limit:
+                try:
+                    data = await asyncio.to_thread(source.read, name)
+                    uploaded[digest] = await _upload(bot, chat_id, name, data, keep_messages)
+                except TelegramAPIError as e:
+                    report["failed"] += 1
+                    errors.append(f"{name} ({', '.join(codes)}): {e}")
+                    return
+            if len(uploaded) % PROGRESS_EVERY == 0:
+                logging.info("[IMAGES] загружено %d/%d", len(uploaded), len(missing))
+
+        try:
+            await asyncio.gather(*(upload_one(digest) for digest in missing))
+        finally:
+            # Загруженное не теряем, даже если прервали на середине
+            if uploaded:
+                await _remember_file_ids(bot.id, uploaded)
+        report["uploaded"] = len(uploaded)
+        file_ids.update(uploaded)
+
+        codes, ids = [], []
+        for digest, file_id in file_ids.items():
+            for code in codes_by_digest[digest]:
+                codes.append(code)
+                ids.append(file_id)
+        if codes:
+            report["updated"] = await _write_products(codes, ids)
+        return report
+    finally:
+        source.close()
+
+
+def format_report(report: Dict) -> str:
+    """Итог загрузки для консоли и для ответа администратору."""
+    lines = [
+        f"Файлов: {report['files']}, разных картинок: {report['images']}, "
+        f"уже были загружены: {report['cached']}",
+    ]
+    if "to_upload" in report:
+        lines.append(f"Будет загружено: {report['to_upload']} (проверка, ничего не изменено)")
+    else:
+        lines.append(f"Загружено: {report['uploaded']}, ошибок: {report['failed']}, "
+                     f"обновлено товаров: {report['updated']}")
+    lines.extend(f"• {error}" for error in report["errors"][:20])
+    if len(report["errors"]) > 20:
+        lines.append(f"… и ещё {len(report['errors']) - 20}")
+    return "\n".join(lines)
@@ -0,0 +1,46 @@
+# keyboards/callbacks.py
+# Типизированные callback_data кнопок с параметрами. Кнопка собирается через
+# Класс(...).pack(), хендлер получает уже разобранный объект (callback_data).
+# Хендлеры регистрируются в таблице callback_dispatch по префиксу класса.
+# Кнопки без параметров ("view_cart", "cats", ...) остаются строками.
+#
+# Код товара попадает в callback_data как есть: в нём не должно быть ":"
+# (разделитель полей), а вся строка — не длиннее 64 байт (предел Telegram).
+# Такие коды не пускает tools/import_catalog.py, а кнопки для уже
+# заведённых «плохих» кодов не строятся (code_fits) — иначе pack()
+# уронил бы всю страницу каталога из-за одного товара.
+from aiogram.filters.callback_data import CallbackData
+
+CALLBACK_DATA_LIMIT = 64  # байт, предел Telegram
+MAX_CODE_BYTES = CALLBACK_DATA_LIMIT - len("details:")  # самый длинный префикс кнопок товара
+
+
+def code_fits(code: str) -> bool:
+    """Код товара можно передать в кнопке: без ":" и не длиннее MAX_CODE_BYTES в UTF-8."""
+    return ":" not in code and len(code.encode("utf-8")) <= MAX_CODE_BYTES
+
+
+class ProductDetails(CallbackData, prefix="details"):
+    """Карточка товара."""
+    code: str
+
+
+class ProductAdd(CallbackData, prefix="add"):
+    """Добавление товара в корзину (дальше — ввод количества)."""
+    code: str
+
+
+class CatalogPage(CallbackData, prefix="page"):
+    """Страница каталога; category = -1 — весь каталог без группировки."""
+    page: int
+    category: int = -1
+
+
+class OrdersPage(CallbackData, prefix="orders", sep="|"):
+    """
+    Страница истории заказов по ключу (created_at, order_id).
+    Разделитель "|": в created_at (ISO) есть двоеточия.
+    """
+    direction: str
+    created_at: str
+    order_id: int
@@ -0,0 +1,145 @@
+# keyboards/catalog_pages.py
+# Постраничный каталог: текст и клавиатура каждой страницы собираются один раз
+# и живут в кэше, пока не изменится каталог (catalog.version()).
+# Списание остатка версию не меняет: сбрасываются только страницы с этим
+# товаром и только если сменилась надпись о наличии (_on_stock_change).
+import logging
+from html import escape
+from typing import Dict, List, Tuple
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+import catalog
+from config import CATALOG_PAGE_SIZE, CATALOG_GROUP_BY_CATEGORY
+from keyboards.callbacks import CatalogPage, MAX_CODE_BYTES, ProductAdd, ProductDetails, code_fits
+from keyboards.inline_main import get_back_to_main_button
+
+NO_CATEGORY = "Прочее"
+
+Page = Tuple[str, InlineKeyboardMarkup]
+
+_cache_version = -1
+_pages: Dict[Tuple[int, int], Page] = {}   # (индекс категории или -1, номер страницы) → страница
+_categories: List[Tuple[str, list]] = []    # [(категория, товары)] в алфавитном порядке
+_category_slots: Dict[str, Tuple[int, int]] = {}  # код → (индекс категории, место в ней)
+_categories_page: Page | None = None
+
+
+def _reset_if_changed() -> None:
+    global _cache_version, _categories, _categories_page
+    if _cache_version == catalog.version():
+        return
+    _pages.clear()
+    _categories_page = None
+    _categories = []
+    if CATALOG_GROUP_BY_CATEGORY:
+        groups: Dict[str, list] = {}
+        for product in catalog.snapshot():
+            groups.setdefault(product["category"] or NO_CATEGORY, []).append(product)
+        _categories = sorted(groups.items())
+    # Списание остатка порядок не меняет — места товаров действуют до следующего сброса
+    _category_slots.clear()
+    for category, (_, products) in enumerate(_categories):
+        for index, product in enumerate(products):
+            _category_slots[product["code"]] = (category, index)
+    _cache_version = catalog.version()
+
+
+def _on_stock_change(product, previous) -> None:
+    if _cache_version != catalog.version():
+        return  # кэш и так будет собран заново из свежего каталога
+    code = product["code"]
+    changed = catalog.availability(product) != catalog.availability(previous)
+    index = catalog.position(code)
+    if changed and index is not None:
+        _pages.pop((-1, index // CATALOG_PAGE_SIZE), None)
+    slot = _category_slots.get(code)
+    if slot is not None:
+        category, index = slot
+        _categories[category][1][index] = product  # страница может собраться позже — уже со свежим остатком
+        if changed:
+            _pages.pop((category, index // CATALOG_PAGE_SIZE), None)
+
+
+catalog.add_stock_listener(_on_stock_change)
+
+
+def product_buttons(product) -> List[InlineKeyboardButton]:
+    """Кнопки «Подробнее» и «🛒» товара; пусто, если код не помещается в callback_data."""
+    if not code_fits(product["code"]):
+        logging.warning("Товар %r: код с ':' или длиннее %d байт — кнопки не показаны, исправьте код",
+                        product["code"], MAX_CODE_BYTES)
+        return []
+    return [
+        InlineKeyboardButton(text=product["name"], callback_data=ProductDetails(code=product["code"]).pack()),
+        InlineKeyboardButton(text="🛒", callback_data=ProductAdd(code=product["code"]).pack()),
+    ]
+
+
+def _page_callback(category: int, page: int) -> str:
+    return CatalogPage(page=page, category=category).pack()
+
+
+def _render_page(title: str, products: list, category: int, page: int) -> Page:
+    pages = max(1, -(-len(products) // CATALOG_PAGE_SIZE))
+    chunk = products[page * CATALOG_PAGE_SIZE:(page + 1) * CATALOG_PAGE_SIZE]
+
+    lines = [title] if title else []
+    kb = InlineKeyboardMarkup(inline_keyboard=[])
+    for row in chunk:
+        availability = catalog.availability(row)
+        lines.append(f"{escape(row['name'])} — {row['price']} руб." + (f" {availability}" if availability else ""))
+        buttons = product_buttons(row)
+        if buttons:
+            kb.inline_keyboard.append(buttons)
+    if pages > 1:
+        lines.append(f"\nСтраница {page + 1} из {pages}")
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="⬅️", callback_data=_page_callback(category, page - 1)))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(text="➡️", callback_data=_page_callback(category, page + 1)))
+    if nav:
+        kb.inline_keyboard.append(nav)
+    if category >= 0:
+        kb.inline_keyboard.append([InlineKeyboardButton(text="📂 Категории", callback_data="cats")])
+    kb.inline_keyboard.append(get_back_to_main_button())
+    return "\n".join(lines), kb
+
+
+def get_catalog_page(page: int = 0, category: int = -1) -> Page | None:
+    """
+    Страница каталога (category = -1 — весь каталог без группировки).
+    None, если такой категории уже нет. Номер страницы приводится к допустимому.
+    """
+    _reset_if_changed()
+    if category >= 0:
+        if category >= len(_categories):
+            return None
+        title, products = _categories[category]
+        title = f"<b>{escape(title)}</b>"
+    else:
+        title, products = "", catalog.snapshot()
+
+    pages = max(1, -(-len(products) // CATALOG_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    key = (category, page)
+    cached = _pages.get(key)
+    if cached is None:
+        cached = _pages[key] = _render_page(title, products, category, page)
+    return cached
+
+
+def get_categories_page() -> Page:
+    """Список категорий каталога (при CATALOG_GROUP_BY_CATEGORY)."""
+    global _categories_page
+    _reset_if_changed()
+    if _categories_page is None:
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=f"{name} ({len(products)})", callback_data=_page_callback(i, 0))]
+            for i, (name, products) in enumerate(_categories)
+        ])
+        kb.inline_keyboard.append(get_back_to_main_button())
+        _categories_page = ("📂 Выберите категорию:", kb)
+    return _categories_page
@@ -5,11 +5,24 @@ import importlib
 import pkgutil
 from aiogram import Bot, Dispatcher # Bot — класс, который представляет нашего Telegram-бота и умеет отправлять/получать сообщения.
 # Dispatcher — объект, который управляет обработкой входящих апдейтов (сообщений, команд, нажатий кнопок).
-from config import BOT_TOKEN # Импортируем токен бота из файла config.py
+from config import BOT_TOKEN, BOT_MODE, BOT_WORKERS, METRICS_ENABLED, OUTBOUND_RATE_LIMIT # Импортируем токен бота и настройки из файла config.py
 # Это нужно, чтобы при первом запуске бот сам подготовил БД
 # импорт всех хендлеров сразу
 import handlers
+import callback_dispatch
 import cart_store
+import cart_backends
+import database
+import catalog
+import search_index
+import users
+import metrics
+import fsm_storage
+import outbound
+import edit_cache
+import supervisor
+import analytics
+from handlers.orders import stats as orders_cache_stats
 
 # print("[CART] main.py sees module id:", id(cart_store))
 
@@ -18,28 +31,92 @@ logging.basicConfig(level=logging.INFO) # Настраиваем логиров
 
 async def on_shutdown():
     logging.info("Бот остановлен. Закрываем соединения...")
+    logging.info("Пул БД перед закрытием: %s", database.pool_stats())
+    await cart_store.close_cart() # финальная запись изменений корзин и закрытие хранилища
+    await metrics.stop() # последняя сводка метрик в лог
+    await fsm_storage.stop() # останавливаем очистку состояний FSM
+    await analytics.stop() # останавливаем обновление сводок продаж
+    await catalog.stop() # отписываемся от уведомлений каталога
+    await database.close_pool() # закрываем пул соединений с PostgreSQL
 
 async def on_startup(): # функция выполняется при старте бота
     # Создание таблиц временно отключено
-    cart_store.load_cart() # загрузка корзины
+    await database.create_pool() # общий пул соединений для всех хендлеров
+    await catalog.start() # кэш каталога товаров + LISTEN на изменения
+    search_index.start() # поисковый индекс по каталогу, дальше обновляется вместе с ним
+    await cart_store.load_cart() # загрузка корзин из хранилища (config.CART_BACKEND)
+    await fsm_storage.start() # состояния FSM в том же хранилище + очистка просроченных
+    cart_store.start_writer() # фоновая отложенная запись корзин в хранилище
+    await analytics.start() # сводки продаж для /stats (config.SALES_REFRESH_INTERVAL)
+    if METRICS_ENABLED:
+        # Состояние кэшей и пула — в /metrics рядом с задержками
+        metrics.add_collector("db_pool", database.pool_stats)
+        metrics.add_collector("catalog", catalog.stats)
+        metrics.add_collector("cart_store", cart_store.stats)
+        metrics.add_collector("users_cache", users.stats)
+        metrics.add_collector("sales", analytics.stats)
+        metrics.add_collector("orders_cache", orders_cache_stats)
+        await metrics.start() # сводка в лог и эндпоинт /metrics (config.METRICS_PORT)
     return
 
-async def main():
-    dp = Dispatcher()  # Создаём объект Dispatcher, который будет управлять всеми хендлерами и обработкой событий.
-    bot = Bot(token=BOT_TOKEN) # Создаём объект Bot, передавая ему токен
-
+def include_routers(dp: Dispatcher):
     # Автоматический импорт всех модулей из пакета handlers
     for _, module_name, _ in pkgutil.iter_modules(handlers.__path__):
         module = importlib.import_module(f"handlers.{module_name}")
         if hasattr(module, "router"):
             dp.include_router(module.router)
+    # Все нажатия кнопок — через таблицу callback_dispatch (хендлеры регистрируются при импорте выше)
+    dp.include_router(callback_dispatch.router)
+    callback_dispatch.check(dp)
+
+async def main():
+    if BOT_WORKERS > 1 and BOT_MODE != "worker":
+        # Несколько процессов: этот только принимает апдейты и раздаёт их воркерам по user_id (supervisor.py)
+        await supervisor.run(include_routers)
+        return
+
+    # Один писатель корзин на хранилище: второй экземпляр бота не запустится (см. cart_backends.py).
+    # Воркер супервизора не захватывает — хранилище уже захватил супервизор
+    cart_owner = None
+    if BOT_MODE != "worker":
+        cart_owner = cart_backends.create_backend()
+        await cart_owner.claim()
+
+    dp = Dispatcher(storage=fsm_storage.create_storage())  # Создаём объект Dispatcher, который будет управлять всеми хендлерами и обработкой событий.
+    # Состояния FSM хранятся по config.FSM_STORAGE (SQLite/PostgreSQL с TTL или память для разработки)
+    bot = Bot(token=BOT_TOKEN) # Создаём объект Bot, передавая ему токен
+
+    include_routers(dp) # роутеры всех модулей handlers (их же подключает bench/bench_bot.py)
+    # Первым: правка без изменений пропускается до очереди лимитов и вызова API
+    edit_dedup = edit_cache.EditDedupMiddleware()
+    bot.session.middleware(edit_dedup)
+    metrics.add_collector("edit_cache", edit_dedup.stats)
+    if OUTBOUND_RATE_LIMIT:
+        # Раньше metrics: telegram_api_seconds меряет сам вызов, без ожидания в очереди лимитов
+        limiter = outbound.OutboundLimiter()
+        bot.session.middleware(limiter)
+        metrics.add_collector("outbound", limiter.stats)
+    if METRICS_ENABLED:
+        metrics.setup(dp, bot) # задержки хендлеров и вызовов Bot API
 
-    await on_startup() # Подготовительные действия (сейчас ничего не делает)
+    await on_startup() # Подготовительные действия: пул БД, загрузка корзин
     try:
-        await dp.start_polling(bot) # Запускаем «долгий опрос» (long polling) Telegram API
-        # Бот начинает получать апдейты (сообщения, команды, нажатия кнопок) и передавать их в хендлеры.
+        if BOT_MODE == "worker":
+            # Процесс под супервизором: апдейты приходят через stdin
+            await supervisor.run_worker(dp, bot)
+        elif BOT_MODE == "webhook":
+            # Продакшен: Telegram сам присылает апдейты на aiohttp-сервер (см. webhook.py)
+            import webhook
+            await webhook.run_webhook(dp, bot)
+        else:
+            # Локальная разработка: polling не работает, пока у бота установлен webhook
+            await bot.delete_webhook()
+            await dp.start_polling(bot) # Запускаем «долгий опрос» (long polling) Telegram API
+            # Бот начинает получать апдейты (сообщения, команды, нажатия кнопок) и передавать их в хендлеры.
     finally:
         await on_shutdown()
+        if cart_owner is not None:
+            await cart_owner.release()
 
 if __name__ == "__main__":
     asyncio.run(main()) # Запускаем асинхронную функцию main() через asyncio.run()
\ No newline at end of file
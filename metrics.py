@@ -0,0 +1,295 @@
+# metrics.py — метрики задержек: хендлеры, запросы к БД, запись корзин, Telegram API
+# -------------------------------------------------
+# Всё копится в памяти процесса: гистограммы длительностей (секунды),
+# счётчики ошибок и число выполняемых сейчас хендлеров.
+#
+#   bot_update_seconds{type}               — весь путь апдейта через диспетчер
+#   bot_handler_seconds{router, handler}   — хендлер (show_products, send_order, ...)
+#   bot_handler_in_flight{router, handler}
+#   db_query_seconds{query}                — каждый запрос через пул (asyncpg query logger)
+#   db_pool_acquire_seconds                — ожидание свободного соединения
+#   cart_backend_seconds{backend, op}      — чтение/запись хранилища корзин
+#   telegram_api_seconds{method}           — вызовы Bot API
+# У каждой *_seconds есть парная *_errors_total.
+#
+# Снаружи: раз в METRICS_LOG_INTERVAL сводка в лог и, если задан
+# METRICS_PORT, HTTP-эндпоинт /metrics в формате Prometheus.
+# Внешних зависимостей нет — только aiogram и aiohttp, которые уже стоят.
+# -------------------------------------------------
+
+import asyncio
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+from config import METRICS_HOST, METRICS_PORT, METRICS_LOG_INTERVAL
+
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_LABEL_LENGTH = 80  # запросы в метках — по первым символам текста
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Число наблюдений по корзинам BUCKETS (последняя — больше 10 с), сумма и количество."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _quantile(counts: List[int], q: float) -> float:
+    """Верхняя граница корзины, в которую попадает квантиль q (inf — дольше 10 с)."""
+    rank = q * sum(counts)
+    seen = 0
+    for bound, count in zip(BUCKETS, counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return float("inf")
+
+
+_histograms: Dict[Tuple[str, Labels], Histogram] = {}
+_counters: Dict[Tuple[str, Labels], float] = {}
+_gauges: Dict[Tuple[str, Labels], float] = {}
+_collectors: List[Tuple[str, Callable[[], Dict[str, int]]]] = []
+
+_reporter: Optional[asyncio.Task] = None
+_runner: Optional[web.AppRunner] = None
+_last_report: Dict[Tuple[str, Labels], List[int]] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Labels]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    """Добавляет наблюдение в гистограмму name."""
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram()
+    histogram.observe(seconds)
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """Увеличивает счётчик name."""
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge_add(name: str, delta: float, **labels) -> None:
+    """Сдвигает текущее значение name (например, число выполняющихся хендлеров)."""
+    key = _key(name, labels)
+    _gauges[key] = _gauges.get(key, 0) + delta
+
+
+@contextmanager
+def timer(name: str, **labels) -> Iterator[None]:
+    """Меряет блок: {name}_seconds, а при исключении ещё и {name}_errors_total."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if not isinstance(e, asyncio.CancelledError):
+            inc(f"{name}_errors_total", **labels)
+        raise
+    finally:
+        observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+
+
+def add_collector(prefix: str, collect: Callable[[], Dict[str, int]]) -> None:
+    """Подключает функцию со словарём чисел (pool_stats, stats) — её значения уйдут как {prefix}_{ключ}."""
+    _collectors.append((prefix, collect))
+
+
+# ------------------------------
+# Источники: диспетчер aiogram, сессия бота, asyncpg
+# ------------------------------
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: полное время обработки и апдейты без подходящего хендлера."""
+
+    async def __call__(self, handler, event, data):
+        update_type = event.event_type
+        with timer("bot_update", type=update_type):
+            result = await handler(event, data)
+        if result is UNHANDLED:
+            inc("bot_updates_unhandled_total", type=update_type)
+        return result
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: задержка, ошибки и число выполняющихся вызовов каждого хендлера."""
+
+    async def __call__(self, handler, event, data):
+        callback = data["handler"].callback
+        resolve = getattr(callback, "resolve_handler", None)  # callback_dispatch: настоящий хендлер кнопки
+        if resolve is not None:
+            callback = resolve(event) or callback
+        labels = {"router": callback.__module__, "handler": callback.__name__}
+        gauge_add("bot_handler_in_flight", 1, **labels)
+        try:
+            with timer("bot_handler", **labels):
+                return await handler(event, data)
+        finally:
+            gauge_add("bot_handler_in_flight", -1, **labels)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: задержка каждого вызова Telegram Bot API."""
+
+    async def __call__(self, make_request, bot, method):
+        with timer("telegram_api", method=type(method).__name__):
+            return await make_request(bot, method)
+
+
+def log_query(record) -> None:
+    """Query logger для asyncpg (Connection.add_query_logger): время каждого запроса."""
+    query = " ".join(record.query.split())[:QUERY_LABEL_LENGTH]
+    observe("db_query_seconds", record.elapsed, query=query)
+    if record.exception is not None:
+        inc("db_query_errors_total", query=query)
+
+
+def setup(dp: Dispatcher, bot: Bot) -> None:
+    """Подключает middleware к диспетчеру (все роутеры) и к сессии бота."""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_metrics = HandlerMetricsMiddleware()
+    # Внутренние middleware диспетчера действуют и во вложенных роутерах
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(handler_metrics)
+    bot.session.middleware(ApiMetricsMiddleware())
+
+
+# ------------------------------
+# Выдача: Prometheus и сводка в лог
+# ------------------------------
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [
+        '%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    ]
+    if extra:
+        parts.append(extra)
+    return "{%s}" % ",".join(parts) if parts else ""
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    typed = set()
+
+    def declare(name: str, kind: str) -> None:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), histogram in sorted(_histograms.items()):
+        declare(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append("%s_bucket%s %d" % (name, _format_labels(labels, 'le="%s"' % bound), cumulative))
+        lines.append("%s_bucket%s %d" % (name, _format_labels(labels, 'le="+Inf"'), histogram.count))
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+    for kind, values in (("counter", _counters), ("gauge", _gauges)):
+        for (name, labels), value in sorted(values.items()):
+            declare(name, kind)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    for prefix, collect in _collectors:
+        try:
+            values = collect()
+        except Exception:
+            logging.exception("[METRICS] ошибка источника %s", prefix)
+            continue
+        for key, value in values.items():
+            declare(f"{prefix}_{key}", "gauge")
+            lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+async def _metrics_view(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+
+def summary() -> List[str]:
+    """Строки сводки за период с прошлого вызова: вызовы, p50/p95 и ошибки по каждому ключу."""
+    global _last_report
+    current = {key: list(h.counts) for key, h in _histograms.items()}
+    lines = []
+    for key in sorted(current):
+        name, labels = key
+        previous = _last_report.get(key, [0] * len(current[key]))
+        delta = [now - before for now, before in zip(current[key], previous)]
+        calls = sum(delta)
+        if not calls:
+            continue
+        errors_key = (name[:-len("_seconds")] + "_errors_total", labels)
+        label_text = " ".join(v for _, v in labels) or "-"
+        lines.append(
+            "%s %s: %d, p50 ≤ %s мс, p95 ≤ %s мс, ошибок всего %d" % (
+                name, label_text, calls,
+                _ms(_quantile(delta, 0.5)), _ms(_quantile(delta, 0.95)),
+                _counters.get(errors_key, 0),
+            )
+        )
+    _last_report = current
+    return lines
+
+
+def _ms(seconds: float) -> str:
+    return "∞" if seconds == float("inf") else f"{seconds * 1000:g}"
+
+
+async def _report_loop() -> None:
+    while True:
+        await asyncio.sleep(METRICS_LOG_INTERVAL)
+        lines = summary()
+        if lines:
+            logging.info("[METRICS] за %s с:\n  %s", METRICS_LOG_INTERVAL, "\n  ".join(lines))
+
+
+async def start() -> None:
+    """Запускает периодическую сводку в лог и (при METRICS_PORT) HTTP-эндпоинт /metrics."""
+    global _reporter, _runner
+    if METRICS_LOG_INTERVAL > 0 and _reporter is None:
+        _reporter = asyncio.get_running_loop().create_task(_report_loop())
+    if METRICS_PORT and _runner is None:
+        app = web.Application()
+        app.router.add_get("/metrics", _metrics_view)
+        _runner = web.AppRunner(app)
+        await _runner.setup()
+        await web.TCPSite(_runner, METRICS_HOST, METRICS_PORT).start()
+        logging.info("[METRICS] Prometheus: http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+
+
+async def stop() -> None:
+    """Останавливает сводку и эндпоинт; сводка за последний период — в лог."""
+    global _reporter, _runner
+    if _reporter is not None:
+        _reporter.cancel()
+        _reporter = None
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
+    lines = summary()
+    if lines:
+        logging.info("[METRICS] за последний период:\n  %s", "\n  ".join(lines))
@@ -0,0 +1,37 @@
+-- 001_products_notify.sql
+-- Уведомления об изменениях каталога для кэша catalog.py.
+-- Payload — код изменённого товара; "*" — перечитать каталог целиком.
+-- Применение: psql "$DATABASE_URL" -f migrations/001_products_notify.sql
+
+CREATE OR REPLACE FUNCTION notify_products_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('products_changed', '*');
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('products_changed', OLD.code);
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_notify('products_changed', NEW.code);
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF NEW.code IS DISTINCT FROM OLD.code THEN
+            PERFORM pg_notify('products_changed', NEW.code);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_notify ON products;
+CREATE TRIGGER products_notify
+    AFTER INSERT OR UPDATE OR DELETE ON products
+    FOR EACH ROW EXECUTE FUNCTION notify_products_changed();
+
+DROP TRIGGER IF EXISTS products_notify_truncate ON products;
+CREATE TRIGGER products_notify_truncate
+    AFTER TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_products_changed();
@@ -0,0 +1,11 @@
+-- 002_orders_indexes.sql
+-- Индексы под постраничную историю заказов (handlers/orders.py):
+-- keyset по (created_at, order_id) внутри пользователя и выборка состава заказа.
+-- CONCURRENTLY не блокирует запись; выполнять вне транзакции:
+-- psql "$DATABASE_URL" -f migrations/002_orders_indexes.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_user_created_idx
+    ON orders (user_id, created_at DESC, order_id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS order_items_order_id_idx
+    ON order_items (order_id);
@@ -0,0 +1,10 @@
+-- 003_carts.sql
+-- Таблица корзин для CART_BACKEND=postgres (cart_backends.PostgresBackend).
+-- Одна строка на пользователя; пустые корзины удаляются.
+-- Применение: psql "$DATABASE_URL" -f migrations/003_carts.sql
+
+CREATE TABLE IF NOT EXISTS carts (
+    user_id    BIGINT PRIMARY KEY,
+    items      JSONB NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
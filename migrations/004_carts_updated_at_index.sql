@@ -0,0 +1,6 @@
+-- 004_carts_updated_at_index.sql
+-- Индекс для удаления брошенных корзин (PostgresBackend.expire, CART_MAX_AGE).
+-- Применение: psql "$DATABASE_URL" -f migrations/004_carts_updated_at_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS carts_updated_at_idx
+    ON carts (updated_at);
@@ -0,0 +1,6 @@
+-- 005_products_category.sql
+-- Необязательная категория товара для группировки каталога
+-- (CATALOG_GROUP_BY_CATEGORY=1). Товары без категории попадают в «Прочее».
+-- Применение: psql "$DATABASE_URL" -f migrations/005_products_category.sql
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS category VARCHAR(255);
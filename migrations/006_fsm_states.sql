@@ -0,0 +1,15 @@
+-- 006_fsm_states.sql
+-- Состояния FSM aiogram для FSM_STORAGE=postgres (fsm_storage.PostgresStorage).
+-- Просроченные строки (expires_at <= now()) считаются пустыми и удаляются
+-- фоновой очисткой пачками — по индексу на expires_at.
+-- Применение: psql "$DATABASE_URL" -f migrations/006_fsm_states.sql
+
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key        TEXT PRIMARY KEY,
+    state      TEXT,
+    data       JSONB NOT NULL DEFAULT '{}',
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS fsm_states_expires_at_idx
+    ON fsm_states (expires_at);
@@ -0,0 +1,13 @@
+-- 007_catalog_import.sql
+-- Массовый импорт каталога (tools/import_catalog.py) меняет тысячи строк
+-- в одной транзакции. Чтобы бот не получил по уведомлению на каждую строку,
+-- импорт выставляет SET LOCAL catalog.bulk_import = 'on' и сам отправляет
+-- одно уведомление "*". Построчный триггер при этом молчит.
+-- Применение: psql "$DATABASE_URL" -f migrations/007_catalog_import.sql
+
+DROP TRIGGER IF EXISTS products_notify ON products;
+CREATE TRIGGER products_notify
+    AFTER INSERT OR UPDATE OR DELETE ON products
+    FOR EACH ROW
+    WHEN (current_setting('catalog.bulk_import', true) IS DISTINCT FROM 'on')
+    EXECUTE FUNCTION notify_products_changed();
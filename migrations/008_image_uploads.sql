@@ -0,0 +1,13 @@
+-- 008_image_uploads.sql
+-- Уже загруженные в Telegram фото товаров (image_ingest.py): file_id по
+-- sha256 содержимого, чтобы одну и ту же картинку не отправлять повторно.
+-- file_id действует только для бота, который его получил, — отсюда bot_id.
+-- Применение: psql "$DATABASE_URL" -f migrations/008_image_uploads.sql
+
+CREATE TABLE IF NOT EXISTS image_uploads (
+    bot_id      BIGINT NOT NULL,
+    sha256      TEXT NOT NULL,
+    file_id     TEXT NOT NULL,
+    uploaded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (bot_id, sha256)
+);
@@ -0,0 +1,11 @@
+-- 009_products_stock.sql
+-- Остатки товаров. NULL — остаток не ведётся, товар продаётся без ограничений
+-- (так остаются все товары, заведённые до миграции). Оформление заказа
+-- (handlers/products.create_order) списывает остаток условным UPDATE и
+-- отказывает, если его не хватает; CHECK — последняя страховка от минуса.
+-- Применение: psql "$DATABASE_URL" -f migrations/009_products_stock.sql
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS stock INTEGER;
+
+ALTER TABLE products DROP CONSTRAINT IF EXISTS products_stock_nonnegative;
+ALTER TABLE products ADD CONSTRAINT products_stock_nonnegative CHECK (stock >= 0);
@@ -0,0 +1,44 @@
+-- 010_sales_summary.sql
+-- Сводные таблицы продаж для /stats и отчётов (analytics.py).
+-- Фоновое обновление добавляет к ним только заказы с order_id больше
+-- водяного знака sales_watermark, поэтому отчёты не сканируют orders
+-- и order_items целиком и не мешают оформлению заказов.
+-- Пересчитать с нуля: TRUNCATE sales_daily, sales_products, sales_customers;
+-- UPDATE sales_watermark SET last_order_id = 0;
+-- Применение: psql "$DATABASE_URL" -f migrations/010_sales_summary.sql
+
+CREATE TABLE IF NOT EXISTS sales_daily (
+    day     DATE PRIMARY KEY,
+    orders  INTEGER NOT NULL,
+    items   BIGINT NOT NULL,   -- штук товара
+    revenue NUMERIC NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sales_products (
+    day          DATE NOT NULL,
+    product_code TEXT NOT NULL,
+    orders       INTEGER NOT NULL,
+    quantity     BIGINT NOT NULL,
+    revenue      NUMERIC NOT NULL,
+    PRIMARY KEY (day, product_code)
+);
+
+CREATE TABLE IF NOT EXISTS sales_customers (
+    user_id        BIGINT PRIMARY KEY,
+    orders         INTEGER NOT NULL,
+    revenue        NUMERIC NOT NULL,
+    first_order_at TIMESTAMP NOT NULL,
+    last_order_at  TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS sales_customers_last_order_idx
+    ON sales_customers (last_order_at);
+
+-- Одна строка: до какого заказа сводки уже посчитаны
+CREATE TABLE IF NOT EXISTS sales_watermark (
+    id            BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    last_order_id BIGINT NOT NULL DEFAULT 0,
+    refreshed_at  TIMESTAMPTZ
+);
+
+INSERT INTO sales_watermark (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
@@ -0,0 +1,208 @@
+# outbound.py — исходящие вызовы Bot API: лимиты, приоритеты, retry_after
+# -------------------------------------------------
+# Middleware сессии бота: каждый вызов API (message.answer, edit_text,
+# callback.answer, ...) проходит через него, хендлеры ничего не меняют.
+#
+# Лимиты — token bucket'ы, как их считает Telegram:
+#   общий на бота        — OUTBOUND_GLOBAL_RATE вызовов/с (всплеск OUTBOUND_GLOBAL_BURST);
+#   на личный чат        — OUTBOUND_CHAT_RATE сообщений/с (всплеск OUTBOUND_CHAT_BURST);
+#   на группу (chat_id<0) — OUTBOUND_GROUP_PER_MINUTE сообщений/мин.
+# Лимит чата — на отправку сообщений: правка и удаление (CHAT_FREE_METHODS)
+# новых сообщений не создают и берут только общий токен — листание
+# каталога правкой не упирается в OUTBOUND_CHAT_RATE.
+# Когда общих токенов не хватает, вызовы ждут в очереди по приоритету:
+#   ANSWER — ответы на нажатия и inline-запросы (у Telegram на них мало времени);
+#   REPLY  — обычные ответы хендлеров;
+#   BULK   — рассылки и фоновые отправки (with outbound.bulk(): ...).
+# На RetryAfter (429) чат — или весь бот, если вызов не относится к чату —
+# замолкает на retry_after секунд, после чего вызов повторяется
+# (не больше OUTBOUND_MAX_RETRIES раз).
+# -------------------------------------------------
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+import metrics
+from config import (
+    OUTBOUND_GLOBAL_RATE,
+    OUTBOUND_GLOBAL_BURST,
+    OUTBOUND_CHAT_RATE,
+    OUTBOUND_CHAT_BURST,
+    OUTBOUND_GROUP_PER_MINUTE,
+    OUTBOUND_MAX_RETRIES,
+)
+
+# Приоритеты: меньше — раньше
+ANSWER, REPLY, BULK = 0, 1, 2
+PRIORITY_NAMES = {ANSWER: "answer", REPLY: "reply", BULK: "bulk"}
+ANSWER_METHODS = {"AnswerCallbackQuery", "AnswerInlineQuery"}
+CHAT_FREE_METHODS = {  # не тратят лимит чата
+    "EditMessageText", "EditMessageReplyMarkup", "EditMessageCaption", "EditMessageMedia",
+    "DeleteMessage", "DeleteMessages",
+}
+ANSWER_MAX_RETRY_AFTER = 10  # сек.: дольше ждать ответ на нажатие бессмысленно — он устареет
+
+CHAT_BUCKETS_LIMIT = 100_000  # не больше стольких чатов в памяти (LRU)
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("outbound_priority", default=REPLY)
+
+
+@contextmanager
+def bulk() -> Iterator[None]:
+    """Вызовы API внутри блока уходят с низшим приоритетом (рассылки, фоновые задачи)."""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Token bucket с резервированием: токен можно взять «в долг», тогда нужно подождать."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен (не забирая его)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def reserve(self, now: float) -> float:
+        """Забирает токен и возвращает, сколько секунд подождать до его наступления."""
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _PriorityGate:
+    """Общий лимит бота: очередь ожидающих по приоритету, токены раздаёт одна фоновая задача."""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    def queued(self) -> Dict[str, int]:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depth[PRIORITY_NAMES[priority]] += 1
+        return depth
+
+    async def acquire(self, priority: int) -> None:
+        now = time.monotonic()
+        if not self._waiters and self.bucket.delay(now) == 0:
+            self.bucket.take(now)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pump is None:
+            self._pump = asyncio.get_running_loop().create_task(self._run())
+        await future
+
+    async def _run(self) -> None:
+        try:
+            while self._waiters:
+                now = time.monotonic()
+                wait = self.bucket.delay(now)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                _, _, future = heapq.heappop(self._waiters)
+                if future.done():
+                    continue  # ожидающий отменён
+                self.bucket.take(now)
+                future.set_result(None)
+        finally:
+            self._pump = None
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Middleware сессии бота: лимиты Telegram, приоритетная очередь и повтор после RetryAfter."""
+
+    def __init__(self):
+        self.gate = _PriorityGate(TokenBucket(OUTBOUND_GLOBAL_RATE, OUTBOUND_GLOBAL_BURST))
+        self._chats: "OrderedDict[Union[int, str], TokenBucket]" = OrderedDict()
+        self._stats = {"throttled": 0, "retry_after": 0, "gave_up": 0}
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            group = isinstance(chat_id, str) or chat_id < 0  # группы, каналы (@username)
+            bucket = (TokenBucket(OUTBOUND_GROUP_PER_MINUTE / 60, 1) if group
+                      else TokenBucket(OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST))
+            self._chats[chat_id] = bucket
+            if len(self._chats) > CHAT_BUCKETS_LIMIT:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _wait_turn(self, chat_id, priority: int) -> None:
+        started = time.monotonic()
+        if chat_id is not None:
+            wait = self._chat_bucket(chat_id).reserve(started)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        await self.gate.acquire(priority)
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self._stats["throttled"] += 1
+        metrics.observe("outbound_wait_seconds", waited, priority=PRIORITY_NAMES[priority])
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        priority = ANSWER if name in ANSWER_METHODS else _priority.get()
+        chat_id = None if priority == ANSWER else getattr(method, "chat_id", None)
+        chat_bucket = chat_id is not None and name not in CHAT_FREE_METHODS
+
+        for attempt in range(OUTBOUND_MAX_RETRIES + 1):
+            await self._wait_turn(chat_id if chat_bucket else None, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self._stats["retry_after"] += 1
+                metrics.inc("outbound_retry_after_total", method=name)
+                # Лимит чата ждёт только этот чат, остальные — весь бот
+                (self._chat_bucket(chat_id) if chat_id is not None else self.gate.bucket).block(e.retry_after)
+                if attempt == OUTBOUND_MAX_RETRIES or (priority == ANSWER and e.retry_after > ANSWER_MAX_RETRY_AFTER):
+                    self._stats["gave_up"] += 1
+                    raise
+                logging.warning("[OUTBOUND] %s: RetryAfter %s с (чат %s), повтор %d",
+                                name, e.retry_after, chat_id, attempt + 1)
+
+    def stats(self) -> Dict[str, int]:
+        """Глубина очереди по приоритетам, число приторможенных вызовов и RetryAfter."""
+        queued = self.gate.queued()
+        return dict(self._stats, chats=len(self._chats), **{f"queued_{name}": n for name, n in queued.items()})
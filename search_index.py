@@ -0,0 +1,267 @@
+# search_index.py — поиск товаров по названию и коду
+# -------------------------------------------------
+# Индекс живёт в памяти и строится из кэша каталога (catalog.py) при старте,
+# а дальше обновляется точечно по каждому изменению каталога.
+#
+# Названия и запросы нормализуются: нижний регистр, кириллица
+# транслитерируется в латиницу, похожие по звучанию сочетания
+# склеиваются (y→i, w→v, x→ks, z→s...), поэтому «асус», «ASUS» и «azus» —
+# одно и то же слово.
+# Слово запроса совпадает со словом названия по префиксу или, если
+# префиксных совпадений мало, нечётко — по сходству триграмм (Dice).
+# Слова запроса объединяются по И. Выдача собирается от лучших сочетаний
+# оценок к худшим и останавливается, как только набран limit: большие
+# множества товаров (префикс «40», частое слово) не перебираются целиком.
+# -------------------------------------------------
+
+import bisect
+import heapq
+import itertools
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import catalog
+
+_TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "c",
+    "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "", "ы": "i", "ь": "", "э": "e", "ю": "iu",
+    "я": "ia",
+}
+# Склейка латинских вариантов написания (применяется после транслитерации)
+_FOLDS = (("ph", "f"), ("ck", "k"), ("x", "ks"), ("q", "k"), ("w", "v"), ("y", "i"), ("z", "s"))
+_WORD = re.compile(r"[0-9a-z]+")
+_REPEATS = re.compile(r"(.)\1+")
+
+FUZZY_THRESHOLD = 0.5   # минимальное сходство триграмм для нечёткого совпадения
+PREFIX_SCAN_LIMIT = 300  # не больше стольких слов словаря на один префикс
+
+
+def normalize(text: str) -> List[str]:
+    """Слова текста в нормализованной форме (латиница, без повторов букв)."""
+    text = "".join(_TRANSLIT.get(ch, ch) for ch in text.lower())
+    for src, dst in _FOLDS:
+        text = text.replace(src, dst)
+    return [_REPEATS.sub(r"\1", word) for word in _WORD.findall(text)]
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Обратный индекс: слово → товары, триграмма → слова, плюс отсортированный словарь для префиксов."""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = {}      # слово → коды товаров
+        self._vocabulary: List[str] = []               # отсортированные слова — для префиксного поиска
+        self._trigram_index: Dict[str, Set[str]] = {}  # триграмма → слова
+        self._product_tokens: Dict[str, Set[str]] = {} # код → слова товара
+        self._names: Dict[str, str] = {}               # код → название (для сортировки выдачи)
+        self._by_name: List[Tuple[str, str]] = []       # (название, код) по порядку — для больших выдач
+
+    def __len__(self) -> int:
+        return len(self._product_tokens)
+
+    # --- изменение ---
+    def _add_token(self, token: str, code: str) -> None:
+        codes = self._postings.get(token)
+        if codes is None:
+            codes = self._postings[token] = set()
+            bisect.insort(self._vocabulary, token)
+            for trigram in _trigrams(token):
+                self._trigram_index.setdefault(trigram, set()).add(token)
+        codes.add(code)
+
+    def _drop_token(self, token: str, code: str) -> None:
+        codes = self._postings[token]
+        codes.discard(code)
+        if codes:
+            return
+        del self._postings[token]
+        del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+        for trigram in _trigrams(token):
+            tokens = self._trigram_index[trigram]
+            tokens.discard(token)
+            if not tokens:
+                del self._trigram_index[trigram]
+
+    def add(self, code: str, name: str) -> None:
+        """Добавляет товар или переиндексирует изменённый."""
+        self.remove(code)
+        tokens = set(normalize(name)) | set(normalize(code))
+        for token in tokens:
+            self._add_token(token, code)
+        self._product_tokens[code] = tokens
+        self._names[code] = name
+        bisect.insort(self._by_name, (name, code))
+
+    def remove(self, code: str) -> None:
+        """Убирает товар из индекса (если он там есть)."""
+        for token in self._product_tokens.pop(code, ()):
+            self._drop_token(token, code)
+        name = self._names.pop(code, None)
+        if name is not None:
+            del self._by_name[bisect.bisect_left(self._by_name, (name, code))]
+
+    def build(self, products: Iterable) -> None:
+        """Строит индекс заново по товарам с полями code и name."""
+        self.__init__()
+        # Словарь сортируем один раз, а не вставкой по одному слову
+        vocabulary = set()
+        for product in products:
+            code, name = product["code"], product["name"]
+            tokens = set(normalize(name)) | set(normalize(code))
+            for token in tokens:
+                self._postings.setdefault(token, set()).add(code)
+            vocabulary |= tokens
+            self._product_tokens[code] = tokens
+            self._names[code] = name
+        self._vocabulary = sorted(vocabulary)
+        self._by_name = sorted((name, code) for code, name in self._names.items())
+        for token in self._vocabulary:
+            for trigram in _trigrams(token):
+                self._trigram_index.setdefault(trigram, set()).add(token)
+
+    # --- поиск ---
+    def _prefix_tokens(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        found = []
+        for token in self._vocabulary[start:start + PREFIX_SCAN_LIMIT]:
+            if not token.startswith(prefix):
+                break
+            found.append(token)
+        return found
+
+    def _fuzzy_tokens(self, word: str) -> List[Tuple[str, float]]:
+        grams = _trigrams(word)
+        # Dice = 2c / (a + b) ≥ t при b ≥ c даёт c ≥ t·a / (2 − t) общих триграмм; слово с таким
+        # числом общих триграмм обязано содержать одну из (a − c + 1) самых редких — только их и смотрим
+        need = max(1, math.ceil(FUZZY_THRESHOLD * len(grams) / (2 - FUZZY_THRESHOLD)))
+        postings = sorted((self._trigram_index.get(g, ()) for g in grams), key=len)
+        candidates = set().union(*postings[:len(grams) - need + 1])
+
+        matches = []
+        for token in candidates:
+            token_grams = _trigrams(token)
+            score = 2 * len(grams & token_grams) / (len(grams) + len(token_grams))
+            if score >= FUZZY_THRESHOLD:
+                matches.append((token, score))
+        return matches
+
+    def _word_tokens(self, word: str) -> List[Tuple[str, float]]:
+        """Слова словаря, подходящие под слово запроса, с оценкой совпадения."""
+        if len(word) < 2:
+            # Одна буква как префикс подходит почти ко всему — только точное совпадение
+            return [(word, 2.0)] if word in self._postings else []
+        # Точное слово выше префикса, короткий «хвост» выше длинного
+        matches = [(token, 2.0 if token == word else 1.0 + len(word) / len(token))
+                   for token in self._prefix_tokens(word)]
+        # Опечатки ищем только в буквенных словах: номер модели или код, набранный
+        # с ошибкой, нечётко совпадёт с десятком соседних номеров
+        if not matches and len(word) >= 3 and word.isalpha():
+            matches = self._fuzzy_tokens(word)
+        return matches
+
+    @staticmethod
+    def _levels(matches: List[Tuple[str, float]]) -> List[Tuple[float, List[str]]]:
+        """Подошедшие слова словаря, сгруппированные по оценке, — от лучшей к худшей."""
+        by_score: Dict[float, List[str]] = {}
+        for token, score in matches:
+            by_score.setdefault(score, []).append(token)
+        return sorted(by_score.items(), reverse=True)
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """Коды товаров, подходящих под все слова запроса, лучшие первыми."""
+        words = [self._word_tokens(word) for word in set(normalize(query))]
+        if not words or not all(words):
+            return []
+        levels = [self._levels(matches) for matches in words]
+        unions: Dict[Tuple[int, int], Set[str]] = {}
+
+        def codes(word: int, level: int) -> Set[str]:
+            # Товары уровня оценки слова; объединение строится, только когда до уровня дошли
+            found = unions.get((word, level))
+            if found is None:
+                tokens = levels[word][level][1]
+                if len(tokens) == 1:
+                    found = self._postings[tokens[0]]
+                else:
+                    found = set().union(*(self._postings[token] for token in tokens))
+                unions[word, level] = found
+            return found
+
+        def total(combo: Tuple[int, ...]) -> float:
+            return sum(levels[word][level][0] for word, level in enumerate(combo))
+
+        # Сочетания уровней (по уровню на слово) перебираем по убыванию суммы оценок.
+        # Товар впервые встречается в сочетании лучших для него слов — это и есть его оценка.
+        # Как только набралось limit товаров и сумма упала, остальные сочетания не нужны:
+        # крупные объединения (префикс «40» → все 4060 и 4070) до этого обычно не строятся
+        first = (0,) * len(levels)
+        heap = [(-total(first), first)]
+        queued = {first}
+        seen: Set[str] = set()
+        ranked: Dict[float, Set[str]] = {}
+        previous = None
+        while heap:
+            score, combo = heapq.heappop(heap)
+            score = -score
+            if len(seen) >= limit and score != previous:
+                break
+            previous = score
+            # Пересечение — от самого редкого множества, чтобы промежуточные были малы
+            sets = sorted((codes(word, level) for word, level in enumerate(combo)), key=len)
+            matched = sets[0].intersection(*sets[1:])
+            matched -= seen
+            if matched:
+                seen |= matched
+                ranked.setdefault(score, set()).update(matched)
+            for word, level in enumerate(combo):
+                if level + 1 < len(levels[word]):
+                    following = combo[:word] + (level + 1,) + combo[word + 1:]
+                    if following not in queued:
+                        queued.add(following)
+                        heapq.heappush(heap, (-total(following), following))
+
+        # Внутри уровня оценки — первые по названию. Большой уровень (тысячи товаров с одной
+        # оценкой) не сортируем: идём по всему каталогу в порядке названий и берём его товары —
+        # нужные найдутся примерно через need · N / |уровень| шагов
+        found: List[str] = []
+        for score in sorted(ranked, reverse=True):
+            level, need = ranked[score], limit - len(found)
+            if len(level) ** 2 > need * len(self._by_name):
+                found += itertools.islice((code for _, code in self._by_name if code in level), need)
+            else:
+                found += heapq.nsmallest(need, level, key=self._names.__getitem__)
+            if len(found) >= limit:
+                break
+        return found
+
+
+# Общий индекс бота
+index = SearchIndex()
+
+
+def search(query: str, limit: int = 20) -> List[str]:
+    """Коды найденных товаров, лучшие первыми."""
+    return index.search(query, limit)
+
+
+def on_catalog_change(code: Optional[str], product) -> None:
+    """Обновляет индекс по изменению каталога (code=None — каталог перечитан целиком)."""
+    if code is None:
+        index.build(catalog.snapshot())
+    elif product is None:
+        index.remove(code)
+    else:
+        index.add(product["code"], product["name"])
+
+
+def start() -> None:
+    """Строит индекс по загруженному каталогу и подписывается на его изменения."""
+    index.build(catalog.snapshot())
+    catalog.add_change_listener(on_catalog_change)
@@ -0,0 +1,472 @@
+# supervisor.py — несколько процессов-воркеров с раздачей апдейтов по user_id
+# -------------------------------------------------
+# BOT_WORKERS > 1: main.py запускается супервизором. Он сам ничего не
+# обрабатывает — принимает апдейты (polling или webhook, как BOT_MODE)
+# и раздаёт их BOT_WORKERS процессам `python main.py` с BOT_MODE=worker.
+# Воркер — обычный бот: тот же Dispatcher, роутеры, корзины и FSM.
+#
+# Воркер выбирается по user_id (from_user.id % BOT_WORKERS), поэтому все
+# апдейты пользователя попадают в один процесс: его корзина в горячем
+# слое cart_store и состояние FSM живут только там. Внутри воркера
+# апдейты одного пользователя выполняются строго по очереди, разных —
+# параллельно (не больше WORKER_CONCURRENCY). Слот занимает только
+# апдейт, который уже выполняется: следующие апдейты того же
+# пользователя ждут в его очереди без слота, и поток от одного
+# пользователя не задерживает остальных.
+#
+# Канал супервизор → воркер: stdin, по апдейту (JSON) на строку; воркер
+# отвечает в stdout строкой "@done" на каждый обработанный. Логи
+# воркеров идут в общий stderr. Очередь воркера ограничена
+# (WORKER_BACKLOG): занятый воркер притормаживает приём апдейтов.
+#
+# SIGHUP — поочерёдный перезапуск воркеров (после выкладки кода):
+# воркер дорабатывает уже отправленное, сохраняет корзины и выходит,
+# апдейты его пользователей тем временем ждут в очереди и достаются
+# новому процессу в том же порядке. Упавший воркер поднимается заново
+# (с паузой); то, что он не успел обработать, теряется и попадает в lost.
+# Раз в WORKER_REPORT_INTERVAL — апдейтов/с по каждому воркеру в лог.
+#
+# Корзины в json (один процесс на файл) здесь не подходят —
+# нужен CART_BACKEND=sqlite или postgres. Супервизор захватывает
+# хранилище корзин (cart_backends: claim), поэтому второй супервизор или
+# отдельный бот на том же хранилище не запустятся — иначе пользователь
+# попал бы в два процесса сразу.
+# -------------------------------------------------
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+import metrics
+from cart_backends import create_backend
+from config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    BOT_WORKERS,
+    CART_BACKEND,
+    METRICS_ENABLED,
+    METRICS_PORT,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS,
+    WORKER_BACKLOG,
+    WORKER_CONCURRENCY,
+    WORKER_REPORT_INTERVAL,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_COMMAND = [sys.executable, os.path.join(BASE_DIR, "main.py")]
+DONE = b"@done"
+LINE_LIMIT = 4 * 1024 * 1024  # апдейт — одна строка JSON
+STOP_TIMEOUT = 30             # сек. на доработку и сохранение корзин при остановке воркера
+RESTART_BACKOFF = (1, 2, 5, 10, 30)  # паузы перед подъёмом упавшего воркера подряд
+POLLING_TIMEOUT = 30
+HEALTH_PATH = "/healthz"
+
+
+def _id(obj: Any) -> Optional[int]:
+    value = obj.get("id") if isinstance(obj, dict) else None
+    return value if isinstance(value, int) else None
+
+
+def user_key(update: Any) -> int:
+    """user_id автора апдейта; для апдейтов без пользователя — id чата, иначе 0 (и для не-объекта)."""
+    if not isinstance(update, dict):
+        return 0
+    for field, event in update.items():
+        if field == "update_id" or not isinstance(event, dict):
+            continue
+        user = _id(event.get("from") or event.get("user"))
+        if user is not None:
+            return user
+        message = event.get("message")
+        chat = _id(event.get("chat") or (message.get("chat") if isinstance(message, dict) else None))
+        if chat is not None:
+            return chat
+    return 0
+
+
+# ------------------------------
+# Супервизор
+# ------------------------------
+class WorkerProcess:
+    """Один воркер: процесс, его очередь апдейтов и счётчики."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WORKER_BACKLOG)  # строки JSON; None — «закрыть stdin»
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.in_flight = 0  # отправлено процессу, ещё не обработано
+        self.counters = {"routed": 0, "done": 0, "lost": 0, "restarts": 0, "crashes": 0}
+        self._reported_done = 0
+        self._stopping = False
+        self._planned_restart = False
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def route(self, line: bytes) -> None:
+        self.counters["routed"] += 1
+        await self.queue.put(line)
+
+    def try_route(self, line: bytes) -> bool:
+        try:
+            self.queue.put_nowait(line)
+        except asyncio.QueueFull:
+            return False
+        self.counters["routed"] += 1
+        return True
+
+    async def _spawn(self) -> None:
+        env = dict(os.environ, BOT_MODE="worker", WORKER_INDEX=str(self.index))
+        if METRICS_PORT:
+            env["METRICS_PORT"] = str(METRICS_PORT + 1 + self.index)  # METRICS_PORT — у супервизора
+        self.process = await asyncio.create_subprocess_exec(
+            *WORKER_COMMAND, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            env=env, limit=LINE_LIMIT,
+        )
+        logging.info("[SUPERVISOR] воркер %d запущен, pid %d", self.index, self.process.pid)
+        self._ready.set()
+
+    async def _write(self) -> None:
+        stdin = self.process.stdin
+        while True:
+            line = await self.queue.get()
+            if line is None:
+                # Всё, что было в очереди до перезапуска/остановки, уже у процесса
+                stdin.close()
+                return
+            self.in_flight += 1
+            stdin.write(line + b"\n")
+            await stdin.drain()
+
+    async def _read(self) -> None:
+        async for line in self.process.stdout:
+            if line.rstrip() == DONE:
+                self.in_flight -= 1
+                self.counters["done"] += 1
+            elif line.strip():
+                logging.info("[WORKER %d] %s", self.index, line.decode(errors="replace").rstrip())
+
+    async def _run(self) -> None:
+        crashes = 0
+        while True:
+            await self._spawn()
+            started = time.monotonic()
+            writer = asyncio.get_running_loop().create_task(self._write())
+            reader = asyncio.get_running_loop().create_task(self._read())
+            code = await self.process.wait()
+            await reader
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)  # BrokenPipe у упавшего — ожидаемо
+
+            if self.in_flight:
+                self.counters["lost"] += self.in_flight
+                logging.warning("[SUPERVISOR] воркер %d: не обработано апдейтов: %d", self.index, self.in_flight)
+                self.in_flight = 0
+            if self._stopping:
+                return
+            if self._planned_restart:
+                self._planned_restart = False
+                self.counters["restarts"] += 1
+                crashes = 0
+                continue
+
+            self.counters["crashes"] += 1
+            crashes = crashes + 1 if time.monotonic() - started < RESTART_BACKOFF[-1] else 1
+            pause = RESTART_BACKOFF[min(crashes, len(RESTART_BACKOFF)) - 1]
+            logging.error("[SUPERVISOR] воркер %d завершился с кодом %s, перезапуск через %d с",
+                          self.index, code, pause)
+            self._ready.clear()
+            await asyncio.sleep(pause)
+
+    async def restart(self) -> None:
+        """Плановый перезапуск: старый процесс дорабатывает очередь до этой точки, дальше — новый."""
+        self._planned_restart = True
+        self._ready.clear()
+        await self.queue.put(None)
+        await self._ready.wait()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        await self.queue.put(None)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning("[SUPERVISOR] воркер %d не остановился за %d с, kill", self.index, STOP_TIMEOUT)
+            if self.process is not None and self.process.returncode is None:
+                self.process.kill()
+            await self._task
+
+    def throughput(self, interval: float) -> float:
+        done = self.counters["done"]
+        rate = (done - self._reported_done) / interval
+        self._reported_done = done
+        return rate
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики воркера, очередь и число апдейтов в обработке."""
+        return dict(self.counters, queued=self.queue.qsize(), in_flight=self.in_flight,
+                    pid=self.process.pid if self.process is not None else 0)
+
+
+class Supervisor:
+    def __init__(self, workers: int):
+        self.workers = [WorkerProcess(i) for i in range(workers)]
+
+    def worker_for(self, update: Dict[str, Any]) -> WorkerProcess:
+        return self.workers[user_key(update) % len(self.workers)]
+
+    def start(self) -> None:
+        for worker in self.workers:
+            worker.start()
+
+    async def rolling_restart(self) -> None:
+        logging.info("[SUPERVISOR] поочерёдный перезапуск %d воркеров", len(self.workers))
+        for worker in self.workers:
+            await worker.restart()
+        logging.info("[SUPERVISOR] перезапуск завершён")
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+        for worker in self.workers:
+            logging.info("[SUPERVISOR] воркер %d: %s", worker.index, worker.stats())
+
+    async def report_loop(self) -> None:
+        while True:
+            await asyncio.sleep(WORKER_REPORT_INTERVAL)
+            lines = [
+                "воркер %d: %.1f апд/с, в очереди %d, в обработке %d, потеряно %d, перезапусков %d" % (
+                    worker.index, worker.throughput(WORKER_REPORT_INTERVAL), worker.queue.qsize(),
+                    worker.in_flight, worker.counters["lost"], worker.counters["restarts"] + worker.counters["crashes"],
+                )
+                for worker in self.workers
+            ]
+            logging.info("[SUPERVISOR] за %s с:\n  %s", WORKER_REPORT_INTERVAL, "\n  ".join(lines))
+
+
+async def _poll(bot: Bot, supervisor: Supervisor, allowed_updates: List[str]) -> None:
+    """Long polling: апдейты по очереди уходят воркерам; полная очередь воркера тормозит опрос."""
+    offset = None
+    failures = 0
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLLING_TIMEOUT,
+                                            allowed_updates=allowed_updates)
+        except Exception as e:
+            failures += 1
+            pause = RESTART_BACKOFF[min(failures, len(RESTART_BACKOFF)) - 1]
+            logging.warning("[SUPERVISOR] getUpdates: %s, повтор через %d с", e, pause)
+            await asyncio.sleep(pause)
+            continue
+        failures = 0
+        for update in updates:
+            raw = update.model_dump(mode="json", by_alias=True, exclude_unset=True)
+            await supervisor.worker_for(raw).route(json.dumps(raw, ensure_ascii=False).encode())
+            offset = update.update_id + 1
+
+
+def _webhook_app(supervisor: Supervisor) -> web.Application:
+    async def receive(request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(body="Unauthorized", status=401)
+        body = await request.read()
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return web.Response(body="Bad Request", status=400)
+        if not isinstance(update, dict):
+            return web.Response(body="Bad Request", status=400)  # апдейт — всегда объект
+        # Тело уходит воркеру как есть; переполненная очередь — 503, Telegram повторит
+        if not supervisor.worker_for(update).try_route(b" ".join(body.splitlines())):
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.json_response({})
+
+    async def health(request: web.Request) -> web.Response:
+        workers = [worker.stats() for worker in supervisor.workers]
+        ok = all(stats["pid"] and stats["queued"] < WORKER_BACKLOG for stats in workers)
+        return web.json_response({"status": "ok" if ok else "degraded", "workers": workers},
+                                 status=200 if ok else 503)
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, receive)
+    app.router.add_get(HEALTH_PATH, health)
+    return app
+
+
+def _install_signals(stop: asyncio.Event, restart: Callable[[], None]) -> None:
+    loop = asyncio.get_running_loop()
+    for sig, callback in ((signal.SIGINT, stop.set), (signal.SIGTERM, stop.set), (signal.SIGHUP, restart)):
+        try:
+            loop.add_signal_handler(sig, callback)
+        except (NotImplementedError, RuntimeError, AttributeError):
+            pass  # Windows: SIGHUP нет, остаётся Ctrl+C
+
+
+async def run(include_routers: Callable[[Dispatcher], None]) -> None:
+    """Режим супервизора: принимает апдейты и раздаёт их BOT_WORKERS воркерам до SIGINT/SIGTERM."""
+    if CART_BACKEND == "json":
+        raise RuntimeError("BOT_WORKERS > 1: json-хранилище корзин — для одного процесса, "
+                           "нужен CART_BACKEND=sqlite или postgres")
+    cart_owner = create_backend()
+    await cart_owner.claim()
+    try:
+        await _supervise(include_routers)
+    finally:
+        await cart_owner.release()
+
+
+async def _supervise(include_routers: Callable[[Dispatcher], None]) -> None:
+    # Роутеры нужны только чтобы знать, какие типы апдейтов просить у Telegram
+    dp = Dispatcher()
+    include_routers(dp)
+    allowed_updates = dp.resolve_used_update_types()
+
+    bot = Bot(token=BOT_TOKEN)
+    supervisor = Supervisor(BOT_WORKERS)
+    supervisor.start()
+    if METRICS_ENABLED:
+        for worker in supervisor.workers:
+            metrics.add_collector(f"worker{worker.index}", worker.stats)
+        await metrics.start()
+
+    stop = asyncio.Event()
+    restarting: set = set()
+
+    def restart() -> None:
+        task = asyncio.get_running_loop().create_task(supervisor.rolling_restart())
+        restarting.add(task)
+        task.add_done_callback(restarting.discard)
+
+    _install_signals(stop, restart)
+    reporter = asyncio.get_running_loop().create_task(supervisor.report_loop())
+    runner: Optional[web.AppRunner] = None
+    receiver: Optional[asyncio.Task] = None
+    try:
+        if BOT_MODE == "webhook":
+            if not WEBHOOK_URL:
+                raise RuntimeError("BOT_MODE=webhook требует WEBHOOK_URL")
+            runner = web.AppRunner(_webhook_app(supervisor))
+            await runner.setup()
+            await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+            await bot.set_webhook(
+                WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=allowed_updates,
+            )
+        else:
+            await bot.delete_webhook()
+            receiver = asyncio.get_running_loop().create_task(_poll(bot, supervisor, allowed_updates))
+        logging.info("[SUPERVISOR] %s, воркеров: %d", BOT_MODE, BOT_WORKERS)
+        await stop.wait()
+    finally:
+        # Сначала перестаём принимать, потом воркеры дорабатывают очереди и сохраняют корзины
+        if receiver is not None:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+        if runner is not None:
+            await runner.cleanup()
+        reporter.cancel()
+        await supervisor.stop()
+        await metrics.stop()
+        await bot.session.close()
+
+
+# ------------------------------
+# Воркер (BOT_MODE=worker)
+# ------------------------------
+class UserQueues:
+    """
+    Апдейты одного пользователя — строго по очереди, разных — параллельно.
+    Слот (не больше concurrency) берётся, когда апдейт дождался предыдущего
+    своего пользователя; прочитанных, но не обработанных — не больше backlog.
+    """
+
+    def __init__(self, handle: Callable, done: Callable[[], None], concurrency: int, backlog: int):
+        self._handle = handle  # async fn(update)
+        self._done = done      # после каждого апдейта, даже упавшего
+        self._slots = asyncio.Semaphore(concurrency)
+        self._backlog = asyncio.Semaphore(backlog)
+        self._tails: Dict[int, asyncio.Task] = {}  # последний апдейт каждого пользователя
+
+    async def submit(self, update: Dict[str, Any]) -> None:
+        """Ставит апдейт в очередь его пользователя; ждёт, только если backlog заполнен."""
+        await self._backlog.acquire()
+        key = user_key(update)
+        task = asyncio.get_running_loop().create_task(self._process(self._tails.get(key), update))
+        self._tails[key] = task
+        task.add_done_callback(lambda t, key=key: self._forget(key, t))
+
+    async def _process(self, previous: Optional[asyncio.Task], update: Dict[str, Any]) -> None:
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            async with self._slots:
+                await self._handle(update)
+        except Exception:
+            logging.exception("Воркер: ошибка обработки апдейта %s", update.get("update_id"))
+        finally:
+            self._backlog.release()
+            self._done()
+
+    def _forget(self, key: int, task: asyncio.Task) -> None:
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def drain(self) -> None:
+        """Ждёт обработки всего, что уже поставлено."""
+        if self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+
+async def run_worker(dp: Dispatcher, bot: Bot) -> None:
+    """Обрабатывает апдейты из stdin до его закрытия; по пользователю — строго по очереди."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    stopping = asyncio.Event()
+
+    # Останавливает супервизор (закрывает stdin); Ctrl+C в терминале достаётся и воркерам — его пропускаем
+    for sig, callback in ((signal.SIGINT, lambda: None), (signal.SIGTERM, stopping.set)):
+        try:
+            loop.add_signal_handler(sig, callback)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    def ack() -> None:
+        sys.stdout.buffer.write(DONE + b"\n")
+        sys.stdout.buffer.flush()
+
+    # Вперёд читаем не больше, чем супервизор держит в очереди воркера, плюс выполняемые
+    queues = UserQueues(lambda update: dp.feed_raw_update(bot, update), ack,
+                        WORKER_CONCURRENCY, WORKER_CONCURRENCY + WORKER_BACKLOG)
+    stop_wait = loop.create_task(stopping.wait())
+    try:
+        while True:
+            read = loop.create_task(reader.readline())
+            await asyncio.wait([read, stop_wait], return_when=asyncio.FIRST_COMPLETED)
+            if not read.done():
+                read.cancel()
+                break
+            line = read.result()
+            if not line:
+                break  # stdin закрыт: перезапуск или остановка
+            await queues.submit(json.loads(line))
+    finally:
+        stop_wait.cancel()
+        await queues.drain()
+        logging.info("Воркер %s: очередь доработана", os.getenv("WORKER_INDEX", "?"))
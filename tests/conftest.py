@@ -0,0 +1,63 @@
+# tests/conftest.py — общие помощники тестов
+# Тесты не ходят в PostgreSQL и Telegram: database.acquire подменяется
+# фейковым соединением, которое отвечает заранее заданными строками.
+import contextlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+class FakeConnection:
+    """Соединение asyncpg, которое отдаёт ответы из функций вместо запросов к БД."""
+
+    def __init__(self, fetch=None, fetchrow=None, fetchval=None, execute=None):
+        self._fetch, self._fetchrow, self._fetchval, self._execute = fetch, fetchrow, fetchval, execute
+        self.queries = []
+
+    async def fetch(self, query, *args):
+        self.queries.append((query, args))
+        return self._fetch(query, *args)
+
+    async def fetchrow(self, query, *args):
+        self.queries.append((query, args))
+        return self._fetchrow(query, *args)
+
+    async def fetchval(self, query, *args):
+        self.queries.append((query, args))
+        return self._fetchval(query, *args)
+
+    async def execute(self, query, *args):
+        self.queries.append((query, args))
+        return self._execute(query, *args) if self._execute else "OK"
+
+    def transaction(self):
+        return _Transaction()
+
+
+class _Transaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Подменяет database.acquire: fake_db(conn) — все запросы идут в conn."""
+    def install(conn: FakeConnection) -> FakeConnection:
+        @contextlib.asynccontextmanager
+        async def acquire():
+            yield conn
+        # Модули, сделавшие `from database import acquire`, держат свою ссылку — подменяем и её
+        original = database.acquire
+        for module in list(sys.modules.values()):
+            if getattr(module, "acquire", None) is original:
+                monkeypatch.setattr(module, "acquire", acquire)
+        return conn
+    return install
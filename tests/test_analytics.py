@@ -0,0 +1,69 @@
+# Сводки продаж: водяной знак и пачки обновления
+import asyncio
+from datetime import date
+
+import analytics
+from tests.conftest import FakeConnection
+
+
+class Orders:
+    """Водяной знак и номера заказов; конец пачки выдаётся по заранее заданному списку."""
+
+    def __init__(self, batch_ends, counts):
+        self.watermark = 0
+        self.batch_ends = list(batch_ends)
+        self.counts = list(counts)
+
+    def fetchval(self, query, *args):
+        if "FROM sales_watermark FOR UPDATE" in query:
+            return self.watermark
+        if query is analytics._NEXT_BATCH_SQL:
+            return self.batch_ends.pop(0)
+        if "SELECT COUNT(*) FROM orders" in query:
+            return self.counts.pop(0)
+        if "CURRENT_DATE" in query:
+            return date(2026, 10, 18)
+        raise AssertionError(query)
+
+    def execute(self, query, *args):
+        if query.lstrip().startswith("UPDATE sales_watermark"):
+            self.watermark = args[0]
+        return "OK"
+
+
+def _install(fake_db, orders):
+    return fake_db(FakeConnection(fetchval=orders.fetchval, execute=orders.execute))
+
+
+def test_refresh_moves_watermark_batch_by_batch(fake_db, monkeypatch):
+    monkeypatch.setattr(analytics, "SALES_REFRESH_BATCH", 3)
+    orders = Orders(batch_ends=[13, 17, 18], counts=[3, 3, 1])
+    conn = _install(fake_db, orders)
+
+    assert asyncio.run(analytics.refresh()) == 7
+    assert orders.watermark == 18
+    ranges = [args for query, args in conn.queries if query is analytics._DAILY_SQL]
+    assert ranges == [(0, 13), (13, 17), (17, 18)]
+
+
+def test_refresh_without_new_orders_writes_nothing(fake_db):
+    orders = Orders(batch_ends=[None], counts=[])
+    conn = _install(fake_db, orders)
+
+    assert asyncio.run(analytics.refresh()) == 0
+    assert orders.watermark == 0
+    assert not [query for query, _ in conn.queries if "INSERT INTO" in query]
+
+
+def test_batch_sql_stops_before_first_young_order():
+    # Пачка не должна перепрыгивать молодой заказ, даже если за ним есть «старые» номера
+    sql = " ".join(analytics._NEXT_BATCH_SQL.split())
+    assert "ORDER BY order_id LIMIT $3" in sql
+    assert "y.young AND y.order_id <= u.order_id" in sql
+
+
+def test_report_period_uses_database_date(fake_db):
+    orders = Orders(batch_ends=[], counts=[])
+    conn = _install(fake_db, orders)
+    assert asyncio.run(analytics._since(7)) == date(2026, 10, 18)
+    assert conn.queries[-1][1] == (6,)
@@ -0,0 +1,45 @@
+# callback_data кнопок: упаковка кодов товаров и «плохие» коды в каталоге
+import asyncio
+
+import pytest
+
+import catalog
+from keyboards import catalog_pages
+from keyboards.callbacks import CALLBACK_DATA_LIMIT, MAX_CODE_BYTES, ProductAdd, ProductDetails, code_fits
+from tests.conftest import FakeConnection
+
+
+def _product(code, name):
+    return {"code": code, "name": name, "price": 100, "image_file_id": None, "stock": None, "category": None}
+
+
+@pytest.mark.parametrize("code", ["A1", "RTX-4060/8G", "видеокарта-1", "x" * MAX_CODE_BYTES])
+def test_code_round_trip(code):
+    assert code_fits(code)
+    for factory in (ProductDetails, ProductAdd):
+        data = factory(code=code).pack()
+        assert len(data.encode()) <= CALLBACK_DATA_LIMIT
+        assert factory.unpack(data).code == code
+
+
+@pytest.mark.parametrize("code", ["A:1", "x" * (MAX_CODE_BYTES + 1), "ж" * (MAX_CODE_BYTES // 2 + 1)])
+def test_code_does_not_fit(code):
+    assert not code_fits(code)
+    with pytest.raises(ValueError):  # от этого и защищает code_fits: aiogram не строит такую кнопку
+        ProductDetails(code=code).pack()
+
+
+def test_catalog_page_survives_bad_code(fake_db, monkeypatch, caplog):
+    monkeypatch.setattr(catalog, "_change_listeners", [])
+    monkeypatch.setattr(catalog, "_stock_listeners", [])
+    monkeypatch.setattr(catalog_pages, "CATALOG_GROUP_BY_CATEGORY", False)
+    rows = [_product("GOOD", "Мышь"), _product("BAD:1", "Клавиатура"), _product("L" * 80, "Монитор")]
+    fake_db(FakeConnection(fetch=lambda query: rows))
+    asyncio.run(catalog.load())
+
+    text, kb = catalog_pages.get_catalog_page(0)
+    assert "Клавиатура" in text and "Монитор" in text  # в списке товар остаётся
+    codes = [button.callback_data for row in kb.inline_keyboard for button in row]
+    assert ProductDetails(code="GOOD").pack() in codes
+    assert not any("BAD" in data or "LLL" in data for data in codes)
+    assert "BAD:1" in caplog.text
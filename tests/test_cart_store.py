@@ -0,0 +1,118 @@
+# Корзины: отложенная запись, схлопывание изменений, вытеснение грязных корзин
+import asyncio
+
+import pytest
+
+import cart_store
+from cart_backends import CartBackend
+
+
+class MemoryBackend(CartBackend):
+    name = "memory"
+
+    def __init__(self, fail_writes=0):
+        self.carts = {}
+        self.writes = []  # пачки в порядке записи
+        self.fail_writes = fail_writes
+
+    async def load(self, user_id):
+        rows = self.carts.get(user_id)
+        return (rows, 0.0) if rows else None
+
+    async def write(self, batch):
+        if self.fail_writes:
+            self.fail_writes -= 1
+            raise OSError("диск недоступен")
+        self.writes.append(dict(batch))
+        for user_id, rows in batch.items():
+            if rows:
+                self.carts[user_id] = rows
+            else:
+                self.carts.pop(user_id, None)
+
+    async def expire(self, cutoff):
+        return 0
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(cart_store, "CART_FLUSH_INTERVAL", 3600)  # сбрасываем сами
+    monkeypatch.setattr(cart_store, "CART_FLUSH_THRESHOLD", 1000)
+    monkeypatch.setattr(cart_store, "_backend", None)
+    monkeypatch.setattr(cart_store, "_writer", None)
+    monkeypatch.setattr(cart_store, "_flush_lock", asyncio.Lock())
+
+    def run(scenario, backend=None, writer=True):
+        backend = backend or MemoryBackend()
+
+        async def main():
+            await cart_store.load_cart(backend)
+            if writer:
+                cart_store.start_writer()
+            try:
+                await scenario(backend)
+            finally:
+                await cart_store.close_cart()
+
+        asyncio.run(main())
+        return backend
+
+    return run
+
+
+def test_without_writer_changes_are_written_at_once(store):
+    async def scenario(backend):
+        await cart_store.add_item(1, "A", "Мышь", 1, 100)
+        assert backend.carts == {"1": [["A", "Мышь", 1, 100]]}
+        await cart_store.clear_user_cart(1)
+        assert backend.carts == {}
+
+    store(scenario, writer=False)
+
+
+def test_changes_coalesce_until_flush(store):
+    async def scenario(backend):
+        for _ in range(3):
+            await cart_store.add_item(1, "A", "Мышь", 1, 100)
+        await cart_store.add_item(2, "B", "Клавиатура", 1, 200)
+        assert backend.writes == []  # event loop не ждал хранилище
+        await cart_store.flush()
+        assert backend.writes == [{"1": [["A", "Мышь", 3, 100]], "2": [["B", "Клавиатура", 1, 200]]}]
+        await cart_store.flush()
+        assert len(backend.writes) == 1  # нечего писать
+
+    store(scenario)
+
+
+def test_stop_writer_flushes_the_rest(store):
+    async def scenario(backend):
+        await cart_store.add_item(1, "A", "Мышь", 2, 100)
+
+    backend = store(scenario)
+    assert backend.carts == {"1": [["A", "Мышь", 2, 100]]}
+
+
+def test_failed_write_is_retried(store):
+    async def scenario(backend):
+        await cart_store.add_item(1, "A", "Мышь", 1, 100)
+        with pytest.raises(OSError):
+            await cart_store.flush()
+        await cart_store.add_item(1, "A", "Мышь", 1, 100)
+        await cart_store.flush()
+        assert backend.carts == {"1": [["A", "Мышь", 2, 100]]}
+
+    store(scenario, MemoryBackend(fail_writes=1))
+
+
+def test_evicted_dirty_cart_is_not_lost(store, monkeypatch):
+    monkeypatch.setattr(cart_store, "CART_CACHE_SIZE", 1)
+
+    async def scenario(backend):
+        await cart_store.add_item(1, "A", "Мышь", 1, 100)
+        await cart_store.add_item(2, "B", "Клавиатура", 1, 200)  # вытесняет корзину 1 до записи
+        assert "1" not in cart_store._cart
+        assert await cart_store.get_user_cart(1) == [("A", "Мышь", 1, 100)]
+        await cart_store.flush()
+        assert backend.carts == {"1": [["A", "Мышь", 1, 100]], "2": [["B", "Клавиатура", 1, 200]]}
+
+    store(scenario)
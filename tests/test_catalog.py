@@ -0,0 +1,99 @@
+# Кэш каталога: порядок, точечные изменения, изменения только остатка
+import asyncio
+
+import pytest
+
+import catalog
+from keyboards import catalog_pages
+from tests.conftest import FakeConnection
+
+NAMES = ["apple mouse", "Banana PSU", "cherry keyboard", "Dell monitor",
+         "Асус ROG", "видеокарта MSI", "Ёлочная гирлянда", "блок питания", "apple mouse"]
+
+
+def _product(code, name, stock=10, category=None):
+    return {"code": code, "name": name, "price": 100, "image_file_id": None, "stock": stock, "category": category}
+
+
+@pytest.fixture
+def rows():
+    return {f"A{i}": _product(f"A{i}", name) for i, name in enumerate(NAMES)}
+
+
+@pytest.fixture
+def loaded(fake_db, rows, monkeypatch):
+    # Строки приходят в «чужом» порядке (как по collation БД) — кэш упорядочивает их сам
+    monkeypatch.setattr(catalog, "_change_listeners", [])
+    monkeypatch.setattr(catalog, "_stock_listeners", [])
+    fake_db(FakeConnection(
+        fetch=lambda query: sorted(rows.values(), key=lambda row: row["name"].lower().replace(" ", "")),
+        fetchrow=lambda query, code: rows.get(code),
+    ))
+    asyncio.run(catalog.load())
+    return rows
+
+
+def _assert_consistent():
+    assert catalog._keys == [catalog._sort_key(product) for product in catalog.snapshot()]
+    assert catalog._keys == sorted(catalog._keys)
+    for index, product in enumerate(catalog.snapshot()):
+        assert catalog.position(product["code"]) == index
+
+
+def test_load_orders_case_insensitively(loaded):
+    names = [product["name"] for product in catalog.snapshot()]
+    assert names[:5] == ["apple mouse", "apple mouse", "Banana PSU", "cherry keyboard", "Dell monitor"]
+    assert names[5:] == ["Асус ROG", "блок питания", "видеокарта MSI", "Ёлочная гирлянда"]
+    _assert_consistent()
+
+
+def test_position_unknown_code(loaded):
+    assert catalog.position("NOPE") is None
+
+
+def test_refresh_insert_rename_delete(loaded, rows):
+    rows["B1"] = _product("B1", "ZOTAC RTX")
+    asyncio.run(catalog.refresh_product("B1"))
+    rows["A1"] = _product("A1", "aardvark pad")  # переименование двигает товар
+    asyncio.run(catalog.refresh_product("A1"))
+    del rows["A3"]
+    asyncio.run(catalog.refresh_product("A3"))
+
+    _assert_consistent()
+    codes = [product["code"] for product in catalog.snapshot()]
+    assert codes[0] == "A1"
+    assert "A3" not in codes and catalog.peek("A3") is None
+    assert codes.index("B1") == codes.index("A4") - 1  # латиница перед кириллицей
+
+
+def test_stock_only_change_keeps_version(loaded, rows):
+    seen = []
+    catalog.add_stock_listener(lambda product, previous: seen.append((previous["stock"], product["stock"])))
+    version = catalog.version()
+    rows["A2"] = dict(rows["A2"], stock=3)
+    asyncio.run(catalog.refresh_product("A2"))
+
+    assert catalog.version() == version
+    assert catalog.peek("A2")["stock"] == 3
+    assert catalog.snapshot()[catalog.position("A2")]["stock"] == 3
+    assert seen == [(10, 3)]
+    _assert_consistent()
+
+
+def test_pages_dropped_only_when_availability_changes(loaded, rows, monkeypatch):
+    monkeypatch.setattr(catalog_pages, "CATALOG_PAGE_SIZE", 2)
+    monkeypatch.setattr(catalog_pages, "_cache_version", -1)
+    catalog.add_stock_listener(catalog_pages._on_stock_change)
+    for page in range(5):
+        catalog_pages.get_catalog_page(page)
+    page_of = catalog.position("A4") // 2
+
+    rows["A4"] = dict(rows["A4"], stock=9)  # «в наличии» → «в наличии»
+    asyncio.run(catalog.refresh_product("A4"))
+    assert (-1, page_of) in catalog_pages._pages
+
+    rows["A4"] = dict(rows["A4"], stock=2)  # → «осталось 2 шт.»
+    asyncio.run(catalog.refresh_product("A4"))
+    assert (-1, page_of) not in catalog_pages._pages
+    assert len(catalog_pages._pages) == 4
+    assert "осталось 2 шт." in catalog_pages.get_catalog_page(page_of)[0]
@@ -0,0 +1,50 @@
+# Пропуск правок, которые ничего не меняют
+import asyncio
+
+from aiogram.methods import EditMessageReplyMarkup, EditMessageText
+from aiogram.types import LinkPreviewOptions
+
+from edit_cache import EditDedupMiddleware
+
+
+def _send(middleware, *methods):
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append(method)
+        return True
+
+    async def run():
+        for method in methods:
+            await middleware(make_request, None, method)
+
+    asyncio.run(run())
+    return sent
+
+
+def _edit(text="Каталог", **kwargs):
+    return EditMessageText(chat_id=1, message_id=10, text=text, **kwargs)
+
+
+def test_same_edit_is_skipped():
+    middleware = EditDedupMiddleware()
+    assert len(_send(middleware, _edit(), _edit(), _edit())) == 1
+    assert middleware.stats()["skipped"] == 2
+
+
+def test_link_preview_change_is_sent():
+    middleware = EditDedupMiddleware()
+    sent = _send(
+        middleware,
+        _edit(),
+        _edit(link_preview_options=LinkPreviewOptions(is_disabled=True)),
+        _edit(link_preview_options=LinkPreviewOptions(is_disabled=True)),
+        _edit(disable_web_page_preview=True),
+    )
+    assert len(sent) == 3
+
+
+def test_other_edit_resets_fingerprint():
+    middleware = EditDedupMiddleware()
+    sent = _send(middleware, _edit(), EditMessageReplyMarkup(chat_id=1, message_id=10), _edit())
+    assert len(sent) == 3
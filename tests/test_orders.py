@@ -0,0 +1,120 @@
+# История заказов: keyset-пагинация и кэш отрисованных страниц
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from handlers import orders
+from keyboards.callbacks import OrdersPage
+from tests.conftest import FakeConnection
+
+START = datetime(2026, 10, 1, 12, 0)
+
+
+def _order(order_id):
+    return {"order_id": order_id, "total_price": 100 * order_id, "created_at": START + timedelta(hours=order_id),
+            "items": json.dumps([{"name": f"Товар {order_id}", "qty": 1, "price": 100 * order_id}])}
+
+
+class History:
+    """orders одного пользователя; отвечает так же, как _PAGE_SQL, — по ключу (created_at, order_id)."""
+
+    def __init__(self, count):
+        self.rows = [_order(i) for i in range(1, count + 1)]
+        self.calls = 0
+
+    def fetch(self, query, user_id, *cursor):
+        self.calls += 1
+        rows = self.rows
+        limit = orders.ORDERS_PAGE_SIZE + 1
+        if "> ($2, $3)" in query:
+            return [r for r in rows if (r["created_at"], r["order_id"]) > tuple(cursor)][:limit]
+        if "< ($2, $3)" in query:
+            rows = [r for r in rows if (r["created_at"], r["order_id"]) < tuple(cursor)]
+        return list(reversed(rows))[:limit]
+
+
+@pytest.fixture(autouse=True)
+def clean_cache(monkeypatch):
+    monkeypatch.setattr(orders, "_pages", type(orders._pages)())
+    monkeypatch.setattr(orders, "_user_bytes", {})
+    monkeypatch.setattr(orders, "_bytes", 0)
+    monkeypatch.setattr(orders, "_loading", {})
+    monkeypatch.setattr(orders, "_generations", {})
+    monkeypatch.setattr(orders, "ORDERS_PAGE_SIZE", 3)
+
+
+def _nav(markup):
+    return {button.text: OrdersPage.unpack(button.callback_data)
+            for button in markup.inline_keyboard[0] if button.callback_data.startswith("orders")}
+
+
+def test_keyset_pages_forward_and_back(fake_db):
+    fake_db(FakeConnection(fetch=History(7).fetch))
+
+    rows, has_newer, has_older = asyncio.run(orders.fetch_orders_page(1))
+    assert [r["order_id"] for r in rows] == [7, 6, 5] and not has_newer and has_older
+
+    last = rows[-1]
+    rows, has_newer, has_older = asyncio.run(
+        orders.fetch_orders_page(1, orders.OLDER, last["created_at"], last["order_id"]))
+    assert [r["order_id"] for r in rows] == [4, 3, 2] and has_newer and has_older
+
+    rows, has_newer, has_older = asyncio.run(
+        orders.fetch_orders_page(1, orders.OLDER, rows[-1]["created_at"], rows[-1]["order_id"]))
+    assert [r["order_id"] for r in rows] == [1] and has_newer and not has_older
+
+    rows, has_newer, has_older = asyncio.run(
+        orders.fetch_orders_page(1, orders.NEWER, rows[0]["created_at"], rows[0]["order_id"]))
+    assert [r["order_id"] for r in rows] == [4, 3, 2] and has_newer and has_older
+
+
+def test_render_cursor_round_trips_through_callback_data():
+    rows = [_order(5), _order(4)]
+    text, markup = orders.render_orders_page(rows, has_newer=True, has_older=True)
+    assert "Заказ №5" in text and "Заказ №4" in text
+    nav = _nav(markup)
+    newer, older = nav["⬅️ Новее"], nav["Старее ➡️"]
+    assert (newer.direction, newer.order_id) == (orders.NEWER, 5)
+    assert (older.direction, older.order_id) == (orders.OLDER, 4)
+    assert datetime.fromisoformat(older.created_at) == rows[1]["created_at"]
+
+
+def test_cache_hits_and_invalidation(fake_db):
+    history = History(4)
+    fake_db(FakeConnection(fetch=history.fetch))
+    first = asyncio.run(orders.get_orders_page(1))
+    assert asyncio.run(orders.get_orders_page(1)) is first and history.calls == 1
+
+    orders.invalidate(1)
+    asyncio.run(orders.get_orders_page(1))
+    assert history.calls == 2
+
+
+def test_other_users_checkout_does_not_block_caching(fake_db):
+    history = History(4)
+    fake_db(FakeConnection(fetch=history.fetch))
+
+    async def scenario():
+        reading = asyncio.ensure_future(orders.get_orders_page(1))
+        own = asyncio.ensure_future(orders.get_orders_page(2))
+        await asyncio.sleep(0)
+        orders.invalidate(2)  # заказ оформил другой пользователь
+        await reading
+        await own
+
+    asyncio.run(scenario())
+    assert 1 in orders._pages and 2 not in orders._pages
+    assert not orders._loading and not orders._generations
+
+
+def test_concurrent_misses_count_bytes_once(fake_db):
+    fake_db(FakeConnection(fetch=History(4).fetch))
+
+    async def scenario():
+        await asyncio.gather(orders.get_orders_page(1), orders.get_orders_page(1))
+
+    asyncio.run(scenario())
+    page = orders._pages[1][(None, None)]
+    assert orders._bytes == orders._user_bytes[1] == orders._page_bytes(page)
@@ -0,0 +1,43 @@
+# Лимиты исходящих вызовов: какие методы тратят лимит чата
+import asyncio
+import time
+
+from aiogram.methods import DeleteMessage, EditMessageReplyMarkup, EditMessageText, SendMessage
+
+import outbound
+
+
+def _spent(*methods) -> float:
+    """Сколько секунд заняли вызовы подряд в один чат."""
+    limiter = outbound.OutboundLimiter()
+
+    async def make_request(bot, method):
+        return True
+
+    async def run():
+        started = time.monotonic()
+        for method in methods:
+            await limiter(make_request, None, method)
+        return time.monotonic() - started
+
+    return asyncio.run(run())
+
+
+def test_deletes_skip_chat_bucket():
+    burst = int(outbound.OUTBOUND_CHAT_BURST)
+    deletes = [DeleteMessage(chat_id=1, message_id=i) for i in range(burst * 3)]
+    assert _spent(*deletes) < 0.05
+
+
+def test_edits_skip_chat_bucket():
+    burst = int(outbound.OUTBOUND_CHAT_BURST)
+    sends = [SendMessage(chat_id=1, text="x") for _ in range(burst)]  # лимит чата исчерпан
+    edits = [EditMessageText(chat_id=1, message_id=1, text=str(i)) for i in range(burst * 2)]
+    edits += [EditMessageReplyMarkup(chat_id=1, message_id=1) for _ in range(burst)]
+    assert _spent(*sends, *edits) < 0.05
+
+
+def test_sends_wait_for_chat_bucket():
+    burst = int(outbound.OUTBOUND_CHAT_BURST)
+    sends = [SendMessage(chat_id=1, text="x") for _ in range(burst + 1)]
+    assert _spent(*sends) >= 0.9 / outbound.OUTBOUND_CHAT_RATE
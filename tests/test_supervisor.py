@@ -0,0 +1,85 @@
+# Воркер супервизора: порядок апдейтов пользователя, слоты, разбор апдейтов
+import asyncio
+import json
+
+from aiohttp.test_utils import make_mocked_request
+
+import supervisor
+
+
+def _update(update_id, user_id):
+    return {"update_id": update_id, "message": {"from": {"id": user_id}, "chat": {"id": user_id}}}
+
+
+def test_user_key():
+    assert supervisor.user_key(_update(1, 42)) == 42
+    assert supervisor.user_key({"update_id": 1, "callback_query": {"message": {"chat": {"id": -5}}}}) == -5
+    assert supervisor.user_key({"update_id": 1}) == 0
+    assert supervisor.user_key([1, 2]) == 0
+    assert supervisor.user_key({"update_id": 1, "message": {"from": 7}}) == 0
+
+
+def test_per_user_order_and_slots_go_to_others():
+    handled, acked = [], []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def handle(update):
+            user = update["message"]["from"]["id"]
+            handled.append((user, update["update_id"]))
+            if user == 1:
+                await release.wait()  # первый пользователь «завис» на своём апдейте
+
+        queues = supervisor.UserQueues(handle, lambda: acked.append(1), concurrency=2, backlog=100)
+        for i in range(10):
+            await queues.submit(_update(i, 1))  # поток от одного пользователя
+        await queues.submit(_update(100, 2))
+        await queues.submit(_update(101, 3))
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # Очередь первого не заняла слоты: второй и третий уже обработаны
+        assert (2, 100) in handled and (3, 101) in handled
+        release.set()
+        await queues.drain()
+
+    asyncio.run(run())
+    assert [update_id for user, update_id in handled if user == 1] == list(range(10))
+    assert len(acked) == 12
+
+
+def test_failed_update_does_not_stop_user_queue():
+    handled = []
+
+    async def run():
+        async def handle(update):
+            handled.append(update["update_id"])
+            if update["update_id"] == 0:
+                raise RuntimeError("boom")
+
+        queues = supervisor.UserQueues(handle, lambda: None, concurrency=1, backlog=10)
+        for i in range(3):
+            await queues.submit(_update(i, 1))
+        await queues.drain()
+
+    asyncio.run(run())
+    assert handled == [0, 1, 2]
+
+
+def test_webhook_rejects_non_object_json():
+    app = supervisor._webhook_app(supervisor.Supervisor(1))
+    receive = next(route.handler for route in app.router.routes() if route.method == "POST")
+
+    async def post(body: bytes):
+        request = make_mocked_request("POST", supervisor.WEBHOOK_PATH, app=app)
+        request.read = lambda: _value(body)
+        return await receive(request)
+
+    async def _value(body):
+        return body
+
+    for body in (b"[1, 2]", b"42", b'"text"', b"null", b"{broken"):
+        response = asyncio.run(post(body))
+        assert response.status == 400, body
+    response = asyncio.run(post(json.dumps(_update(1, 9)).encode()))
+    assert response.status == 200
@@ -0,0 +1,181 @@
+# tools/import_catalog.py — загрузка прайс-листа поставщика в products
+# -------------------------------------------------
+# CSV (в том числе сохранённый из Excel) с заголовком: code, name, price
+# и необязательные image_file_id, category, stock. Колонки, которых нет в файле,
+# у существующих товаров не меняются (например, фото из get_file_id).
+#
+# Файл потоком уходит через COPY во временную таблицу, затем в одной
+# транзакции применяется только разница с products: новые коды
+# вставляются, изменившиеся строки обновляются, коды, которых нет
+# в файле, удаляются (--keep-missing — оставить). Таблица не блокируется:
+# бот читает прежний каталог до COMMIT. Вместо уведомления на каждую
+# строку (migrations/007_catalog_import.sql) бот получает одно "*"
+# и перечитывает каталог целиком.
+#   python -m tools.import_catalog price.csv
+#   python -m tools.import_catalog price.csv --delimiter ";" --encoding cp1251 --dry-run
+# -------------------------------------------------
+
+import argparse
+import asyncio
+import csv
+import logging
+from typing import Dict, List
+
+import asyncpg
+
+import database
+from catalog import FULL_RELOAD, NOTIFY_CHANNEL
+from keyboards.callbacks import MAX_CODE_BYTES
+
+REQUIRED_COLUMNS = ("code", "name", "price")
+OPTIONAL_COLUMNS = ("image_file_id", "category", "stock")
+STAGING_TABLE = "products_import"
+LOCK_TIMEOUT = "5s"  # не вставать в очередь за чужой блокировкой products надолго
+
+# Имена кодировок Python, которых нет среди псевдонимов PostgreSQL
+_PG_ENCODINGS = {"cp1251": "WIN1251", "cp1252": "WIN1252", "utf-8-sig": "UTF8"}
+
+
+def read_columns(path: str, delimiter: str, encoding: str) -> List[str]:
+    """Колонки из заголовка файла (проверяются по списку известных)."""
+    with open(path, newline="", encoding=encoding) as f:
+        header = next(csv.reader(f, delimiter=delimiter), None)
+    if not header:
+        raise SystemExit(f"{path}: пустой файл")
+    columns = [name.strip().lstrip("\ufeff").lower() for name in header]
+    unknown = [name for name in columns if name not in REQUIRED_COLUMNS + OPTIONAL_COLUMNS]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if unknown or missing or len(set(columns)) != len(columns):
+        raise SystemExit(f"{path}: колонки {columns}; нужны {list(REQUIRED_COLUMNS)}, "
+                         f"можно {list(OPTIONAL_COLUMNS)}, без повторов")
+    return columns
+
+
+def _count(status: str) -> int:
+    # Статус команды asyncpg: "INSERT 0 12", "UPDATE 5", "DELETE 3"
+    return int(status.rsplit(" ", 1)[-1])
+
+
+async def _check_trigger(conn: asyncpg.Connection) -> None:
+    definition = await conn.fetchval(
+        "SELECT pg_get_triggerdef(oid) FROM pg_trigger "
+        "WHERE tgrelid = 'products'::regclass AND tgname = 'products_notify'"
+    )
+    if definition is not None and "catalog.bulk_import" not in definition:
+        logging.warning("Триггер products_notify без migrations/007_catalog_import.sql: "
+                        "бот получит по уведомлению на каждую изменённую строку")
+
+
+async def _stage(conn: asyncpg.Connection, path: str, columns: List[str],
+                 delimiter: str, encoding: str) -> int:
+    # Типы колонок — как в products, без ограничений: проверяем сами ниже
+    await conn.execute(
+        f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+        f"SELECT {', '.join(columns)} FROM products WITH NO DATA"
+    )
+    try:
+        status = await conn.copy_to_table(
+            STAGING_TABLE, source=path, columns=columns,
+            format="csv", header=True, delimiter=delimiter,
+            encoding=_PG_ENCODINGS.get(encoding.lower(), encoding),
+        )
+    except asyncpg.DataError as e:
+        raise SystemExit(f"{path}: {e}") from None  # в тексте ошибки COPY есть номер строки
+
+    problems = await conn.fetch(f"""
+        SELECT code, count(*) AS n FROM {STAGING_TABLE}
+        GROUP BY code HAVING count(*) > 1 OR code IS NULL OR code = ''
+        LIMIT 5
+    """)
+    if problems:
+        raise SystemExit("В файле пустые или повторяющиеся коды: "
+                         + ", ".join(f"{row['code']!r}×{row['n']}" for row in problems))
+    # Код уходит в callback_data кнопок (keyboards/callbacks.py): без ":" и в пределах MAX_CODE_BYTES
+    unfit = await conn.fetch(f"""
+        SELECT code FROM {STAGING_TABLE}
+        WHERE strpos(code, ':') > 0 OR octet_length(convert_to(code, 'UTF8')) > $1
+        LIMIT 5
+    """, MAX_CODE_BYTES)
+    if unfit:
+        raise SystemExit(f"Коды с ':' или длиннее {MAX_CODE_BYTES} байт (UTF-8) не поместятся в кнопки: "
+                         + ", ".join(repr(row["code"]) for row in unfit))
+    empty = await conn.fetchval(f"SELECT count(*) FROM {STAGING_TABLE} WHERE name IS NULL OR price IS NULL")
+    if empty:
+        raise SystemExit(f"В файле {empty} строк без названия или цены")
+
+    await conn.execute(f"ANALYZE {STAGING_TABLE}")  # иначе планировщик не знает размер временной таблицы
+    return _count(status)
+
+
+async def _apply(conn: asyncpg.Connection, columns: List[str], keep_missing: bool) -> Dict[str, int]:
+    values = [name for name in columns if name != "code"]
+    old = ", ".join(f"p.{name}" for name in values)
+    new = ", ".join(f"i.{name}" for name in values)
+
+    updated = await conn.execute(f"""
+        UPDATE products p SET {', '.join(f'{name} = i.{name}' for name in values)}
+        FROM {STAGING_TABLE} i
+        WHERE p.code = i.code AND ({old}) IS DISTINCT FROM ({new})
+    """)
+    inserted = await conn.execute(f"""
+        INSERT INTO products ({', '.join(columns)})
+        SELECT {', '.join(f'i.{name}' for name in columns)}
+        FROM {STAGING_TABLE} i
+        WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.code = i.code)
+    """)
+    removed = "DELETE 0"
+    if not keep_missing:
+        try:
+            removed = await conn.execute(f"""
+                DELETE FROM products p
+                WHERE NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} i WHERE i.code = p.code)
+            """)
+        except asyncpg.ForeignKeyViolationError as e:
+            raise SystemExit(f"Пропавшие из файла товары есть в заказах ({e}); "
+                             f"запустите с --keep-missing") from None
+    return {"inserted": _count(inserted), "updated": _count(updated), "removed": _count(removed)}
+
+
+async def import_catalog(path: str, delimiter: str, encoding: str,
+                         keep_missing: bool, dry_run: bool) -> Dict[str, int]:
+    columns = read_columns(path, delimiter, encoding)
+    conn = await database.get_db_connection()
+    try:
+        await _check_trigger(conn)
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            await conn.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            await conn.execute("SET LOCAL catalog.bulk_import = 'on'")
+            rows = await _stage(conn, path, columns, delimiter, encoding)
+            if rows == 0:
+                raise SystemExit(f"{path}: в файле нет строк — каталог не тронут")
+            counts = await _apply(conn, columns, keep_missing)
+            counts["rows"] = rows
+            if any(counts[key] for key in ("inserted", "updated", "removed")):
+                # Уйдёт ботам при COMMIT, одно на весь импорт
+                await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, FULL_RELOAD)
+        except BaseException:
+            await transaction.rollback()
+            raise
+        if dry_run:
+            await transaction.rollback()
+        else:
+            await transaction.commit()
+        return counts
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Импорт прайс-листа (CSV) в таблицу products")
+    parser.add_argument("path", help="CSV с заголовком: code, name, price[, image_file_id, category, stock]")
+    parser.add_argument("--delimiter", default=",", help="разделитель колонок (Excel в русской локали — ;)")
+    parser.add_argument("--encoding", default="utf-8", help="кодировка файла (например, cp1251)")
+    parser.add_argument("--keep-missing", action="store_true", help="не удалять товары, которых нет в файле")
+    parser.add_argument("--dry-run", action="store_true", help="посчитать изменения и откатить")
+    args = parser.parse_args()
+    result = asyncio.run(import_catalog(args.path, args.delimiter, args.encoding, args.keep_missing, args.dry_run))
+    print(f"{'🔎 Проверка' if args.dry_run else '✅ Импорт'}: строк в файле {result['rows']}, "
+          f"добавлено {result['inserted']}, изменено {result['updated']}, удалено {result['removed']}")
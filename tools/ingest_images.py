@@ -0,0 +1,56 @@
+# tools/ingest_images.py — массовая загрузка фото товаров (image_ingest.py)
+# -------------------------------------------------
+# Картинки называются по коду товара: CPU-001.jpg, GPU-4060.png, ...
+# Отправляются в служебный чат (--chat, по умолчанию первый из ADMIN_IDS):
+# бот должен иметь право писать в него — администратору достаточно
+# один раз нажать /start. Сообщения после загрузки удаляются.
+#   python -m tools.ingest_images photos/
+#   python -m tools.ingest_images photos.zip --parallel 8 --dry-run
+# Проверка без Telegram — через bench/fake_bot_api.py:
+#   python -m bench.fake_bot_api --port 8081 &
+#   python -m tools.ingest_images photos/ --chat 1 --api-url http://127.0.0.1:8081
+# -------------------------------------------------
+
+import argparse
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+import database
+import image_ingest
+import outbound
+from config import ADMIN_IDS, BOT_TOKEN, IMAGE_UPLOAD_PARALLEL, OUTBOUND_RATE_LIMIT
+
+
+async def run(path: str, chat_id: int, parallel: int, api_url: str,
+              keep_messages: bool, dry_run: bool) -> None:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_url)) if api_url else None
+    bot = Bot(token=BOT_TOKEN, session=session)
+    if OUTBOUND_RATE_LIMIT:
+        bot.session.middleware(outbound.OutboundLimiter())
+    await database.create_pool()
+    try:
+        report = await image_ingest.ingest(bot, path, chat_id, parallel, keep_messages, dry_run)
+        print(image_ingest.format_report(report))
+    finally:
+        await database.close_pool()
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Загрузка фото товаров в Telegram и запись image_file_id")
+    parser.add_argument("path", help="каталог или zip-архив с файлами <код>.jpg/.png/.webp")
+    parser.add_argument("--chat", type=int, default=ADMIN_IDS[0] if ADMIN_IDS else None,
+                        help="чат для загрузки (по умолчанию первый из ADMIN_IDS)")
+    parser.add_argument("--parallel", type=int, default=IMAGE_UPLOAD_PARALLEL, help="одновременных загрузок")
+    parser.add_argument("--api-url", default="", help="другой сервер Bot API (локальный или bench/fake_bot_api.py)")
+    parser.add_argument("--keep-messages", action="store_true", help="не удалять сообщения с фото")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать, что будет загружено")
+    args = parser.parse_args()
+    if args.chat is None:
+        parser.error("укажите --chat или ADMIN_IDS в .env")
+    asyncio.run(run(args.path, args.chat, args.parallel, args.api_url, args.keep_messages, args.dry_run))
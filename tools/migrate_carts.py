@@ -0,0 +1,57 @@
+# tools/migrate_carts.py — перенос корзин между хранилищами
+# -------------------------------------------------
+# Читает все корзины из одного хранилища cart_backends и пишет их
+# пачками в другое. Бот на время переноса лучше остановить.
+#   python -m tools.migrate_carts --from json --to postgres
+#   python -m tools.migrate_carts --from postgres --to sqlite --batch-size 500
+# -------------------------------------------------
+
+import argparse
+import asyncio
+import logging
+
+import database
+from cart_backends import BACKENDS, PostgresBackend, create_backend
+
+
+async def migrate(source: str, target: str, batch_size: int) -> None:
+    if source == target:
+        raise SystemExit("Источник и приёмник совпадают")
+
+    uses_postgres = PostgresBackend.name in (source, target)
+    if uses_postgres:
+        await database.create_pool()
+
+    src, dst = create_backend(source), create_backend(target)
+    try:
+        await src.open()
+        await dst.open()
+
+        carts = await src.load_all()
+        user_ids = list(carts)
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            await dst.write({user_id: carts[user_id] for user_id in chunk})
+            logging.info("Перенесено %d/%d корзин", start + len(chunk), len(user_ids))
+
+        # Сверка: в приёмнике должны оказаться все перенесённые корзины
+        copied = await dst.load_all()
+        missing = [user_id for user_id in carts if copied.get(user_id) != carts[user_id]]
+        if missing:
+            raise SystemExit(f"Не совпали корзины {len(missing)} пользователей, например: {missing[:5]}")
+        print(f"✅ Перенесено {len(carts)} корзин: {source} → {target}")
+    finally:
+        await src.close()
+        await dst.close()
+        if uses_postgres:
+            await database.close_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Перенос корзин между хранилищами")
+    parser.add_argument("--from", dest="source", required=True, choices=sorted(BACKENDS))
+    parser.add_argument("--to", dest="target", required=True, choices=sorted(BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(migrate(args.source, args.target, args.batch_size))
@@ -0,0 +1,71 @@
+# users.py — регистрация пользователей с кэшем уже известных
+# -------------------------------------------------
+# Пользователь регистрируется один раз, а /start и оформление заказа
+# вызывают регистрацию постоянно. Поэтому держим в памяти ограниченное
+# (KNOWN_USERS_CACHE_SIZE, LRU) множество user_id, которые точно есть
+# в таблице users: для них регистрация не делает ни одного запроса.
+# При промахе — один INSERT ... ON CONFLICT DO NOTHING RETURNING:
+# строка вернулась — пользователь новый, не вернулась — уже был.
+# Запрос атомарен, поэтому одновременные /start не создают дублей.
+# -------------------------------------------------
+
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import asyncpg
+from aiogram import types
+
+from database import acquire
+from config import KNOWN_USERS_CACHE_SIZE
+
+_REGISTER_SQL = """
+    INSERT INTO users (user_id, username, first_name, last_name)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (user_id) DO NOTHING
+    RETURNING user_id
+"""
+
+_known: "OrderedDict[int, None]" = OrderedDict()  # user_id в порядке последнего обращения
+_stats = {"hits": 0, "misses": 0, "registered": 0}
+
+
+def _remember(user_id: int) -> None:
+    _known[user_id] = None
+    _known.move_to_end(user_id)
+    while len(_known) > KNOWN_USERS_CACHE_SIZE:
+        _known.popitem(last=False)
+
+
+async def ensure_user(user: types.User, conn: Optional[asyncpg.Connection] = None) -> bool:
+    """
+    Гарантирует, что пользователь есть в таблице users.
+    Возвращает True, если он зарегистрирован только что.
+    conn — соединение вызывающего (иначе берётся из пула, и только при промахе кэша).
+    """
+    if user.id in _known:
+        _known.move_to_end(user.id)
+        _stats["hits"] += 1
+        return False
+
+    _stats["misses"] += 1
+    args = (user.id, user.username, user.first_name, user.last_name)
+    if conn is None:
+        async with acquire() as conn:
+            created = await conn.fetchval(_REGISTER_SQL, *args)
+    else:
+        created = await conn.fetchval(_REGISTER_SQL, *args)
+
+    _remember(user.id)
+    if created is not None:
+        _stats["registered"] += 1
+    return created is not None
+
+
+def forget(user_id: int) -> None:
+    """Убирает пользователя из кэша (например, если его строку удалили или откатили)."""
+    _known.pop(user_id, None)
+
+
+def stats() -> Dict[str, int]:
+    """Попадания/промахи кэша и размер множества известных пользователей."""
+    return dict(_stats, size=len(_known))
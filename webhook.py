@@ -0,0 +1,193 @@
+# webhook.py — приём апдейтов через webhook (aiohttp-сервер aiogram)
+# -------------------------------------------------
+# Telegram присылает апдейты POST-запросами на WEBHOOK_URL + WEBHOOK_PATH.
+# Запрос не ждёт обработки: апдейт кладётся в ограниченную очередь
+# (WEBHOOK_BACKLOG) и сразу получает 200, а разбирают очередь
+# WEBHOOK_WORKERS фоновых обработчиков — столько апдейтов одновременно
+# и выполняется, сколько бы их ни пришло.
+#
+# Если очередь заполнена, бот отвечает 503: Telegram повторит доставку
+# позже, а не завалит процесс задачами (backpressure). Так же отвечаем,
+# когда бот останавливается и дорабатывает уже принятое.
+#
+# GET /healthz — состояние для балансировщика и мониторинга.
+# Webhook принимает один экземпляр бота: корзины и кэши живут в памяти
+# процесса, и два процесса, обслуживающие одного пользователя, затирают
+# изменения друг друга. Масштабирование — BOT_WORKERS (supervisor.py):
+# апдейты одного пользователя всегда попадают в один воркер.
+# -------------------------------------------------
+
+import asyncio
+import logging
+import signal
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+import database
+import metrics
+from config import (
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_WORKERS,
+    WEBHOOK_BACKLOG,
+    WEBHOOK_MAX_CONNECTIONS,
+)
+
+HEALTH_PATH = "/healthz"
+DRAIN_TIMEOUT = 10  # сек. на доработку принятых апдейтов при остановке
+RETRY_AFTER = "1"   # сек., подсказка в ответе 503
+
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    """Webhook-обработчик aiogram с ограниченной очередью и фиксированным числом обработчиков."""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, workers: int, backlog: int, **kwargs: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self.workers = workers
+        self.backlog = backlog
+        self.busy = 0
+        self.rejected = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._accepting = False
+
+    # --- жизненный цикл ---
+    async def start(self, app: web.Application = None) -> None:
+        self._queue = asyncio.Queue(maxsize=self.backlog)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._accepting = True
+
+    async def drain(self, app: web.Application = None) -> None:
+        """Перестаёт принимать апдейты и дорабатывает очередь (не дольше DRAIN_TIMEOUT)."""
+        self._accepting = False
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logging.warning("Webhook: остановка, не обработано апдейтов: %d", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- приём ---
+    async def handle(self, request: web.Request) -> web.Response:
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+        if not self._accepting:
+            return web.Response(status=503, headers={"Retry-After": RETRY_AFTER})
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+        except ValueError:
+            return web.Response(body="Bad Request", status=400)
+        try:
+            self._queue.put_nowait((bot, update))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503, headers={"Retry-After": RETRY_AFTER})
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    # --- обработка ---
+    async def _worker(self) -> None:
+        while True:
+            bot, update = await self._queue.get()
+            self.busy += 1
+            try:
+                result = await self.dispatcher.feed_raw_update(bot, update, **self.data)
+                if isinstance(result, TelegramMethod):
+                    await self.dispatcher.silent_call_request(bot=bot, result=result)
+            except Exception:
+                logging.exception("Webhook: ошибка обработки апдейта %s", update.get("update_id"))
+            finally:
+                self.busy -= 1
+                self._queue.task_done()
+
+    @property
+    def accepting(self) -> bool:
+        return self._accepting
+
+    def stats(self) -> Dict[str, int]:
+        """Очередь, занятые обработчики и отклонённые из-за переполнения апдейты."""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "backlog": self.backlog,
+            "busy": self.busy,
+            "workers": self.workers,
+            "rejected": self.rejected,
+        }
+
+
+def _health_view(handler: QueuedRequestHandler):
+    async def health(request: web.Request) -> web.Response:
+        webhook = handler.stats()
+        pool = database.pool_stats()
+        if not handler.accepting:
+            status = "stopping"
+        elif webhook["queued"] >= webhook["backlog"]:
+            status = "overloaded"
+        elif pool["size"] == 0:
+            status = "no_database"
+        else:
+            status = "ok"
+        return web.json_response(
+            {"status": status, "webhook": webhook, "db_pool": pool},
+            status=200 if status == "ok" else 503,
+        )
+    return health
+
+
+async def _wait_for_stop_signal() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: остаётся Ctrl+C через KeyboardInterrupt
+    await stop.wait()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Поднимает aiohttp-сервер, регистрирует webhook в Telegram и работает до SIGINT/SIGTERM."""
+    if not WEBHOOK_URL:
+        raise RuntimeError("BOT_MODE=webhook требует WEBHOOK_URL")
+
+    handler = QueuedRequestHandler(
+        dp, bot, workers=WEBHOOK_WORKERS, backlog=WEBHOOK_BACKLOG, secret_token=WEBHOOK_SECRET
+    )
+    app = web.Application()
+    handler.register(app, path=WEBHOOK_PATH)
+    app.router.add_get(HEALTH_PATH, _health_view(handler))
+    metrics.add_collector("webhook", handler.stats)
+    # Очередь дорабатывается в runner.cleanup() — раньше, чем main.on_shutdown закроет пул и корзины.
+    # register() уже повесил на on_shutdown закрытие сессии бота, поэтому drain ставим первым:
+    # иначе ответы на оставшиеся в очереди апдейты уйдут в закрытую сессию
+    app.on_startup.append(handler.start)
+    app.on_shutdown.insert(0, handler.drain)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        # Вызов идемпотентен: повторный запуск просто перерегистрирует тот же адрес
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logging.info("Webhook слушает %s:%d%s, обработчиков: %d, очередь: %d",
+                     WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_WORKERS, WEBHOOK_BACKLOG)
+        await _wait_for_stop_signal()
+    finally:
+        logging.info("Webhook: %s", handler.stats())
+        await runner.cleanup()